@@ -1,8 +1,9 @@
 # Built-in Python libraries, not visible in the CIRCUITPYTHON drive
-import time
 import board
 import digitalio
 import busio
+import sdcardio
+import storage
 import supervisor
 import traceback
 import usb_cdc
@@ -10,9 +11,20 @@ import math
 
 # Python modules from the "lib" folder
 from lib.harvestar import HarveStar
+# lib/ is on the import path too; modules HarveStar also uses are imported by their own name so both share one copy
+from constraints import ConstraintEnvelope
+import log as logging
+import clock  # all sleeps and timestamps, so the simulator can run this file on virtual time
+from log import get_logger
+import protocol
+from protocol import FrameReader
+import looptimer
+from looptimer import LoopTimer
+import kinematics
 
-def seconds_since_boot():
-    return f"{time.monotonic():.3f}"
+log = get_logger("main")
+logging.set_level(logging.INFO)  # logging.DEBUG shows every received command and IK solve
+# logging.use_ring_buffer()  # buffer records and print them while the arm is idle instead
 
 # Initializing inputs and outputs
 led_pin = digitalio.DigitalInOut(board.LED)
@@ -22,12 +34,61 @@ start_button = digitalio.DigitalInOut(board.GP14)
 start_button.direction = digitalio.Direction.INPUT
 start_button.pull = digitalio.Pull.UP
 serial = usb_cdc.data
+RECORDING = "/sd/teleop.traj"  # SPACE in controlled mode starts and stops recording here, REPLAY frames play it
+
+
+def mount_sd():
+    """
+    Mounts the SD card at /sd: an SPI card breakout on SCK GP10, MOSI GP11, MISO GP12 and CS GP13. It holds the
+    constraint envelope, the IK table, compiled programs and teleop recordings; the arm runs without it.
+    """
+    try:
+        spi = busio.SPI(board.GP10, MOSI=board.GP11, MISO=board.GP12)
+        storage.mount(storage.VfsFat(sdcardio.SDCard(spi, board.GP13)), "/sd")
+    except (OSError, ValueError) as e:
+        log.warning("No SD card mounted (%s), recording and replay are unavailable", e)
+        return False
+    return True
+
+
+def blink(times):
+    """Flashes the on-board LED, to tell the operator something failed without a console."""
+    for _ in range(times):
+        led_pin.value = True
+        clock.sleep(0.1)
+        led_pin.value = False
+        clock.sleep(0.1)
+
+
+sd_mounted = mount_sd()
+
+
+def send_loop_stats(timer, seq, buf=bytearray(protocol.FRAME_SIZE)):
+    """Answers a STATS request with one frame for the loop period and one per timed stage"""
+    for stage in (looptimer.LOOP,) + tuple(range(len(timer.stages))):
+        serial.write(protocol.pack_stats(buf, seq, stage, *timer.stats(stage)))
+
+
+def send_ack(seq, received_ns, written_ns, buf=bytearray(protocol.FRAME_SIZE)):
+    """Tells the PC when a KEYS frame sent with FLAG_ACK was decoded and when the servos were written for it"""
+    serial.write(protocol.pack_ack(buf, seq, (received_ns // 1000) & 0xFFFFFFFF, (written_ns // 1000) & 0xFFFFFFFF))
+
 
 # Initialize the harvestar with proper piddns
-print(seconds_since_boot() + " - Initializing HarveStar...")
-harvestar = HarveStar(base_pin=board.GP0, shoulder_pin=board.GP1, elbow_pin=board.GP2, end_effector_pin=board.GP3)
+log.info("Initializing HarveStar...")
+try:
+    envelope = ConstraintEnvelope.load("/sd/constraints.txt")
+    log.info("Loaded constraint envelope from /sd")
+except OSError:
+    envelope = None  # built-in HarveStar envelope
+harvestar = HarveStar(base_pin=board.GP0, shoulder_pin=board.GP1, elbow_pin=board.GP2, end_effector_pin=board.GP3, constraints=envelope)
+try:
+    harvestar.load_ik_table("/sd/ik_table.bin")
+    log.info("Loaded IK table")
+except OSError:
+    log.info("No IK table on /sd, using the exact solver")
 # Wait for the button to be pressed
-print(seconds_since_boot() + " - Press the button to start sequence.")
+log.info("Press the button to start sequence.")
 
 button_pressed_time = None
 
@@ -36,103 +97,176 @@ while True:
     # This part is for the long press
     if not start_button.value:
         if button_pressed_time is None:
-            button_pressed_time = time.monotonic()
-        elif time.monotonic() - button_pressed_time > 2:
-            print(seconds_since_boot() + " - Button long pressed! Entering test mode...")
+            button_pressed_time = clock.monotonic()
+        elif clock.monotonic() - button_pressed_time > 2:
+            log.info("Button long pressed! Entering test mode...")
             led_pin.value = False
             # Enter test mode
             try:
-                print("Harvestar Entering Controlled Mode")
+                log.info("Harvestar Entering Controlled Mode")
                 x, y, z = 18, 20, 5
                 harvestar.move_multiple(x, y, z, 0.001)
                 # Starting cylindrical coordinates
                 r = math.sqrt(x**2 + y**2)   # horizontal distance
                 phi = math.atan2(y, x)       # azimuth in radians
                 z = z                         # vertical heighta
-                ee = 90
-                while (serial.in_waiting > 0):
-                    serial.readline()
+                ee = harvestar.end_effector.servo.angle
+                commands = FrameReader(serial)
+                commands.drain()
+                timer = LoopTimer(looptimer.TELEOP_STAGES)  # per-stage timings, sent to the PC on a STATS request
+                teleop = None  # velocity teleop, while the PC sends FLAG_VELOCITY frames
+                space_held = False
+                # Newest frame whose setpoint is not on the pins yet; its ACK waits for the first pass that writes
+                pending_at = None
+                pending_ack = -1
                 while True:
+                    timer.begin()
                     new_r, new_phi, new_z, new_ee = r, phi, z, ee
 
-                    if serial.in_waiting > 0:                # non-blocking — only reads if data is waiting
-                        received_commands = serial.readline().decode().strip().split(",")
-                        print(received_commands)
-                        for command in received_commands:
-                            command = command.lstrip()
-                            if command == 'w':      # forward in radial direction
-                                new_r += 0.5
-                            elif command == 's':    # backward
-                                new_r -= 0.5
-                            elif command == 'a':    # rotate left
-                                new_phi -= math.radians(2)  # small angular step (in radians)
-                            elif command == 'd':    # rotate right
-                                new_phi += math.radians(2)
-                            elif command == 'up':  # move up
-                                new_z += 0.5
-                            elif command == 'down':  # move down
-                                new_z -= 0.5
-                            elif command == 'q':
-                                new_ee -= 5
-                            elif command == 'e':
-                                new_ee += 5
-                                
+                    # Everything waiting is read every pass; queued step frames add up, the newest frame wins
+                    received = commands.poll_latest() > 0
+                    received_at = timer.mark(looptimer.READ)
+                    if commands.stats_seq >= 0:
+                        send_loop_stats(timer, commands.stats_seq)
+                    if received:
+                        # SPACE toggles recording of the setpoints the servos are given, on the press only
+                        space = commands.keys & protocol.KEY_SPACE
+                        if space and not space_held:
+                            # The LED is lit while recording; three flashes mean the recording could not start
+                            if harvestar.recorder is None:
+                                try:
+                                    harvestar.start_recording(RECORDING)
+                                    led_pin.value = True
+                                except OSError as e:
+                                    log.error("Cannot record to %s: %s%s", RECORDING, e,
+                                              "" if sd_mounted else " (no SD card mounted)")
+                                    blink(3)
+                            else:
+                                harvestar.stop_recording()
+                                led_pin.value = False
+                        space_held = space != 0
+                    if commands.replay_seq >= 0:
+                        harvestar.stop_recording()
+                        led_pin.value = False
+                        log.info("Replaying %s at %.2fx", RECORDING, commands.speed)
+                        try:
+                            if not harvestar.play_trajectory(RECORDING, commands.speed):  # blocks until done
+                                blink(3)  # refused by the constraint and speed checks, logged by play_trajectory()
+                        except (OSError, ValueError) as e:
+                            log.error("Cannot replay %s: %s", RECORDING, e)
+                            blink(3)
+                        # Carry on teleop from wherever the replay left the arm
+                        x, y, z = harvestar.current_position()
+                        r = math.sqrt(x**2 + y**2)
+                        phi = math.atan2(y, x)
+                        ee = harvestar.end_effector.servo.angle
+                        new_r, new_phi, new_z, new_ee = r, phi, z, ee
+                        teleop = None
+                        commands.drain()
+                        received = False
+                        pending_at = None
+                    if received and commands.flags & protocol.FLAG_VELOCITY:
+                        # Velocity mode: the frame is the held state, the Pico integrates it at a fixed rate
+                        teleop = harvestar.velocity_teleop(r, phi, z, ee)
+                        teleop.command(commands.keys, commands.vr, commands.vphi, commands.vz, commands.vee)
+                        timer.mark(looptimer.SOLVE)
+                    elif received:
+                        teleop = None
+                        steps = commands.steps         # frames each key was held in, in protocol.KEY_NAMES order
+                        log.debug("Received keys %d (seq %d, %d frames)", commands.keys, commands.seq, commands.merged)
+                        new_r += 0.5 * (steps[0] - steps[1])                  # W/S: forward/backward in radial direction
+                        new_phi += math.radians(2) * (steps[3] - steps[2])    # D/A: rotate right/left (in radians)
+                        new_z += 0.5 * (steps[4] - steps[5])                  # UP/DOWN: move up/down
+                        new_ee += 5 * (steps[7] - steps[6])                   # E/Q: open/close end effector
+                        new_ee = max(kinematics.END_EFFECTOR_MIN, min(kinematics.END_EFFECTOR_MAX, new_ee))
+
                         # Only move if anything changed
                         if new_r != r or new_phi != phi or new_z != z or new_ee != ee:
                             x = new_r * math.cos(new_phi)
                             y = new_r * math.sin(new_phi)
-                            if harvestar.move_multiple(x, y, new_z, 0.001) == True:
-                                r, phi, z = new_r, new_phi, new_z
-                            else:
-                                x = r * math.cos(phi)
-                                y = r * math.sin(phi)
-                                harvestar.move_multiple(x, y, z, 0.001)
-                            if(new_ee <= 85 and new_ee >= 15):
-                                harvestar.end_effector_move(new_ee)
+                            # Retarget the move in progress, end effector included; a rejected target leaves the
+                            # current move running, and the end effector still goes where it was asked
+                            if harvestar.start_move(x, y, new_z, 0.001, new_ee) == True:
+                                r, phi, z, ee = new_r, new_phi, new_z, new_ee
+                            elif new_ee != ee:
+                                harvestar.start_move(r * math.cos(phi), r * math.sin(phi), z, 0.001, new_ee)
                                 ee = new_ee
                             
                             # Convert cylindrical to Cartesian for IK
                             x = r * math.cos(phi)
                             y = r * math.sin(phi)
-                        time.sleep(0.05)
-                    time.sleep(0.02)
+                        timer.mark(looptimer.SOLVE)
+                    else:
+                        timer.skip()
+
+                    if received:
+                        pending_at = received_at
+                        pending_ack = commands.ack_seq  # latency probe from controlarm.py, -1 without one
+
+                    # Advance the move a little every pass so serial input is never left waiting
+                    moving = harvestar.tick()
+                    written_at = timer.mark(looptimer.TICK)
+                    if teleop is not None:
+                        r, phi, z, ee = teleop.r, teleop.phi, teleop.z, teleop.ee
+                    if pending_at is not None and harvestar.wrote:
+                        # The first pass that changed a duty cycle, not the one that only started the move
+                        timer.record(looptimer.RX_TO_WRITE, written_at - pending_at)
+                        if pending_ack >= 0:
+                            send_ack(pending_ack, pending_at, written_at)
+                        pending_at = None
+                    elif pending_at is not None and not moving:
+                        pending_at = None  # nothing to write, e.g. a rejected target; the probe counts it lost
+                    if not moving:
+                        logging.flush(4)  # idle, print a few buffered log records
+                    harvestar.frames.sleep()  # to the next PWM frame, so the loop runs at the frame rate without drift
+                    timer.mark(looptimer.IDLE)
             
             except Exception as e:
-                print(seconds_since_boot() + " - ERROR: " + str(e))
+                log.error("ERROR: %s", e)
                 traceback.print_exception(e)
-                print(seconds_since_boot() + " - Test mode aborted. Rebooting in 5 seconds...")
-                time.sleep(5)
+                log.info("Test mode aborted. Rebooting in 5 seconds...")
+                clock.sleep(5)
                 supervisor.reload()
 
     # This part is for the short press
     else:
         if button_pressed_time is not None:
-            if time.monotonic() - button_pressed_time <= 2:
-                print(seconds_since_boot() + " - Button short pressed! Starting sequence...")
+            if clock.monotonic() - button_pressed_time <= 2:
+                log.info("Button short pressed! Starting sequence...")
                 led_pin.value = False
                 break
         button_pressed_time = None
 
-    time.sleep(0.05) # Short sleep as a good practice to lower the load and power consumption in a fast infinite loop
+    clock.sleep(0.05) # Short sleep as a good practice to lower the load and power consumption in a fast infinite loop
 
 
 # Example sequence
-print(seconds_since_boot() + " - Starting sequence...")
+log.info("Starting sequence...")
+
+# A motion program compiled onto the card (control-script/compile_program.py) replaces the built-in sequence
+program = "/sd/pick.traj"
 try:
-    #get the raddish:
-    harvestar.move_polar(25, 0, 15)   #move to a point
-    harvestar.end_effector_move(80)   #open end effector
-    harvestar.wait(2)                  #wait 1 second
-    harvestar.move_polar(30, 0, 8)
-    harvestar.wait(2)          #move down
-    harvestar.end_effector_move(15) 
-    harvestar.wait(2)         #close end effector
-    harvestar.move_polar(30, 0, 25) 
-    harvestar.wait(2)         #move up
-    harvestar.move_polar(30, 120, 20)   #move to drop aaaaaaaaaaaaaaaaaaswaoff point
-    harvestar.wait(2)                  #wait 1 second
-    harvestar.end_effector_move(80)   #open end effector to drop off
-    harvestar.wait(1)                  #wait 1 second
+    open(program, "rb").close()
+except OSError:
+    program = None
+
+try:
+    if program is not None:
+        harvestar.play_trajectory(program)
+    else:
+        #get the raddish:
+        harvestar.move_polar(25, 0, 15, end_effector=80)   #move to a point, opening the end effector on the way
+        harvestar.await_settled(2)         #until the servos have caught up; a fixed 2 seconds until SERVO_DYNAMICS are fitted
+        harvestar.move_polar(30, 0, 8, linear=True)    # straight down into the plant
+        harvestar.await_settled(2)
+        harvestar.end_effector_move(15)    #close end effector
+        harvestar.await_settled(2)
+        harvestar.move_polar(30, 0, 25, linear=True)   #move up
+        harvestar.await_settled(2)
+        harvestar.move_polar(30, 120, 20)   #move to drop aaaaaaaaaaaaaaaaaaswaoff point
+        harvestar.await_settled(2)
+        harvestar.end_effector_move(80)   #open end effector to drop off
+        harvestar.await_settled(1)
 
     
 
@@ -155,9 +289,9 @@ try:
 
 
 except Exception as e:
-    print(seconds_since_boot() + " - ERROR: " + str(e))
-    print(seconds_since_boot() + " - Sequence aborted. Rebooting in 5 seconds...")
-    time.sleep(5)
+    log.error("ERROR: %s", e)
+    log.info("Sequence aborted. Rebooting in 5 seconds...")
+    clock.sleep(5)
 
-print(seconds_since_boot() + " - Done. Automatic reboot...")
+log.info("Done. Automatic reboot...")
 supervisor.reload()
@@ -0,0 +1,47 @@
+"""
+Time source for the HarveStar firmware.
+
+Everything that sleeps or reads the time goes through this module instead of
+`time`, so a test or the simulator can swap in its own clock with use(), e.g.
+one that jumps straight to the next deadline instead of waiting. On the Pico
+it is just the real clock.
+"""
+
+import time
+
+
+class SystemClock:
+    def monotonic(self):
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+_clock = SystemClock()
+
+
+def use(clock):
+    """Makes `clock` (anything with monotonic, monotonic_ns and sleep) the firmware's time source."""
+    global _clock
+    _clock = clock
+
+
+def get():
+    return _clock
+
+
+def monotonic():
+    return _clock.monotonic()
+
+
+def monotonic_ns():
+    return _clock.monotonic_ns()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
@@ -0,0 +1,66 @@
+"""
+Shoulder/elbow constraint envelope compiled into a per-band lookup.
+
+The envelope is a list of rows (shoulder_low, shoulder_high, elbow_low,
+elbow_high) in servo degrees: for shoulder_low <= shoulder < shoulder_high the
+elbow must stay within [elbow_low, elbow_high]. The rows are compiled once into
+one elbow range per shoulder band, so check() is a bounds test and a single
+index, and allocates nothing.
+
+An envelope file has one row per line, whitespace or comma separated, with
+`#` comments:
+
+    # shoulder_low shoulder_high elbow_low elbow_high
+    0   5   55  90
+    5   10  40  90
+"""
+
+
+class ConstraintEnvelope:
+    def __init__(self, rows, shoulder_max=90, elbow_max=90):
+        self.rows = [tuple(row) for row in rows]
+        self.shoulder_max = shoulder_max
+        self.elbow_max = elbow_max
+
+        # Band width is the narrowest row, every row edge has to sit on a band edge
+        self.band = shoulder_max
+        for s_low, s_high, _, _ in self.rows:
+            self.band = min(self.band, s_high - s_low)
+        if self.band <= 0:
+            raise ValueError("Constraint rows need shoulder_high > shoulder_low")
+        for s_low, s_high, _, _ in self.rows:
+            if s_low % self.band or s_high % self.band:
+                raise ValueError(f"Constraint row {s_low}-{s_high} does not line up with {self.band}° bands")
+
+        # Rows overlapping the same band all have to hold, so keep the tightest range
+        bands = shoulder_max // self.band + 1
+        low = [0] * bands
+        high = [elbow_max] * bands
+        for s_low, s_high, e_low, e_high in self.rows:
+            for i in range(s_low // self.band, min(bands, s_high // self.band)):
+                low[i] = max(low[i], e_low)
+                high[i] = min(high[i], e_high)
+        self.elbow_low = bytes(low)
+        self.elbow_high = bytes(high)
+
+    @classmethod
+    def load(cls, path, shoulder_max=90, elbow_max=90):
+        rows = []
+        with open(path) as f:
+            for line in f:
+                line = line.split("#")[0].replace(",", " ").strip()
+                if line:
+                    rows.append([int(value) for value in line.split()])
+        return cls(rows, shoulder_max, elbow_max)
+
+    def check(self, shoulder_angle, elbow_angle):
+        """True if the shoulder/elbow servo pair is inside the absolute bounds and the envelope."""
+        if not (0 <= shoulder_angle <= self.shoulder_max and 0 <= elbow_angle <= self.elbow_max):
+            return False
+        i = int(shoulder_angle) // self.band
+        return self.elbow_low[i] <= elbow_angle <= self.elbow_high[i]
+
+    def elbow_range(self, shoulder_angle):
+        """Returns the (low, high) elbow range allowed at a shoulder angle inside the absolute bounds."""
+        i = int(shoulder_angle) // self.band
+        return self.elbow_low[i], self.elbow_high[i]
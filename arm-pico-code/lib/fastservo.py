@@ -0,0 +1,88 @@
+"""
+Servo output with the angle to duty cycle work done once, up front.
+
+adafruit_motor.servo.Servo turns every angle into a duty cycle through the
+`angle` and `fraction` setters, a range check, a divide and a multiply, and
+writes the PWM even when the duty cycle comes out the same as the one already
+on the pin. Reading `angle` back works the duty cycle out again.
+
+FastServo builds a table of duty cycles every `step` degrees when it is made.
+Setting `angle` interpolates between two table entries and writes the PWM only
+if the integer duty cycle changed. Reading `angle` returns the last angle set,
+so a move starts from exactly the setpoint it was given last. `writes` counts
+the PWM writes that actually happened.
+
+The table comes from calibration points, (servo angle, pulse width in µs) pairs
+measured on the servo, with the pulse width linear between them. Without any it
+is the straight line from min_pulse to max_pulse that Servo uses, and the two
+agree to within one duty count.
+
+    servo = FastServo(pwm, actuation_range=180, calibration=((0, 520), (90, 1480), (180, 2470)))
+    servo.angle = 42.5
+"""
+
+from array import array
+
+
+class FastServo:
+    def __init__(self, pwm_out, *, actuation_range=180, min_pulse=750, max_pulse=2250, calibration=None, step=1.0):
+        self._pwm_out = pwm_out
+        self.actuation_range = actuation_range
+        points = sorted(calibration) if calibration else ((0, min_pulse), (actuation_range, max_pulse))
+        if len(points) < 2 or points[0][0] > 0 or points[-1][0] < actuation_range:
+            raise ValueError("Calibration has to cover 0 to actuation_range")
+
+        # Duty cycle every `step` degrees; one entry past the end so the top of the range interpolates too
+        self._per_step = 1 / step
+        entries = int(actuation_range / step) + 2
+        self._table = array("f", [0.0] * entries)
+        counts_per_us = pwm_out.frequency / 1000000 * 0xFFFF
+        segment = 0
+        for i in range(entries):
+            angle = i * step
+            while segment < len(points) - 2 and angle > points[segment + 1][0]:
+                segment += 1
+            (a0, p0), (a1, p1) = points[segment], points[segment + 1]
+            self._table[i] = (p0 + (p1 - p0) * (angle - a0) / (a1 - a0)) * counts_per_us
+
+        self._duty = pwm_out.duty_cycle  # what is on the pin now
+        self._angle = None  # last angle set, None until then or while disabled
+        self.writes = 0  # duty cycle changes written to the pin
+
+    @property
+    def angle(self):
+        """The last angle set, in degrees, or None when the servo is disabled."""
+        return self._angle
+
+    @angle.setter
+    def angle(self, new_angle):
+        if new_angle is None:  # disable the servo by sending 0 signal
+            self._angle = None
+            self._write(0)
+            return
+        if new_angle < 0 or new_angle > self.actuation_range:
+            raise ValueError("Angle out of range")
+        # duty_at() and _write() inlined, a method call costs about as much as the rest of this on the Pico
+        position = new_angle * self._per_step
+        i = int(position)
+        table = self._table
+        low = table[i]
+        self._angle = new_angle
+        duty = int(low + (table[i + 1] - low) * (position - i))
+        if duty != self._duty:
+            self._duty = duty
+            self._pwm_out.duty_cycle = duty
+            self.writes += 1
+
+    def duty_at(self, angle):
+        """Duty cycle `angle` maps to, without writing it."""
+        position = angle * self._per_step
+        i = int(position)
+        low = self._table[i]
+        return int(low + (self._table[i + 1] - low) * (position - i))
+
+    def _write(self, duty):
+        if duty != self._duty:
+            self._duty = duty
+            self._pwm_out.duty_cycle = duty
+            self.writes += 1
@@ -1,31 +1,61 @@
 import pwmio
-from adafruit_motor import servo
-import time
+from fastservo import FastServo
 import sys
 import math
 import digitalio
 import busio
 import usb_cdc
+from motion import CoordinatedMove, LinearMove
+from teleop import VelocityTeleop
+from trajectory import TrajectoryPlayer, TrajectoryReader, Recorder
+from scheduler import FrameScheduler, PWM_FREQUENCY
+from servomodel import ServoModel
+from iktable import IKTable
+from constraints import ConstraintEnvelope
+from log import get_logger, DEBUG
+import clock as firmware_clock
+import kinematics
 
+log = get_logger("harvestar")
 
-def seconds_since_boot():
-    return f"{time.monotonic():.3f}"
 
 class ServoMotor:
-    def __init__(self, pin, name, min_pulse=750, max_pulse=1500, actuation_range=180, start_angle=0):
-        self.pwm = pwmio.PWMOut(pin, duty_cycle=2 ** 15, frequency=50)
-        self.servo = servo.Servo(self.pwm, min_pulse=min_pulse, max_pulse=max_pulse, actuation_range=actuation_range)
+    def __init__(self, pin, name, min_pulse=750, max_pulse=1500, actuation_range=180, start_angle=0, max_speed=120, max_accel=600,
+                 calibration=None):
+        self.pwm = pwmio.PWMOut(pin, duty_cycle=2 ** 15, frequency=PWM_FREQUENCY)
+        # Angle to duty cycle table, from measured (angle, pulse µs) calibration points if given, see fastservo.py
+        self.servo = FastServo(self.pwm, min_pulse=min_pulse, max_pulse=max_pulse, actuation_range=actuation_range,
+                               calibration=calibration)
         self.name = name
         self.start_angle = start_angle
         self.untested = True
+        # Motion limits in servo degrees, used to shape the velocity profile of every move
+        self.max_speed = max_speed  # °/s
+        self.max_accel = max_accel  # °/s²
 
 class HarveStar:
-    def __init__(self, base_pin, shoulder_pin, elbow_pin, end_effector_pin):
+    def __init__(self, base_pin, shoulder_pin, elbow_pin, end_effector_pin, constraints=None, clock=None):
         # Initialize servos with names
-        self.base = ServoMotor(base_pin, "Base", min_pulse=500, max_pulse=2500, actuation_range=180, start_angle=90)
-        self.shoulder = ServoMotor(shoulder_pin, "Shoulder", min_pulse=500, max_pulse=1500, actuation_range=90, start_angle=0)
-        self.elbow = ServoMotor(elbow_pin, "Elbow", min_pulse=500, max_pulse=1500, actuation_range=90, start_angle=60)
-        self.end_effector = ServoMotor(end_effector_pin, "End_effector", min_pulse=850, max_pulse=2000, actuation_range=90, start_angle=90)
+        speed, accel = kinematics.MAX_SPEED, kinematics.MAX_ACCEL
+        self.base = ServoMotor(base_pin, "Base", min_pulse=500, max_pulse=2500, actuation_range=180, start_angle=90, max_speed=speed[0], max_accel=accel[0])
+        self.shoulder = ServoMotor(shoulder_pin, "Shoulder", min_pulse=500, max_pulse=1500, actuation_range=90, start_angle=0, max_speed=speed[1], max_accel=accel[1])
+        self.elbow = ServoMotor(elbow_pin, "Elbow", min_pulse=500, max_pulse=1500, actuation_range=90, start_angle=60, max_speed=speed[2], max_accel=accel[2])
+        self.end_effector = ServoMotor(end_effector_pin, "End_effector", min_pulse=850, max_pulse=2000, actuation_range=90, start_angle=kinematics.END_EFFECTOR_MAX, max_speed=speed[3], max_accel=accel[3])
+        self.motors = [self.base, self.shoulder, self.elbow, self.end_effector]
+        self.servos = [motor.servo for motor in self.motors]
+        self.arm = [self.base, self.shoulder, self.elbow]
+
+        # Time source for every sleep and timestamp, see clock.py
+        self.clock = clock if clock is not None else firmware_clock.get()
+
+        # One setpoint per PWM frame, on absolute deadlines, for blocking moves and tick()
+        self.frames = FrameScheduler(self.clock)
+
+        # Shoulder/elbow envelope, compiled once; pass a ConstraintEnvelope for a different arm
+        self.envelope = constraints if constraints is not None else ConstraintEnvelope(kinematics.CONSTRAINTS)
+
+        # "s_curve" or "trapezoid" velocity profile for every move
+        self.profile_shape = "s_curve"
 
         # Initialize servo angles
         self.base.servo.angle = self.base.start_angle
@@ -33,163 +63,400 @@ class HarveStar:
         self.elbow.servo.angle = self.elbow.start_angle
         self.end_effector.servo.angle = self.end_effector.start_angle
 
+        # Where each horn physically is, estimated from the setpoints written; see await_settled()
+        self.models = [ServoModel(slew, tau, kinematics.SETTLE_TOLERANCE) for slew, tau in kinematics.SERVO_DYNAMICS]
+        now = self.clock.monotonic()
+        for model, servo in zip(self.models, self.servos):
+            model.reset(servo.angle, now)
+
+        # Non-blocking move advanced by tick()
+        self._move = None
+        self._move_started = 0
+        self.wrote = False  # the last tick() changed a duty cycle on some pin
+
+        # Last commanded tool position, unknown until the first move
+        self.position = None
+
+        # Optional precomputed IK lookup, see load_ik_table()
+        self.ik_table = None
+
+        # Setpoint recording for replay, see start_recording()
+        self.recorder = None
+
     def check_constraints(self, shoulder_angle, elbow_angle, base_angle):
-        # Absolute bounds
-        if not (0 <= shoulder_angle <= 90):
-            print(f"⚠️ Shoulder angle out of bounds: {math.ceil(shoulder_angle)}° (must be 0–90°)")
-            return False
-        if not (0 <= elbow_angle <= 90):
-            print(f"⚠️ Elbow angle out of bounds: {math.ceil(elbow_angle)}° (must be 0–90°)")
+        if not (0 <= base_angle <= self.base.servo.actuation_range):
+            log.warning("Base angle out of bounds: %d° (must be 0–%d°)", math.ceil(base_angle), self.base.servo.actuation_range)
             return False
+        if self.envelope.check(shoulder_angle, elbow_angle):
+            return True
 
-        # Constraint table checks
-        constraints = [
-            (0, 5, 55, 90),
-            (5, 10, 40, 90),
-            (10, 15, 40, 90),
-            (15, 20, 35, 90),
-            (20, 25, 25, 90),
-            (25, 30, 20, 90),
-            (30, 35, 15, 90),
-            (35, 40, 10, 90),
-            (40, 45, 5, 90),
-            (45, 50, 5, 90),
-            (50, 55, 0, 90),
-            (55, 60, 0, 90),
-            (60, 65, 0, 80),
-            (65, 70, 0, 80),
-            (70, 75, 0, 70),
-            (75, 80, 0, 65),
-            (80, 85, 0, 60),
-            (85, 90, 0, 60)
-        ]
-
-        for s_low, s_high, e_low, e_high in constraints:
-            if s_low <= shoulder_angle < s_high and not (e_low <= elbow_angle <= e_high):
-                print(f"⚠️ Consasdtraint violated: Shoulder {math.ceil(shoulder_angle)}°, Elbow {math.ceil(elbow_angle)}° — valid elbow range for this shoulder: {e_low}-{e_high}°")
-                return False
+        # Only explain the failure once we know there is one
+        envelope = self.envelope
+        if not (0 <= shoulder_angle <= envelope.shoulder_max):
+            log.warning("Shoulder angle out of bounds: %d° (must be 0–%d°)", math.ceil(shoulder_angle), envelope.shoulder_max)
+        elif not (0 <= elbow_angle <= envelope.elbow_max):
+            log.warning("Elbow angle out of bounds: %d° (must be 0–%d°)", math.ceil(elbow_angle), envelope.elbow_max)
+        else:
+            e_low, e_high = envelope.elbow_range(shoulder_angle)
+            log.warning("Constraint violated: Shoulder %d°, Elbow %d° — valid elbow range for this shoulder: %d-%d°",
+                        math.ceil(shoulder_angle), math.ceil(elbow_angle), e_low, e_high)
+        return False
+
+    def check_end_effector(self, angle):
+        if kinematics.END_EFFECTOR_MIN <= angle <= kinematics.END_EFFECTOR_MAX:
+            return True
+        log.warning("End effector angle out of bounds: %s° (must be %d–%d°)", angle, kinematics.END_EFFECTOR_MIN,
+                    kinematics.END_EFFECTOR_MAX)
+        return False
 
-        # All checks passed
-        return True
     @staticmethod
     def compute_inverse_kinematics(x, y, z, L1 = 10, L2 = 13.225, L3 = 14.7):
         """Computes the joint angles θ1, θ2, θ3 given (x, y, z) position."""
-
-        r = math.sqrt(x**2 + y**2)  # Horizontal distance
-        d = math.sqrt(r**2 + (z - L1)**2)  # Distance from shoulder to target
-        if d > (L2 + L3):
-            raise ValueError("ERROR: Target position is out of reach!")
-
-        theta1 = math.atan2(y, x) * (180 / math.pi)  # No need for absolute value
-        theta3 = math.acos((L2**2 + L3**2 - d**2) / (2 * L2 * L3)) * (180 / math.pi)
-        alpha = math.atan2(z - L1, r) * (180 / math.pi)  # No need for absolute value
-        beta = math.acos((L2**2 + d**2 - L3**2) / (2 * L2 * d)) * (180 / math.pi)
-        
-        theta2 = alpha + beta 
-        print("Moving to positoins: ", x, y, z) 
-        print("Using angles: ", theta1, theta2, theta3)
+        theta1, theta2, theta3 = kinematics.inverse_kinematics(x, y, z, L1, L2, L3)
+        if log.enabled(DEBUG):
+            log.debug("Moving to positions: %.2f %.2f %.2f", x, y, z)
+            log.debug("Using angles: %.2f %.2f %.2f", theta1, theta2, theta3)
 
         return theta1, theta2, theta3
     
     @staticmethod
-    def compute_forward_kinematics(theta1, theta2, theta3, alpha, L1=10, L2=13.225, L3=14.7):
-        """
-        Computes the (x, y, z) position given joint angles θ1, θ2, θ3.
-        Angles are assumed in degrees; this function internally converts to radians.
-        """
-        import math
-        
-        # Convert degrees to radians
-        t1 = math.radians(theta1)
-        t2 = math.radians(theta2)
-        t3 = math.radians(theta3)
-
-        # Planar XY distances before base rotation (theta1)
-        # x' and z' come from the 2D forward kinematics in the plane
-        x_prime = L2 * math.cos(t2) + L3 * math.cos(180-(theta2-alpha)-theta3-alpha) #Matts custum attempt (fail)
-        z_prime = L2 * math.sin(t2) + L3 * math.sin(t2 + t3) #Chat GPT o1 attempt (fail)
-
-        # Incorporate the rotation about z-axis (theta1) and base offset L1
-        x = x_prime * math.cos(t1)
-        y = x_prime * math.sin(t1)
-        z = L1 + z_prime
-        
-        print(f"Forward kinematics calculated from (θ1, θ2, θ3)=({theta1}, {theta2}, {theta3}): ({x:.3f}, {y:.3f}, {z:.3f})")
+    def compute_forward_kinematics(theta1, theta2, theta3, L1 = 10, L2 = 13.225, L3 = 14.7):
+        """
+        Computes the (x, y, z) position given joint angles θ1, θ2, θ3 in degrees, as returned by
+        compute_inverse_kinematics().
+        """
+        x, y, z = kinematics.forward_kinematics(theta1, theta2, theta3, L1, L2, L3)
+        if log.enabled(DEBUG):
+            log.debug("Forward kinematics calculated from (θ1, θ2, θ3)=(%.2f, %.2f, %.2f): (%.3f, %.3f, %.3f)",
+                      theta1, theta2, theta3, x, y, z)
         return x, y, z
 
+    def current_position(self):
+        """Returns the tool tip (x, y, z) the servos are set to right now."""
+        return kinematics.tool_position(self.base.servo.angle, self.shoulder.servo.angle, self.elbow.servo.angle)
 
-    def smooth_move(self, servo, target_angle, delay, step = 1):
-        current = servo.angle
-        if current is None:
-            current = target_angle
-        if target_angle > current:
-            step = abs(step)
-        else:
-            step = -abs(step)
+    def smooth_move(self, servo, target_angle, delay=0):
+        """Moves one servo to target_angle along a velocity profile, at most one degree per `delay` seconds."""
+        for motor in self.motors:
+            if motor.servo is servo:
+                self.coordinated_move([motor], [target_angle], delay)
+                return
+        servo.angle = target_angle
 
-        for angle in range(int(current), int(target_angle), step):
-            servo.angle = angle
-            time.sleep(delay)
+    def coordinated_move(self, motors, targets, delay=0):
+        """
+        Moves all motors together so they arrive at their targets at the same time. Writes one setpoint per PWM
+        frame, sampled at the frame's deadline rather than whenever the pass woke up.
+        """
+        move = CoordinatedMove(motors, targets, delay, self.profile_shape)
+        frames = self.frames
+        started = frames.start()
+        while True:
+            elapsed = frames.deadline - started
+            for servo, angle in zip(move.servos, move.angles_at(elapsed)):
+                servo.angle = angle
+            now = self.clock.monotonic()
+            self._track(now)
+            if elapsed >= move.duration:
+                return
+            frames.advance(now)
+            frames.sleep()
+
+    def load_ik_table(self, path):
+        """Loads a precomputed IK table (see control-script/build_ik_table.py) used in place of the exact solve."""
+        self.ik_table = IKTable.load(path)
+
+    def solve_joint_angles(self, x, y, z):
+        """Returns the (base, shoulder, elbow) servo angles for a tool position, or None if they break the constraints."""
+        base_angle = math.atan2(y, x) * (180 / math.pi)  # No need for absolute value
 
-        servo.angle = target_angle  # final correction
+        # Table lookup when the point is well inside the workspace, exact solve near the edges
+        angles = None
+        if self.ik_table is not None:
+            angles = self.ik_table.lookup(math.sqrt(x * x + y * y), z)
+        if angles is not None:
+            base_angle = base_angle * kinematics.BASE_SCALE
+            shoulder_angle, elbow_angle = angles
+        else:
+            try:
+                theta1, theta2, theta3 = HarveStar.compute_inverse_kinematics(*kinematics.tool_to_wrist(x, y, z))
+            except ValueError:
+                log.warning("Target out of reach: %.2f %.2f %.2f", x, y, z)
+                return None
+            base_angle, shoulder_angle, elbow_angle = kinematics.servo_angles(theta1, theta2, theta3)
 
-    def move_multiple(self, x, y, z, delay):
-        #CHANGE MOVE MULTIPLE ARGUMENTS TO BE X, Y, Z THEN CALL INVERSE KINEMATICS FUNCTION
+        # Verify constraints before moving
+        if not self.check_constraints(shoulder_angle, elbow_angle, base_angle):
+            return None
+        return base_angle, shoulder_angle, elbow_angle
+
+    def _joint_targets(self, x, y, z, end_effector):
+        # Motors and targets for a coordinated move, with the end effector as a fourth axis when it is given
+        angles = self.solve_joint_angles(x, y, z)
+        if angles is None:
+            return None, None
+        if end_effector is None:
+            return self.arm, angles
+        if not self.check_end_effector(end_effector):
+            return None, None
+        return self.motors, (angles[0], angles[1], angles[2], end_effector)
+
+    def move_multiple(self, x, y, z, delay, end_effector=None):
+        """
+        Moves the arm to (x, y, z) with a coordinated move. An `end_effector` angle moves the end effector in
+        the same move, arriving together with the arm.
+        """
+        motors, targets = self._joint_targets(x, y, z, end_effector)
+        if motors is None:
+            return False
 
-        # Start of new stuff
-        # print(f"Old y: {y}, Old x: {x}")
+        # Constraints are satisfied, move the HarveStar
+        self.coordinated_move(motors, targets, delay)
+        self.position = (x, y, z)
+        return True
 
-        base_angle = math.atan2(y, x) * (180 / math.pi)  # No need for absolute value
+    def move_linear(self, x, y, z, speed=8, accel=40, rate=50):
+        """
+        Moves the tool tip along a straight line to (x, y, z) at up to `speed` cm/s, accelerating at up to
+        `accel` cm/s², and solves IK for every sample at `rate` Hz, at most the PWM frame rate.
+        Stops at the last reachable sample if the line leaves the workspace and returns False.
+        """
+        move = LinearMove([self.base.servo, self.shoulder.servo, self.elbow.servo], self.solve_joint_angles,
+                          self._line_start(), (x, y, z), speed, accel, min(rate, PWM_FREQUENCY),
+                          shape=self.profile_shape)
+        frames = self.frames
+        started = frames.start()
+        while True:
+            elapsed = frames.deadline - started
+            angles = move.angles_at(elapsed)
+            if angles is None:
+                self.position = move.last_reachable_point()
+                return False
+            for servo, angle in zip(move.servos, angles):
+                servo.angle = angle
+            now = self.clock.monotonic()
+            self._track(now)
+            if elapsed >= move.duration:
+                break
+
+            # Solve the next samples now, then sleep off whatever is left of the frame
+            move.fill()
+            frames.advance(now)
+            frames.sleep()
+
+        self.position = (x, y, z)
+        return True
 
-        # print(f"Base angle for trig: {base_angle}")
+    def start_move(self, x, y, z, delay=0, end_effector=None):
+        """
+        Starts a coordinated move to (x, y, z), and to an `end_effector` angle if given, without blocking;
+        tick() advances it. A move already in progress is replaced and the new one starts from wherever the
+        servos are now.
+        """
+        motors, targets = self._joint_targets(x, y, z, end_effector)
+        if motors is None:
+            return False
 
+        self._start(CoordinatedMove(motors, targets, delay, self.profile_shape))
+        self.position = (x, y, z)
+        return True
 
-        y -= 10.9 * math.sin(math.radians(base_angle))
-        x -= 10.9 * math.cos(math.radians(base_angle))
-        z += 1.8
+    def start_linear_move(self, x, y, z, speed=8, accel=40, rate=50):
+        """Non-blocking version of move_linear(); tick() streams the samples."""
+        self._start(LinearMove([self.base.servo, self.shoulder.servo, self.elbow.servo], self.solve_joint_angles,
+                               self._line_start(), (x, y, z), speed, accel, min(rate, PWM_FREQUENCY),
+                               shape=self.profile_shape))
+        self.position = (x, y, z)
+        return True
 
-        # print(f"New y: {y}, New x: {x}")
-        # END OF NEW STUFF
+    def start_recording(self, path):
+        """Starts logging every setpoint tick() writes to a trajectory file, for play_trajectory() later."""
+        self.stop_recording()
+        self.recorder = Recorder(path, self.clock)
+        log.info("Recording to %s", path)
 
-        base_angle, shoulder_angle, elbow_angle = HarveStar.compute_inverse_kinematics(x, y, z)
+    def stop_recording(self):
+        if self.recorder is not None:
+            records = self.recorder.close()
+            log.info("Recorded %d setpoints to %s", records, self.recorder.path)
+            self.recorder = None
 
-        base_angle = (base_angle* 1.50)
-        # base_angle = (base_angle* 1.5) - 45
-        
-        shoulder_angle = 110 - shoulder_angle
-        elbow_angle -= shoulder_angle  # GOONER AH LINE THIS SHIT TOOK 1 HOUR
+    def check_trajectory(self, path, speed=1.0):
+        """
+        True if every setpoint of a trajectory file passes check_constraints() and the end effector limits, and
+        no joint has to move faster than its max_speed when played `speed` times as fast.
+        """
+        reader = TrajectoryReader(path)
+        try:
+            previous = None
+            previous_ms = 0
+            while reader.next():
+                base, shoulder, elbow, end_effector = reader.angles
+                if not self.check_constraints(shoulder, elbow, base):
+                    log.warning("%s: setpoint at %.2f s is outside the constraints", path, reader.t_ms / 1000)
+                    return False
+                if not self.check_end_effector(end_effector):
+                    log.warning("%s: end effector at %.2f s is out of range", path, reader.t_ms / 1000)
+                    return False
+                if previous is not None and reader.t_ms > previous_ms:
+                    # A millisecond and a centidegree of slack for the rounding in the records
+                    seconds = (reader.t_ms - previous_ms + 1) / 1000 / speed
+                    for motor, start, end in zip(self.motors, previous, reader.angles):
+                        if abs(end - start) - 0.01 > motor.max_speed * seconds:
+                            log.warning("%s: %s too fast at %.2f s for %.1fx speed", path, motor.name,
+                                        reader.t_ms / 1000, speed)
+                            return False
+                previous = list(reader.angles)
+                previous_ms = reader.t_ms
+        finally:
+            reader.close()
+        return True
 
-        # Verify constraints before moving
-        checked = self.check_constraints(shoulder_angle, elbow_angle, base_angle)
+    def play_trajectory(self, path, speed=1.0):
+        """
+        Plays a trajectory file (see trajectory.py) from the SD card, `speed` times as fast as it was made.
+        The file is checked with check_trajectory() first and refused if it fails. Moves to the first setpoint
+        with a coordinated move and lets it settle; no IK is solved on the way. Returns True once played.
+        """
+        if not self.check_trajectory(path, speed):
+            return False
+        player = TrajectoryPlayer(self.servos, path, speed)
+        log.info("Playing %s: %d setpoints, %.1f s", path, player.reader.records, player.duration)
+        self.coordinated_move(self.motors, player.first_angles())
+        self.await_settled(kinematics.SETTLE_DWELL)  # compile_program.py's settle steps assume playback starts from rest
+        self._start(player)
+        while self.tick():
+            self.frames.sleep()
+        self.position = None  # wherever the trajectory ended, _line_start() works it out from the servos
+        return True
 
-        if(checked):
-        # Constraints are satisfied, move the HarveStar
-            # print(seconds_since_boot() + " - Moving HarveStar... Base: " + str(base_angle) + "°, Shoulder: " + str(shoulder_angle) + "°, Elbow: " + str(elbow_angle) + "°")
-            self.smooth_move(self.base.servo, base_angle, delay)
-            self.smooth_move(self.shoulder.servo, shoulder_angle, delay)
-            self.smooth_move(self.elbow.servo, elbow_angle, delay)
-            return(True)
-        return False
+    def velocity_teleop(self, r, phi, z, ee, **kwargs):
+        """
+        Returns the running VelocityTeleop, or starts one from tool position (r, phi in radians, z) and end
+        effector angle ee. Feed it with command(); tick() moves the arm.
+        """
+        if isinstance(self._move, VelocityTeleop):
+            return self._move
+        teleop = VelocityTeleop(self, r, phi, z, ee, **kwargs)
+        self._start(teleop)
+        return teleop
+
+    def _line_start(self):
+        # A move cut short, or no move yet, leaves the servos somewhere other than the last commanded position
+        if self.position is None or self._move is not None:
+            return self.current_position()
+        return self.position
+
+    def _start(self, move):
+        self._move = move
+        self._move_started = self.clock.monotonic()
+
+    def tick(self):
+        """
+        Advances the current move to where it should be by now. Writes only once the next PWM frame deadline has
+        passed, so calling it more often than the frame rate costs nothing; sleeping on self.frames paces a
+        loop to it. Returns True while the arm is still moving. Sets `wrote` if a servo's duty cycle changed;
+        a setpoint that rounds to the duty already on the pin is not a write.
+        """
+        now = self.clock.monotonic()
+        if not self.frames.due(now):
+            self.wrote = False
+            return self._move is not None  # this frame has its setpoint, the next one picks up the newest
+        self.frames.advance(now)
+        before = self._pwm_writes()
+        moving = self._advance()
+        self.wrote = self._pwm_writes() != before
+        self._track(now)
+        if self.recorder is not None:
+            self.recorder.sample(self.servos)
+        return moving
+
+    def _advance(self):
+        move = self._move
+        if move is None:
+            return False
+
+        elapsed = self.clock.monotonic() - self._move_started
+        angles = move.angles_at(elapsed)
+        if angles is None:
+            # Linear move ran out of reachable samples, stop where it is
+            self.position = move.last_reachable_point()
+            self._move = None
+            return False
+        for servo, angle in zip(move.servos, angles):
+            servo.angle = angle
+        if elapsed >= move.duration:
+            self._move = None
+            return False
+        move.fill()  # get the next samples ready before the next pass
+        return True
 
-    def move_polar(self, r, phi_deg, z):
+    def is_moving(self):
+        return self._move is not None
+
+    def _pwm_writes(self):
+        count = 0
+        for servo in self.servos:
+            count += servo.writes
+        return count
+
+    def _track(self, now):
+        # Feeds the setpoints just written to the servo models; an unchanged setpoint needs nothing
+        for model, servo in zip(self.models, self.servos):
+            angle = servo.angle
+            if angle != model.command:
+                model.update(angle, now)
+
+    def settle_time(self):
+        """Seconds until every servo is expected to be within SETTLE_TOLERANCE of its last setpoint."""
+        now = self.clock.monotonic()
+        longest = 0.0
+        for model in self.models:
+            longest = max(longest, model.settle_time(now))
+        return longest
+
+    def await_settled(self, fallback=None):
+        """
+        Waits until the servos have physically caught up with their setpoints, by the servo models, instead of
+        a fixed dwell. While kinematics.SERVO_DYNAMICS are not fitted to the arm, waits the `fallback` seconds
+        instead if given. Returns the seconds waited.
+        """
+        if fallback is not None and not kinematics.SERVO_DYNAMICS_FITTED:
+            self.wait(fallback)
+            return fallback
+        seconds = self.settle_time()
+        log.info("Settling for %.2f seconds...", seconds)
+        self.clock.sleep(seconds)
+        return seconds
+
+    def move_polar(self, r, phi_deg, z, linear=False, end_effector=None):
+        """
+        Moves to (r, phi in degrees, z). An `end_effector` angle is reached during a joint move; a linear move
+        keeps the tool still while it travels, so the end effector moves first.
+        """
         phi = math.radians(phi_deg)  # convert degrees to radians
         x = r * math.cos(phi)
         y = r * math.sin(phi)
-        worked = self.move_multiple(x, y, z, 0.01)  # reuse your current Cartesian function
+        if linear:
+            worked = end_effector is None or self.end_effector_move(end_effector)
+            worked = worked and self.move_linear(x, y, z)
+        else:
+            worked = self.move_multiple(x, y, z, 0, end_effector)  # full servo speed, the velocity profile keeps the ends smooth
         if worked:
-            print(f"Moving arm to R: {r}, Base angle: {phi_deg}, Height {z}")
+            log.info("Moving arm to R: %s, Base angle: %s, Height %s", r, phi_deg, z)
             return True
         else:
             return False
 
     def wait(self, seconds):
-        print(seconds_since_boot() + " - Waiting for " + str(seconds) + " seconds...")
-        time.sleep(seconds)
+        log.info("Waiting for %s seconds...", seconds)
+        self.clock.sleep(seconds)
 
-    def end_effector_move(self, end_effector_angle):
-        if(end_effector_angle >= 10 or end_effector_angle <= 85):
-            print(seconds_since_boot() + " - Opening end effector to " + str(end_effector_angle) + " degrees")
-            self.end_effector.servo.angle = end_effector_angle
-        else:
-            print(f"Constraint violated: End Effector servo angle must be between 0 and 90. Angle attempted: {end_effector_angle}")
+    def end_effector_move(self, end_effector_angle, delay=0):
+        """Moves the end effector alone along its velocity profile. Returns False if the angle is out of bounds."""
+        if not self.check_end_effector(end_effector_angle):
+            return False
+        log.info("Moving end effector to %s degrees", end_effector_angle)
+        self.coordinated_move([self.end_effector], [end_effector_angle], delay)
+        return True
     
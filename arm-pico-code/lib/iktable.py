@@ -0,0 +1,88 @@
+"""
+Precomputed shoulder/elbow lookup table over the (r, z) workspace.
+
+The table is written on the host by control-script/build_ik_table.py and
+replaces the sqrt/acos/atan2 solve with a bilinear lookup. Cells hold the
+shoulder and elbow servo angles in hundredths of a degree for a tool tip at
+horizontal distance r and height z, plus a flag byte per cell.
+
+File layout (little endian):
+    header  "<4sHHHffff"  magic b"HSIK", version, nr, nz, r0, dr, z0, dz
+    int16[nr * nz]        shoulder, centidegrees, row-major by z then r
+    int16[nr * nz]        elbow, centidegrees
+    uint8[nr * nz]        flags, REACHABLE | IN_ENVELOPE
+"""
+
+import struct
+from array import array
+
+MAGIC = b"HSIK"
+VERSION = 1
+HEADER = "<4sHHHffff"
+
+REACHABLE = 1
+IN_ENVELOPE = 2
+VALID = REACHABLE | IN_ENVELOPE
+
+
+class IKTable:
+    def __init__(self, nr, nz, r0, dr, z0, dz, shoulder=None, elbow=None, flags=None):
+        self.nr = nr
+        self.nz = nz
+        self.r0 = r0
+        self.dr = dr
+        self.z0 = z0
+        self.dz = dz
+        self.shoulder = shoulder if shoulder is not None else array("h", bytes(2 * nr * nz))
+        self.elbow = elbow if elbow is not None else array("h", bytes(2 * nr * nz))
+        self.flags = flags if flags is not None else bytearray(nr * nz)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            header = f.read(struct.calcsize(HEADER))
+            magic, version, nr, nz, r0, dr, z0, dz = struct.unpack(HEADER, header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("Not a HarveStar IK table: " + path)
+            table = cls(nr, nz, r0, dr, z0, dz)
+            f.readinto(table.shoulder)
+            f.readinto(table.elbow)
+            f.readinto(table.flags)
+        return table
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(struct.pack(HEADER, MAGIC, VERSION, self.nr, self.nz, self.r0, self.dr, self.z0, self.dz))
+            f.write(bytes(self.shoulder))
+            f.write(bytes(self.elbow))
+            f.write(bytes(self.flags))
+
+    def lookup(self, r, z):
+        """
+        Returns the bilinearly interpolated (shoulder, elbow) servo angles at (r, z), or None when any of the
+        four surrounding cells is outside the table or not VALID.
+        """
+        fr = (r - self.r0) / self.dr
+        fz = (z - self.z0) / self.dz
+        ir = int(fr)
+        iz = int(fz)
+        if fr < 0 or fz < 0 or ir >= self.nr - 1 or iz >= self.nz - 1:
+            return None
+
+        i = iz * self.nr + ir
+        j = i + self.nr
+        flags = self.flags
+        if flags[i] != VALID or flags[i + 1] != VALID or flags[j] != VALID or flags[j + 1] != VALID:
+            return None
+
+        tr = fr - ir
+        tz = fz - iz
+        w00 = (1 - tr) * (1 - tz)
+        w01 = tr * (1 - tz)
+        w10 = (1 - tr) * tz
+        w11 = tr * tz
+        s = self.shoulder
+        e = self.elbow
+        shoulder = (s[i] * w00 + s[i + 1] * w01 + s[j] * w10 + s[j + 1] * w11) / 100
+        elbow = (e[i] * w00 + e[i + 1] * w01 + e[j] * w10 + e[j + 1] * w11) / 100
+        return shoulder, elbow
@@ -0,0 +1,138 @@
+"""
+HarveStar arm geometry, inverse and forward kinematics.
+
+Pure math with no hardware imports, so the same code runs on the Pico and on
+the host tools in control-script/.
+"""
+
+import math
+
+from constraints import ConstraintEnvelope
+
+# Link lengths in cm
+L1 = 10  # base to shoulder height
+L2 = 13.225  # shoulder to elbow
+L3 = 14.7  # elbow to wrist
+
+# Tool tip offset from the wrist in cm
+TOOL_REACH = 10.9  # out along the base direction
+TOOL_DROP = 1.8  # down
+
+# Mapping from geometric joint angles to servo angles
+BASE_SCALE = 1.5
+SHOULDER_ZERO = 110
+BASE_RANGE = 180  # base servo travel, 0 to this many degrees
+
+# Joint limits in servo degrees, in HarveStar.motors order: base, shoulder, elbow, end effector
+MAX_SPEED = (180, 120, 120, 200)  # °/s
+MAX_ACCEL = (900, 600, 600, 1500)  # °/s²
+
+# How each servo's horn follows its setpoint, (slew °/s, lag time constant s), see servomodel.py. Starting
+# values from the servos' no-load speed ratings; refit them with control-script/fit_settle.py
+SERVO_DYNAMICS = ((400, 0.06), (300, 0.08), (300, 0.08), (500, 0.04))
+SERVO_DYNAMICS_FITTED = False  # True once SERVO_DYNAMICS come from step timings of this arm; until then dwells stay fixed
+SETTLE_TOLERANCE = 1.0  # °, close enough to call a joint settled
+SETTLE_DWELL = 2  # s, fixed dwell for a settle while SERVO_DYNAMICS_FITTED is False
+
+# End effector servo angles that are safe to command, closed to open
+END_EFFECTOR_MIN = 15
+END_EFFECTOR_MAX = 85
+
+# Shoulder/elbow servo envelope: (shoulder_low, shoulder_high, elbow_low, elbow_high) in servo degrees
+CONSTRAINTS = [
+    (0, 5, 55, 90),
+    (5, 10, 40, 90),
+    (10, 15, 40, 90),
+    (15, 20, 35, 90),
+    (20, 25, 25, 90),
+    (25, 30, 20, 90),
+    (30, 35, 15, 90),
+    (35, 40, 10, 90),
+    (40, 45, 5, 90),
+    (45, 50, 5, 90),
+    (50, 55, 0, 90),
+    (55, 60, 0, 90),
+    (60, 65, 0, 80),
+    (65, 70, 0, 80),
+    (70, 75, 0, 70),
+    (75, 80, 0, 65),
+    (80, 85, 0, 60),
+    (85, 90, 0, 60)
+]
+ENVELOPE = ConstraintEnvelope(CONSTRAINTS)
+
+
+def inverse_kinematics(x, y, z, L1=L1, L2=L2, L3=L3):
+    """Computes the joint angles θ1, θ2, θ3 in degrees for a wrist position. Raises ValueError when out of reach."""
+    r = math.sqrt(x**2 + y**2)  # Horizontal distance
+    d = math.sqrt(r**2 + (z - L1)**2)  # Distance from shoulder to target
+    if d > (L2 + L3):
+        raise ValueError("ERROR: Target position is out of reach!")
+
+    theta1 = math.atan2(y, x) * (180 / math.pi)
+    theta3 = math.acos((L2**2 + L3**2 - d**2) / (2 * L2 * L3)) * (180 / math.pi)
+    alpha = math.atan2(z - L1, r) * (180 / math.pi)
+    beta = math.acos((L2**2 + d**2 - L3**2) / (2 * L2 * d)) * (180 / math.pi)
+
+    theta2 = alpha + beta
+    return theta1, theta2, theta3
+
+
+def forward_kinematics(theta1, theta2, theta3, L1=L1, L2=L2, L3=L3):
+    """Computes the wrist (x, y, z) for joint angles θ1, θ2, θ3 in degrees. Exact inverse of inverse_kinematics()."""
+    t2 = math.radians(theta2)
+    t23 = math.radians(theta2 + theta3)
+
+    # Upper arm rises at θ2 from the shoulder; θ3 is the inside angle at the elbow, so the forearm
+    # points along θ2 + θ3 - 180°
+    r = L2 * math.cos(t2) - L3 * math.cos(t23)
+    z = L1 + L2 * math.sin(t2) - L3 * math.sin(t23)
+
+    t1 = math.radians(theta1)
+    return r * math.cos(t1), r * math.sin(t1), z
+
+
+def tool_to_wrist(x, y, z):
+    """Shifts a tool tip position back to the wrist position the IK works on."""
+    base_angle = math.atan2(y, x)
+    return x - TOOL_REACH * math.cos(base_angle), y - TOOL_REACH * math.sin(base_angle), z + TOOL_DROP
+
+
+def servo_angles(theta1, theta2, theta3):
+    """Maps geometric joint angles to (base, shoulder, elbow) servo angles."""
+    shoulder_angle = SHOULDER_ZERO - theta2
+    return theta1 * BASE_SCALE, shoulder_angle, theta3 - shoulder_angle
+
+
+def geometric_angles(base_angle, shoulder_angle, elbow_angle):
+    """Maps (base, shoulder, elbow) servo angles back to geometric joint angles θ1, θ2, θ3."""
+    return base_angle / BASE_SCALE, SHOULDER_ZERO - shoulder_angle, elbow_angle + shoulder_angle
+
+
+def joint_angles(x, y, z):
+    """Returns the (base, shoulder, elbow) servo angles for a tool tip position. Raises ValueError when out of reach."""
+    return servo_angles(*inverse_kinematics(*tool_to_wrist(x, y, z)))
+
+
+def tool_position(base_angle, shoulder_angle, elbow_angle):
+    """Returns the tool tip (x, y, z) for servo angles. Exact inverse of joint_angles()."""
+    theta1, theta2, theta3 = geometric_angles(base_angle, shoulder_angle, elbow_angle)
+    x, y, z = forward_kinematics(theta1, theta2, theta3)
+    t1 = math.radians(theta1)
+    return x + TOOL_REACH * math.cos(t1), y + TOOL_REACH * math.sin(t1), z - TOOL_DROP
+
+
+def use_envelope(envelope):
+    """Makes within_constraints() and within_limits() check a ConstraintEnvelope other than CONSTRAINTS."""
+    global ENVELOPE
+    ENVELOPE = envelope
+
+
+def within_constraints(shoulder_angle, elbow_angle):
+    """True if a shoulder/elbow servo pair is inside the absolute bounds and the envelope, CONSTRAINTS by default."""
+    return ENVELOPE.check(shoulder_angle, elbow_angle)
+
+
+def within_limits(base_angle, shoulder_angle, elbow_angle):
+    """within_constraints() plus the base range: the servo angles HarveStar.check_constraints() accepts."""
+    return 0 <= base_angle <= BASE_RANGE and ENVELOPE.check(shoulder_angle, elbow_angle)
@@ -0,0 +1,167 @@
+"""
+Small level-gated logger for the HarveStar firmware.
+
+Messages use %-style arguments that are only formatted when the level is
+enabled, so a disabled debug line costs a comparison and nothing else:
+
+    log = get_logger("harvestar")
+    log.debug("Using angles: %.1f %.1f %.1f", theta1, theta2, theta3)
+
+For call sites hot enough that building the argument tuple matters, guard
+with `if log.enabled(DEBUG):`.
+
+With use_ring_buffer() enabled, records with up to three numeric arguments
+are packed into a preallocated binary ring instead of being printed, and
+flush() formats and prints them later, e.g. while the arm is idle.
+"""
+
+import struct
+import clock
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+_level = INFO
+_ring = None
+_loggers = {}
+
+
+def set_level(level):
+    global _level
+    _level = level
+
+
+def get_logger(name):
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers[name] = Logger(name)
+    return logger
+
+
+def use_ring_buffer(records=128):
+    """Sends numeric log records to a binary ring of `records` entries instead of printing them right away."""
+    global _ring
+    _ring = RingBuffer(records) if records else None
+
+
+def flush(limit=None):
+    """Prints up to `limit` buffered records, oldest first. Returns the number printed."""
+    if _ring is None:
+        return 0
+    return _ring.flush(limit)
+
+
+def _emit(level, name, text, seconds=None):
+    if seconds is None:
+        seconds = clock.monotonic()
+    if level >= WARNING:
+        print(f"{seconds:.3f} - {LEVEL_NAMES.get(level, level)} {name}: {text}")
+    else:
+        print(f"{seconds:.3f} - {name}: {text}")
+
+
+class RingBuffer:
+    """
+    Fixed-size ring of packed log records: milliseconds since boot, level, logger id, message id and up to
+    three float arguments. Logger names and message strings are kept once in lookup lists; when the ring is
+    full the oldest record is overwritten and counted in `dropped`.
+    """
+    RECORD = "<IBBHfff"
+
+    def __init__(self, records):
+        self.size = struct.calcsize(self.RECORD)
+        self.records = records
+        self.buffer = bytearray(self.size * records)
+        self.head = 0  # next slot to write
+        self.count = 0
+        self.dropped = 0
+        self.names = []
+        self.messages = []
+        self._ids = {}
+
+    def append(self, level, name, msg, args):
+        """Packs one record. Returns False for records that can't be stored and must be printed instead."""
+        if len(args) > 3:
+            return False
+        for arg in args:
+            if not isinstance(arg, (int, float)):
+                return False
+        a = args[0] if len(args) > 0 else 0
+        b = args[1] if len(args) > 1 else 0
+        c = args[2] if len(args) > 2 else 0
+
+        name_id = self._name_id(name)
+        msg_id = self._message_id(msg, len(args))
+        struct.pack_into(self.RECORD, self.buffer, self.head * self.size,
+                         (clock.monotonic_ns() // 1000000) & 0xFFFFFFFF, level, name_id, msg_id, a, b, c)
+        self.head = (self.head + 1) % self.records
+        if self.count < self.records:
+            self.count += 1
+        else:
+            self.dropped += 1
+        return True
+
+    def _name_id(self, name):
+        try:
+            return self.names.index(name)
+        except ValueError:
+            self.names.append(name)
+            return len(self.names) - 1
+
+    def _message_id(self, msg, nargs):
+        key = (msg, nargs)
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self.messages)
+            self.messages.append(key)
+        return i
+
+    def flush(self, limit=None):
+        printed = 0
+        if self.dropped:
+            _emit(WARNING, "log", f"{self.dropped} buffered log records dropped")
+            self.dropped = 0
+        while self.count and (limit is None or printed < limit):
+            slot = (self.head - self.count) % self.records
+            millis, level, name_id, msg_id, a, b, c = struct.unpack_from(self.RECORD, self.buffer, slot * self.size)
+            msg, nargs = self.messages[msg_id]
+            text = msg % (a, b, c)[:nargs] if nargs else msg
+            _emit(level, self.names[name_id], text, millis / 1000)
+            self.count -= 1
+            printed += 1
+        return printed
+
+
+class Logger:
+    def __init__(self, name):
+        self.name = name
+
+    def enabled(self, level):
+        return level >= _level
+
+    def log(self, level, msg, *args):
+        if level < _level:
+            return
+        if _ring is not None and _ring.append(level, self.name, msg, args):
+            return
+        _emit(level, self.name, msg % args if args else msg)
+
+    def debug(self, msg, *args):
+        if DEBUG >= _level:
+            self.log(DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        if INFO >= _level:
+            self.log(INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        if WARNING >= _level:
+            self.log(WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        if ERROR >= _level:
+            self.log(ERROR, msg, *args)
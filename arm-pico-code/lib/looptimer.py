@@ -0,0 +1,95 @@
+"""
+Per-stage timing of a control loop, kept in preallocated rings.
+
+Each pass calls begin(), then mark() after every stage it wants timed. Stage
+durations and the begin-to-begin loop period go into fixed arrays of
+microseconds, so timing a pass costs a few monotonic_ns() calls and allocates
+nothing beyond the timestamps themselves. stats() works out min/mean/p99 of a
+stage when asked for it, which is the only place that sorts or allocates.
+
+    timer = LoopTimer(TELEOP_STAGES)
+    while True:
+        timer.begin()
+        commands.poll()
+        timer.mark(READ)
+        ...
+"""
+
+from array import array
+
+import clock
+
+# Stages of the controlled-mode loop in code.py; host tools use the same names for the reports
+TELEOP_STAGES = ("read", "solve", "tick", "idle", "rx_to_write")
+READ = 0  # polling the data port and decoding a frame
+SOLVE = 1  # IK, constraint check and retargeting, only on passes that got a frame
+TICK = 2  # advancing the move, i.e. the servo writes
+IDLE = 3  # log flush and the loop sleep
+RX_TO_WRITE = 4  # frame decoded to the servo write that acts on it
+
+# Stage index used for the loop period itself in reports
+LOOP = 0xFF
+MAX_MICROS = 0xFFFFFFFF
+
+
+class LoopTimer:
+    def __init__(self, stages, samples=128):
+        self.stages = stages
+        self.samples = samples
+        self.rings = [array("L", [0] * samples) for _ in stages]
+        self.heads = array("H", [0] * len(stages))
+        self.counts = array("H", [0] * len(stages))
+        self.period = array("L", [0] * samples)
+        self.period_head = 0
+        self.period_count = 0
+        self._begin = None
+        self._last = 0
+
+    def begin(self):
+        """Starts a pass and records the time since the previous one as the loop period."""
+        now = clock.monotonic_ns()
+        if self._begin is not None:
+            self.period[self.period_head] = min((now - self._begin) // 1000, MAX_MICROS)
+            self.period_head = (self.period_head + 1) % self.samples
+            if self.period_count < self.samples:
+                self.period_count += 1
+        self._begin = self._last = now
+        return now
+
+    def mark(self, stage):
+        """Records the time since the last begin(), mark() or skip() as one sample of `stage`."""
+        now = clock.monotonic_ns()
+        self.record(stage, now - self._last)
+        self._last = now
+        return now
+
+    def skip(self):
+        """Restarts the stage clock without recording, for a stage that did not run this pass."""
+        self._last = clock.monotonic_ns()
+        return self._last
+
+    def record(self, stage, nanoseconds):
+        """Adds one sample of `stage` measured elsewhere, e.g. a span across several stages."""
+        head = self.heads[stage]
+        self.rings[stage][head] = min(nanoseconds // 1000, MAX_MICROS)
+        self.heads[stage] = (head + 1) % self.samples
+        if self.counts[stage] < self.samples:
+            self.counts[stage] += 1
+
+    def reset(self):
+        for stage in range(len(self.stages)):
+            self.heads[stage] = self.counts[stage] = 0
+        self.period_head = self.period_count = 0
+        self._begin = None
+
+    def stats(self, stage):
+        """Returns (count, min, mean, p99) in microseconds for a stage, or for the loop period with LOOP."""
+        if stage == LOOP:
+            ring, count = self.period, self.period_count
+        else:
+            ring, count = self.rings[stage], self.counts[stage]
+        if not count:
+            return 0, 0, 0, 0
+        values = sorted(ring[:count])
+        p99 = values[min(count - 1, (count * 99) // 100)]
+        return count, values[0], sum(values) // count, p99
@@ -0,0 +1,178 @@
+"""Coordinated joint motion for the HarveStar arm."""
+
+import math
+
+
+class VelocityProfile:
+    """Position over time for a rest-to-rest move with a speed and acceleration limit.
+
+    "trapezoid" ramps the speed up and down at a constant acceleration. "s_curve"
+    shapes the acceleration as a sine bump instead, which keeps the jerk finite
+    at the start and end of the ramps at the cost of slightly longer ramps. Moves
+    too short to reach `max_speed` get a lower peak speed with no cruise phase.
+    """
+
+    def __init__(self, distance, max_speed, max_accel, shape="s_curve"):
+        self.distance = distance
+        self.s_curve = shape == "s_curve"
+        if distance <= 0:
+            self.speed = self.ramp_time = self.ramp_distance = self.cruise_time = self.duration = 0
+            self.accel = max_accel
+            return
+
+        # Peak acceleration, and the distance covered by one ramp to full speed
+        self.accel = max_accel
+        speed = max_speed
+        ramp_distance = speed * speed / max_accel if self.s_curve else speed * speed / (2 * max_accel)
+        if 2 * ramp_distance > distance:
+            speed = math.sqrt(distance * max_accel / 2) if self.s_curve else math.sqrt(distance * max_accel)
+            ramp_distance = distance / 2
+
+        self.speed = speed
+        self.ramp_time = 2 * speed / max_accel if self.s_curve else speed / max_accel
+        self.ramp_distance = ramp_distance
+        self.cruise_time = (distance - 2 * ramp_distance) / speed
+        self.duration = 2 * self.ramp_time + self.cruise_time
+
+    def _ramp(self, t):
+        # Distance covered t seconds into the speed-up ramp
+        if self.s_curve:
+            # Two nearly equal terms for small t; rounding can leave a hair below zero, which would overshoot the target
+            k = self.ramp_time / (2 * math.pi)
+            return max(0.0, self.accel / 2 * (t * t / 2 - k * k * (1 - math.cos(t / k))))
+        return self.accel * t * t / 2
+
+    def position(self, t):
+        """Returns the distance covered t seconds into the move."""
+        if t <= 0:
+            return 0
+        if t >= self.duration:
+            return self.distance
+        if t < self.ramp_time:
+            return self._ramp(t)
+        if t < self.ramp_time + self.cruise_time:
+            return self.ramp_distance + self.speed * (t - self.ramp_time)
+        return self.distance - self._ramp(self.duration - t)
+
+
+class CoordinatedMove:
+    """Moves several servos together on one shared velocity profile.
+
+    All joints follow the same normalised profile scaled by their own angle
+    change, so they start and arrive at the same moment. The profile's speed and
+    acceleration are the tightest of the per-joint limits once scaled, which
+    keeps every joint within its own `max_speed` and `max_accel` and makes the
+    move last as long as the slowest joint needs.
+
+    `motors` are ServoMotor objects; `delay` optionally caps the speed of every
+    joint at one degree per `delay` seconds.
+    """
+
+    def __init__(self, motors, targets, delay=0, shape="s_curve"):
+        self.servos = [motor.servo for motor in motors]
+        self.targets = targets
+        self.starts = []
+        for servo, target in zip(self.servos, targets):
+            current = servo.angle
+            if current is None:
+                current = target
+            self.starts.append(current)
+
+        max_speed = max_accel = None
+        for motor, start, target in zip(motors, self.starts, targets):
+            change = abs(target - start)
+            if change < 0.01:
+                continue
+            speed = motor.max_speed
+            if delay > 0:
+                speed = min(speed, 1 / delay)
+            if max_speed is None or speed / change < max_speed:
+                max_speed = speed / change
+            if max_accel is None or motor.max_accel / change < max_accel:
+                max_accel = motor.max_accel / change
+
+        if max_speed is None:
+            self.profile = VelocityProfile(0, 1, 1, shape)
+        else:
+            self.profile = VelocityProfile(1, max_speed, max_accel, shape)
+        self.duration = self.profile.duration
+
+    def fill(self):
+        """Nothing to precompute for a joint move."""
+        return True
+
+    def angles_at(self, elapsed):
+        """Returns the setpoints due `elapsed` seconds into the move."""
+        if elapsed >= self.duration:
+            return list(self.targets)
+        fraction = self.profile.position(elapsed)
+        return [start + (target - start) * fraction for start, target in zip(self.starts, self.targets)]
+
+
+class LinearMove:
+    """Moves the tool along a straight line in Cartesian space.
+
+    The tool moves along the line from `start` to `target` with a velocity
+    profile limited to `speed` and `accel`. The line is sampled at a fixed control rate and every
+    sample is turned into joint angles by `solve(x, y, z)`, which returns None for
+    a point the arm cannot reach. Samples are solved into a small lookahead buffer
+    ahead of the one being output, so the IK for the next points is done during
+    the wait for the next control period instead of delaying the current write.
+    """
+
+    def __init__(self, servos, solve, start, target, speed, accel, rate=50, lookahead=4, shape="s_curve"):
+        self.servos = servos
+        self.solve = solve
+        self.start = start
+        self.target = target
+        self.period = 1 / rate
+
+        self.distance = math.sqrt(sum((b - a) ** 2 for a, b in zip(start, target)))
+        self.profile = VelocityProfile(self.distance, speed, accel, shape)
+        self.samples = max(1, math.ceil(self.profile.duration * rate))
+        self.duration = (self.samples - 1) * self.period
+
+        self._buffer = [None] * lookahead
+        self._next = 1  # next sample to be output
+        self._solved = 0  # last sample that is in the buffer
+        self._blocked_at = self.samples + 1  # first sample that could not be solved
+
+    def point(self, i):
+        """Returns the (x, y, z) of sample i of self.samples."""
+        if i >= self.samples or self.distance == 0:
+            return tuple(self.target)
+        fraction = self.profile.position(i * self.period) / self.distance
+        return tuple(a + (b - a) * fraction for a, b in zip(self.start, self.target))
+
+    def last_reachable_point(self):
+        """Returns the (x, y, z) of the last sample before the line became unreachable."""
+        return self.point(min(self.samples, self._blocked_at - 1))
+
+    def fill(self):
+        """Solves samples ahead of the output until the lookahead buffer is full or a sample is unreachable."""
+        last = min(self.samples, self._next + len(self._buffer) - 1)
+        while self._solved < last and self._solved + 1 < self._blocked_at:
+            i = self._solved + 1
+            angles = self.solve(*self.point(i))
+            if angles is None:
+                self._blocked_at = i
+                return False
+            self._buffer[i % len(self._buffer)] = angles
+            self._solved = i
+        return self._next < self._blocked_at
+
+    def angles(self, i):
+        """Returns the joint angles of sample i, or None if the line is blocked before it."""
+        if i > self._solved:
+            # Not solved ahead of time, skip the samples we are already too late for and solve it now
+            self._solved = i - 1
+            self._next = i
+            self.fill()
+        if i >= self._blocked_at:
+            return None
+        self._next = i + 1
+        return self._buffer[i % len(self._buffer)]
+
+    def angles_at(self, elapsed):
+        """Returns the joint angles due `elapsed` seconds into the move, or None if the line is blocked."""
+        return self.angles(min(self.samples, int(elapsed / self.period) + 1))
@@ -0,0 +1,323 @@
+"""
+Binary framed serial protocol between control-script/controlarm.py and the Pico.
+
+Every frame is FRAME_SIZE bytes:
+
+    0       SYNC (0xA5)
+    1       frame type
+    2-3     sequence number, uint16 little endian
+    4-11    payload, 8 bytes, layout depends on the type
+    12      CRC-8 (poly 0x07) over bytes 1-11
+
+KEYS payload:
+    4-5     held-key bitmask, uint16 little endian (KEY_* bits)
+    6-9     velocity vector vr, vphi, vz, vee, int8 each
+    10      flags: FLAG_ACK asks for an ACK frame once the command reached the servos,
+            FLAG_VELOCITY makes the frame a velocity command (held state) instead of one step
+    11      reserved, zero
+
+STATS, PC to Pico: request for the loop timing report, payload all zero.
+STATS, Pico to PC: one frame per timed stage, answering the request's sequence number:
+    4       stage index into looptimer.TELEOP_STAGES, or 0xFF for the loop period
+    5       sample count, saturated at 255
+    6-7     min, microseconds, uint16 little endian, saturated at 65535
+    8-9     mean
+    10-11   99th percentile
+
+ACK, Pico to PC: answers a KEYS frame sent with FLAG_ACK, same sequence number:
+    4-7     firmware monotonic time the frame was decoded, microseconds, uint32 little endian (wraps)
+    8-11    firmware monotonic time of the servo write that acted on it
+
+REPLAY, PC to Pico: play back the last teleop recording:
+    4-5     speed in hundredths, uint16 little endian (100 = as recorded, 200 = twice as fast)
+
+This module is shared by the firmware and the PC, so it only uses what
+CircuitPython has.
+"""
+
+from array import array
+
+SYNC = 0xA5
+FRAME_SIZE = 13
+PAYLOAD_SIZE = 8
+
+# Frame types
+KEYS = 0x01
+STATS = 0x02
+ACK = 0x03
+REPLAY = 0x04
+
+# KEYS flags
+FLAG_ACK = 0x01
+FLAG_VELOCITY = 0x02
+
+# Key bits, in the order of KEY_NAMES
+KEY_W = 1 << 0  # forward in radial direction
+KEY_S = 1 << 1  # backward
+KEY_A = 1 << 2  # rotate left
+KEY_D = 1 << 3  # rotate right
+KEY_UP = 1 << 4  # move up
+KEY_DOWN = 1 << 5  # move down
+KEY_Q = 1 << 6  # close end effector
+KEY_E = 1 << 7  # open end effector
+KEY_SPACE = 1 << 8
+
+KEY_NAMES = ("w", "s", "a", "d", "up", "down", "q", "e", "space")
+
+
+def _crc8_table():
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data, start=0, end=None):
+    if end is None:
+        end = len(data)
+    crc = 0
+    for i in range(start, end):
+        crc = CRC8_TABLE[crc ^ data[i]]
+    return crc
+
+
+def key_mask(names):
+    """Returns the KEY_* bitmask for an iterable of key names."""
+    mask = 0
+    for name in names:
+        if name in KEY_NAMES:
+            mask |= 1 << KEY_NAMES.index(name)
+    return mask
+
+
+def pack_frame(buf, frame_type, seq, payload=b""):
+    """Writes a frame into the first FRAME_SIZE bytes of buf."""
+    buf[0] = SYNC
+    buf[1] = frame_type
+    buf[2] = seq & 0xFF
+    buf[3] = (seq >> 8) & 0xFF
+    for i in range(PAYLOAD_SIZE):
+        buf[4 + i] = payload[i] if i < len(payload) else 0
+    buf[12] = crc8(buf, 1, 12)
+    return buf
+
+
+def encode_keys(seq, keys, vr=0, vphi=0, vz=0, vee=0, flags=0):
+    """Returns a KEYS frame as bytes."""
+    payload = bytes([keys & 0xFF, (keys >> 8) & 0xFF, vr & 0xFF, vphi & 0xFF, vz & 0xFF, vee & 0xFF, flags])
+    return bytes(pack_frame(bytearray(FRAME_SIZE), KEYS, seq, payload))
+
+
+def encode_stats_request(seq):
+    """Returns a STATS request frame as bytes."""
+    return bytes(pack_frame(bytearray(FRAME_SIZE), STATS, seq))
+
+
+def encode_replay(seq, speed=1.0):
+    """Returns a REPLAY frame as bytes."""
+    hundredths = max(1, min(0xFFFF, round(speed * 100)))
+    return bytes(pack_frame(bytearray(FRAME_SIZE), REPLAY, seq, bytes([hundredths & 0xFF, hundredths >> 8])))
+
+
+def pack_stats(buf, seq, stage, count, low, mean, p99):
+    """Writes a STATS report frame into buf. Times are in microseconds and saturate at 65535."""
+    buf[4] = stage
+    buf[5] = min(count, 0xFF)
+    _put_u16(buf, 6, low)
+    _put_u16(buf, 8, mean)
+    _put_u16(buf, 10, p99)
+    return _seal(buf, STATS, seq)
+
+
+def pack_ack(buf, seq, received_us, written_us):
+    """Writes an ACK frame into buf. Times are microseconds and wrap at 2**32."""
+    _put_u32(buf, 4, received_us)
+    _put_u32(buf, 8, written_us)
+    return _seal(buf, ACK, seq)
+
+
+def _seal(buf, frame_type, seq):
+    # Header and CRC around a payload already written in place
+    buf[0] = SYNC
+    buf[1] = frame_type
+    buf[2] = seq & 0xFF
+    buf[3] = (seq >> 8) & 0xFF
+    buf[12] = crc8(buf, 1, 12)
+    return buf
+
+
+def _put_u16(buf, offset, value):
+    value = min(value, 0xFFFF)
+    buf[offset] = value & 0xFF
+    buf[offset + 1] = value >> 8
+
+
+def _put_u32(buf, offset, value):
+    for i in range(4):
+        buf[offset + i] = (value >> (8 * i)) & 0xFF
+
+
+def _u16(buf, offset):
+    return buf[offset] | (buf[offset + 1] << 8)
+
+
+def _u32(buf, offset):
+    return buf[offset] | (buf[offset + 1] << 8) | (buf[offset + 2] << 16) | (buf[offset + 3] << 24)
+
+
+def _int8(value):
+    return value - 256 if value > 127 else value
+
+
+class FrameReader:
+    """
+    Parses frames from a serial port without allocating.
+
+    Bytes are read into one preallocated buffer through views made up front for every fill level. poll()
+    decodes at most one frame into the reader's fields and drops the bytes it consumed; anything that does not
+    start with SYNC or fails the CRC is skipped a byte at a time until the stream lines up again.
+
+    poll_latest() is the firmware's version: it empties the port every call so a backlog can't build up, keeps
+    the newest KEYS frame and adds up what the step frames before it asked for.
+    """
+
+    def __init__(self, serial, capacity=64):
+        self.serial = serial
+        serial.timeout = 0  # readinto returns whatever is there instead of waiting
+        self.buffer = bytearray(capacity)
+        view = memoryview(self.buffer)
+        self._tails = [view[i:] for i in range(capacity)]
+        self.length = 0
+
+        # Fields of the last good frame
+        self.type = 0
+        self.seq = 0
+        self.keys = 0
+        self.vr = 0
+        self.vphi = 0
+        self.vz = 0
+        self.vee = 0
+        self.flags = 0
+        self.stage = 0  # STATS reports
+        self.count = 0
+        self.min_us = 0
+        self.mean_us = 0
+        self.p99_us = 0
+        self.received_us = 0  # ACK frames
+        self.written_us = 0
+        self.speed = 1.0  # REPLAY frames
+        self.errors = 0  # bytes skipped while resyncing
+
+        # Totals from the last poll_latest()
+        self.steps = array("H", [0] * len(KEY_NAMES))  # step frames (no FLAG_VELOCITY) each key was held in
+        self.merged = 0  # KEYS frames merged
+        self.ack_seq = -1  # newest merged frame that asked for an ACK, or -1
+        self.stats_seq = -1  # newest STATS request, or -1
+        self.replay_seq = -1  # newest REPLAY request, or -1; its speed is in `speed`
+
+    def _drop(self, count):
+        buf = self.buffer
+        for i in range(count, self.length):
+            buf[i - count] = buf[i]
+        self.length -= count
+
+    def _read(self):
+        if self.length < len(self.buffer) and self.serial.in_waiting:
+            count = self.serial.readinto(self._tails[self.length])
+            if count:
+                self.length += count
+
+    def poll(self):
+        """Reads what is waiting and decodes the next frame. Returns True if one was decoded."""
+        self._read()
+        return self._decode()
+
+    def poll_latest(self):
+        """
+        Reads everything waiting and decodes all of it. The fields hold the newest KEYS frame, with FLAG_ACK
+        set if any merged frame asked for one; `steps` counts per key how many step frames held it, and
+        `stats_seq` and `replay_seq` are the newest STATS and REPLAY requests. Returns the number of KEYS frames merged.
+        """
+        steps = self.steps
+        for i in range(len(steps)):
+            steps[i] = 0
+        self.merged = 0
+        self.ack_seq = self.stats_seq = self.replay_seq = -1
+        keys_seq = 0
+        while True:
+            self._read()
+            while self._decode():
+                if self.type == KEYS:
+                    self.merged += 1
+                    keys_seq = self.seq
+                    if self.flags & FLAG_ACK:
+                        self.ack_seq = self.seq
+                    if not self.flags & FLAG_VELOCITY:
+                        keys = self.keys
+                        for i in range(len(steps)):
+                            if keys & (1 << i):
+                                steps[i] += 1
+                elif self.type == STATS:
+                    self.stats_seq = self.seq
+                elif self.type == REPLAY:
+                    self.replay_seq = self.seq
+            if not self.serial.in_waiting:
+                break
+
+        if self.merged:
+            # A STATS request after the newest KEYS frame only changed the header fields
+            self.type = KEYS
+            self.seq = keys_seq
+        if self.ack_seq >= 0:
+            self.flags |= FLAG_ACK
+        return self.merged
+
+    def _decode(self):
+        buf = self.buffer
+        while self.length >= FRAME_SIZE:
+            if buf[0] != SYNC or crc8(buf, 1, 12) != buf[12]:
+                self._drop(1)
+                self.errors += 1
+                continue
+
+            self.type = buf[1]
+            self.seq = _u16(buf, 2)
+            if self.type == KEYS:
+                self.keys = _u16(buf, 4)
+                self.vr = _int8(buf[6])
+                self.vphi = _int8(buf[7])
+                self.vz = _int8(buf[8])
+                self.vee = _int8(buf[9])
+                self.flags = buf[10]
+            elif self.type == STATS:
+                self.stage = buf[4]
+                self.count = buf[5]
+                self.min_us = _u16(buf, 6)
+                self.mean_us = _u16(buf, 8)
+                self.p99_us = _u16(buf, 10)
+            elif self.type == ACK:
+                self.received_us = _u32(buf, 4)
+                self.written_us = _u32(buf, 8)
+            elif self.type == REPLAY:
+                self.speed = _u16(buf, 4) / 100
+            self._drop(FRAME_SIZE)
+            return True
+
+        # Nothing complete yet, keep the buffer from filling up with a partial frame that has no sync byte
+        while self.length and buf[0] != SYNC:
+            self._drop(1)
+            self.errors += 1
+        return False
+
+    def drain(self):
+        """Throws away everything waiting on the port."""
+        while self.serial.in_waiting:
+            self.length = 0
+            self._read()
+        self.length = 0
@@ -0,0 +1,42 @@
+"""
+Setpoint output aligned to the servos' PWM frames.
+
+A hobby servo reads its pulse width once per PWM period (20 ms at 50 Hz), so a
+second write in the same period is never seen. FrameScheduler keeps a grid of
+absolute deadlines one period apart: the writer outputs once per deadline and
+sleeps to the next one. Sleeping to a deadline instead of for a fixed time
+keeps the work done between writes from adding up, so a move sampled on the
+grid takes as long as planned. A pass that overruns skips the deadlines it
+missed instead of writing several times to catch up.
+"""
+
+PWM_FREQUENCY = 50  # Hz, every ServoMotor's PWMOut
+PWM_PERIOD = 1 / PWM_FREQUENCY
+
+
+class FrameScheduler:
+    def __init__(self, clock, period=PWM_PERIOD):
+        self.clock = clock
+        self.period = period
+        self.deadline = clock.monotonic()  # next frame a setpoint is due
+
+    def start(self):
+        """Puts the next deadline at now. Returns it."""
+        self.deadline = self.clock.monotonic()
+        return self.deadline
+
+    def due(self, now):
+        """True if a setpoint is due: `now` has reached the next deadline."""
+        return now >= self.deadline
+
+    def advance(self, now):
+        """Moves to the next deadline after `now`, skipping any already passed. Returns the new deadline."""
+        deadline = self.deadline + self.period
+        if now >= deadline:
+            deadline += (int((now - deadline) / self.period) + 1) * self.period
+        self.deadline = deadline
+        return deadline
+
+    def sleep(self):
+        """Sleeps until the next deadline."""
+        self.clock.sleep(self.deadline - self.clock.monotonic())
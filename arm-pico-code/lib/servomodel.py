@@ -0,0 +1,72 @@
+"""
+How far a servo horn lags behind the angle it is given.
+
+A hobby servo turns towards its commanded angle at up to `slew` °/s and, near
+the target, closes the remaining error like a first-order lag with time
+constant `tau` s. Put together, the horn moves at the full slew rate while the
+error is above slew * tau and decays exponentially below that. The commanded
+angle only changes at a setpoint write and is constant in between, so
+ServoModel integrates that piece exactly at every write instead of stepping it.
+
+With the model fed every setpoint, settle_time() says how much longer the horn
+needs to get within `tolerance` degrees of the last command. The parameters
+come from timing step moves, see control-script/fit_settle.py.
+"""
+
+import math
+
+
+class ServoModel:
+    def __init__(self, slew, tau, tolerance=1.0):
+        self.slew = slew  # °/s
+        self.tau = tau  # s
+        self.tolerance = tolerance  # °
+        self.position = 0.0  # modelled horn angle
+        self.command = 0.0
+        self.updated = 0.0  # time position was worked out for
+
+    def reset(self, angle, now):
+        """The horn is at `angle` and holding it."""
+        self.position = self.command = angle
+        self.updated = now
+
+    def update(self, command, now):
+        """Moves the horn on to `now` under the previous command, then makes `command` the new one."""
+        self._advance(now - self.updated)
+        self.updated = now
+        self.command = command
+
+    def _advance(self, dt):
+        error = self.command - self.position
+        sign = 1 if error >= 0 else -1
+        error = abs(error)
+        knee = self.slew * self.tau
+        if error > knee:
+            # Slew limited until the error is down to the knee
+            slewing = (error - knee) / self.slew
+            if dt <= slewing:
+                self.position += sign * self.slew * dt
+                return
+            dt -= slewing
+            error = knee
+        self.position = self.command - sign * error * math.exp(-dt / self.tau)
+
+    def settle_time(self, now):
+        """Seconds after `now` until the horn is within `tolerance` of the command, if the command holds."""
+        self._advance(now - self.updated)
+        self.updated = now
+        return step_settle_time(abs(self.command - self.position), self.slew, self.tau, self.tolerance)
+
+
+def step_settle_time(error, slew, tau, tolerance=1.0):
+    """Seconds a servo at rest needs to get within `tolerance` of a target `error` degrees away."""
+    if error <= tolerance:
+        return 0.0
+    seconds = 0.0
+    knee = slew * tau
+    if error > knee:
+        seconds = (error - knee) / slew
+        error = knee
+    if error > tolerance:
+        seconds += tau * math.log(error / tolerance)
+    return seconds
@@ -0,0 +1,155 @@
+"""
+Velocity teleop: the PC sends what it wants the tool to do, the Pico moves it.
+
+Each command is a velocity in cylindrical coordinates, either from held keys
+(KEY_* bits, full speed along each axis) or from the int8 velocity fields of a
+KEYS frame scaled so 127 is full speed. VelocityTeleop integrates it at a fixed
+control rate on the firmware clock, so the arm moves at the same speed however
+often or unevenly the commands arrive. The speed ramps at `accel`, and a
+watchdog brings the arm to a stop if no command arrives for `timeout` seconds.
+
+It follows the same interface as the moves in motion.py, so HarveStar.tick()
+drives it, and it finishes once it has come to rest.
+"""
+
+import math
+
+import kinematics
+import protocol
+
+# Key bits and the axis (r, phi, z, end effector) and direction each one drives
+KEY_AXES = (
+    (protocol.KEY_W, 0, 1), (protocol.KEY_S, 0, -1),
+    (protocol.KEY_D, 1, 1), (protocol.KEY_A, 1, -1),
+    (protocol.KEY_UP, 2, 1), (protocol.KEY_DOWN, 2, -1),
+    (protocol.KEY_E, 3, 1), (protocol.KEY_Q, 3, -1),
+)
+
+
+class VelocityTeleop:
+    def __init__(self, harvestar, r, phi, z, ee, rate=50, timeout=0.5,
+                 speed=5.0, turn_rate=30.0, ee_speed=60.0, accel=20.0):
+        self.harvestar = harvestar
+        self.servos = harvestar.servos
+        self.period = 1 / rate
+        self.timeout = timeout
+        self.duration = float("inf")  # runs until it comes to rest
+
+        # Tool position in cylindrical coordinates, phi in radians like code.py
+        self.r = r
+        self.phi = phi
+        self.z = z
+        self.ee = ee
+        self.angles = [servo.angle for servo in self.servos]
+
+        # Full speed along each axis in cm/s, rad/s, cm/s and °/s, and how fast the speed may change
+        self.max_speed = (speed, math.radians(turn_rate), speed, ee_speed)
+        self.ramp = [limit * accel / speed * self.period for limit in self.max_speed]  # per control step
+        self.command_velocity = [0.0, 0.0, 0.0, 0.0]
+        self.velocity = [0.0, 0.0, 0.0, 0.0]
+
+        self.blocked = [0, 0, 0]  # direction r, phi and z last hit the workspace edge in, 0 while free
+        self.steps = 0  # control steps integrated so far
+        self.last_command = 0  # elapsed time of the last command, for the watchdog
+        self.started = harvestar.clock.monotonic()
+
+    def command(self, keys=0, vr=0, vphi=0, vz=0, vee=0):
+        """Sets the velocity to reach, from held keys if any, otherwise from the int8 velocity fields."""
+        target = self.command_velocity
+        previous = tuple(target)
+        if keys:
+            for axis in range(4):
+                target[axis] = 0.0
+            for bit, axis, direction in KEY_AXES:
+                if keys & bit:
+                    target[axis] += direction * self.max_speed[axis]
+        else:
+            for axis, value in enumerate((vr, vphi, vz, vee)):
+                target[axis] = self.max_speed[axis] * max(-127, min(127, value)) / 127
+        self.last_command = self.harvestar.clock.monotonic() - self.started
+        if tuple(target) != previous:
+            for axis in range(3):
+                self.blocked[axis] = 0
+        if self.duration != float("inf") and (keys or vr or vphi or vz or vee):
+            self.duration = float("inf")  # came to rest but was not replaced yet, keep going
+
+    def fill(self):
+        """Nothing to precompute, every step depends on the latest command."""
+        return True
+
+    def angles_at(self, elapsed):
+        """Integrates every control step due by `elapsed` and returns the joint angles to write."""
+        while (self.steps + 1) * self.period <= elapsed:
+            self.steps += 1
+            self._step(self.steps * self.period)
+        return self.angles
+
+    def _step(self, now):
+        # Watchdog: commands stopped arriving, slow down to a stop
+        if now - self.last_command > self.timeout:
+            for axis in range(4):
+                self.command_velocity[axis] = 0.0
+
+        moving = False
+        for axis in range(4):
+            error = self.command_velocity[axis] - self.velocity[axis]
+            ramp = self.ramp[axis]
+            self.velocity[axis] += max(-ramp, min(ramp, error))
+            if axis < 3 and self.velocity[axis] * self.blocked[axis] > 0:
+                self.velocity[axis] = 0.0  # no speed builds up against the edge, so a new command starts from rest
+            if self.velocity[axis]:
+                moving = True
+        if not moving:
+            if not any(self.command_velocity):
+                self.duration = now  # at rest, HarveStar.tick() lets go of it
+            return
+
+        vr, vphi, vz, vee = self.velocity
+        if (vr or vphi or vz) and not self._move(vr, vphi, vz):
+            # Hold at the edge of the workspace instead of pushing into it (and logging it every step): stop the
+            # axes that cannot move on their own and carry on along the rest, sliding along the edge
+            velocity = self.velocity
+            for axis in range(3):
+                if velocity[axis] and self._solve(velocity[0] if axis == 0 else 0.0,
+                                                  velocity[1] if axis == 1 else 0.0,
+                                                  velocity[2] if axis == 2 else 0.0) is None:
+                    self.blocked[axis] = 1 if velocity[axis] > 0 else -1
+                    velocity[axis] = 0.0
+            if not self._move(velocity[0], velocity[1], velocity[2]):
+                # Only the combination is blocked, stop all of it
+                for axis in range(3):
+                    if velocity[axis]:
+                        self.blocked[axis] = 1 if velocity[axis] > 0 else -1
+                        velocity[axis] = 0.0
+        if vee:
+            dt = self.period
+            self.ee = max(kinematics.END_EFFECTOR_MIN, min(kinematics.END_EFFECTOR_MAX, self.ee + vee * dt))
+            self.angles[3] = self.ee
+
+    def _solve(self, vr, vphi, vz):
+        # Joint angles one control step along (vr, vphi, vz), or None if they break the constraints or speeds
+        dt = self.period
+        r, phi, z = self.r + vr * dt, self.phi + vphi * dt, self.z + vz * dt
+        angles = self.harvestar.solve_joint_angles(r * math.cos(phi), r * math.sin(phi), z)
+        if angles is None or not self._within_speed(angles):
+            return None
+        return angles
+
+    def _move(self, vr, vphi, vz):
+        # Takes one control step along (vr, vphi, vz) if it can; standing still always can
+        if not (vr or vphi or vz):
+            return True
+        angles = self._solve(vr, vphi, vz)
+        if angles is None:
+            return False
+        dt = self.period
+        self.r, self.phi, self.z = self.r + vr * dt, self.phi + vphi * dt, self.z + vz * dt
+        self.angles[0], self.angles[1], self.angles[2] = angles
+        return True
+
+    def _within_speed(self, angles):
+        # A small Cartesian step near a singularity can still ask a joint to jump
+        for motor, current, target in zip(self.harvestar.arm, self.angles, angles):
+            if abs(target - current) > motor.max_speed * self.period:
+                return False
+        return True
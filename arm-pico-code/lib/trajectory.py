@@ -0,0 +1,183 @@
+"""
+Joint-space trajectories stored on the SD card and played back without IK.
+
+A trajectory is a list of time-stamped setpoints for all four servos. The
+player holds each setpoint until the next record is due, so dwells need no
+records and a recording only has to log the setpoints that were sent.
+Trajectories are written by control-script/compile_program.py from a motion
+program, or recorded from teleop with Recorder.
+
+File layout (little endian):
+    header  "<4sHHII"  magic b"HSTR", version, sample rate in Hz (informational), record count, duration in ms
+    records "<I4h"     time in ms, then base, shoulder, elbow, end effector in centidegrees
+
+The header is written last (TrajectoryWriter.close() seeks back to it), so a
+file whose record count is 0 was cut short and is refused.
+"""
+
+import struct
+
+MAGIC = b"HSTR"
+VERSION = 1
+HEADER = "<4sHHII"
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD = "<I4h"
+RECORD_SIZE = struct.calcsize(RECORD)
+JOINTS = 4
+
+
+class TrajectoryWriter:
+    """Appends records through a preallocated block that is written out whenever it fills up."""
+
+    def __init__(self, path, rate=50, block=64):
+        self.file = open(path, "wb")
+        self.rate = rate
+        self.buffer = bytearray(RECORD_SIZE * block)
+        self.used = 0
+        self.records = 0
+        self.last_ms = 0
+        self.file.write(bytes(HEADER_SIZE))  # filled in by close()
+
+    def write(self, t_ms, base, shoulder, elbow, end_effector):
+        """Adds one setpoint, angles in degrees, t_ms counted from the start of the trajectory."""
+        struct.pack_into(RECORD, self.buffer, self.used, int(t_ms), round(base * 100), round(shoulder * 100),
+                         round(elbow * 100), round(end_effector * 100))
+        self.used += RECORD_SIZE
+        self.records += 1
+        self.last_ms = int(t_ms)
+        if self.used == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.used:
+            self.file.write(memoryview(self.buffer)[:self.used])
+            self.used = 0
+
+    def close(self):
+        self.flush()
+        self.file.seek(0)
+        self.file.write(struct.pack(HEADER, MAGIC, VERSION, self.rate, self.records, self.last_ms))
+        self.file.close()
+
+
+class Recorder:
+    """
+    Records the setpoints the servos are actually given, for replay with HarveStar.play_trajectory().
+
+    sample() is called every control pass and only logs the servo angles when one of them changed, so an idle
+    arm costs nothing on the card. Records go out through TrajectoryWriter in blocks of `block` records.
+    """
+
+    def __init__(self, path, clock, rate=50, block=128):
+        self.writer = TrajectoryWriter(path, rate, block)
+        self.path = path
+        self.clock = clock
+        self.started = clock.monotonic()
+        self.last = [None] * JOINTS
+
+    def sample(self, servos):
+        last = self.last
+        changed = False
+        for i in range(JOINTS):
+            angle = servos[i].angle
+            if angle != last[i]:
+                last[i] = angle
+                changed = True
+        if changed:
+            self.writer.write((self.clock.monotonic() - self.started) * 1000, last[0], last[1], last[2], last[3])
+
+    def close(self):
+        """Writes out the last block and the header. Returns the number of records."""
+        self.writer.close()
+        return self.writer.records
+
+
+class TrajectoryReader:
+    """Reads records a block at a time into one preallocated buffer."""
+
+    def __init__(self, path, block=64):
+        self.file = open(path, "rb")
+        magic, version, self.rate, self.records, self.duration_ms = struct.unpack(HEADER, self.file.read(HEADER_SIZE))
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError("Not a HarveStar trajectory: " + path)
+        if not self.records:
+            self.file.close()
+            raise ValueError("Trajectory was not closed properly: " + path)
+        self.buffer = bytearray(RECORD_SIZE * block)
+        self.available = 0  # bytes of the buffer holding unread records
+        self.offset = 0
+        self.read = 0  # records handed out so far
+
+        # Fields of the current record, angles in degrees
+        self.t_ms = 0
+        self.angles = [0.0] * JOINTS
+
+    def refill(self):
+        """Reads the next block if the current one is used up. Returns False at the end of the file."""
+        if self.offset < self.available:
+            return True
+        if self.read >= self.records:
+            return False
+        self.available = self.file.readinto(self.buffer) or 0
+        self.available -= self.available % RECORD_SIZE
+        self.offset = 0
+        return self.available > 0
+
+    def next(self):
+        """Moves to the next record. Returns False at the end of the trajectory."""
+        if not self.refill():
+            return False
+        self.t_ms, b, s, e, g = struct.unpack_from(RECORD, self.buffer, self.offset)
+        angles = self.angles
+        angles[0] = b / 100
+        angles[1] = s / 100
+        angles[2] = e / 100
+        angles[3] = g / 100
+        self.offset += RECORD_SIZE
+        self.read += 1
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+class TrajectoryPlayer:
+    """
+    Plays a trajectory file through HarveStar.tick(), following the move interface from motion.py.
+
+    `speed` scales time, 2.0 plays twice as fast. Records are read from the card a block at a time in fill(),
+    after the servo write, so the read never delays a setpoint.
+    """
+
+    def __init__(self, servos, path, speed=1.0, block=64):
+        self.servos = servos
+        self.reader = TrajectoryReader(path, block)
+        self.speed = speed
+        self.duration = self.reader.duration_ms / 1000 / speed
+        self.reader.next()
+        self.angles = list(self.reader.angles)  # setpoint being held
+        self.done = False
+
+    def first_angles(self):
+        """Setpoints of the first record, where the arm has to be before playback starts."""
+        return self.angles
+
+    def fill(self):
+        """Reads the next block ahead of time if the current one is used up."""
+        if not self.done:
+            self.reader.refill()
+        return True
+
+    def angles_at(self, elapsed):
+        """Returns the newest setpoint due `elapsed` seconds into playback."""
+        now_ms = elapsed * 1000 * self.speed
+        reader = self.reader
+        while not self.done and reader.t_ms <= now_ms:
+            angles = self.angles
+            for i in range(JOINTS):
+                angles[i] = reader.angles[i]
+            if not reader.next():
+                self.done = True
+                reader.close()
+        return self.angles
@@ -0,0 +1,138 @@
+"""
+NumPy batch kinematics for planning and validating HarveStar paths on the PC.
+
+Same math as arm-pico-code/lib/kinematics.py and HarveStar.solve_joint_angles(),
+applied to whole arrays at once and without any printing. Points the scalar
+solver would reject with a ValueError come back as NaN with a False mask
+instead.
+
+    python batch_kinematics.py               # check against the scalar firmware functions
+"""
+import os
+import sys
+
+import numpy as np
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib")
+sys.path.insert(0, LIB_DIR)
+
+import kinematics
+
+
+def inverse_kinematics(x, y, z, L1=kinematics.L1, L2=kinematics.L2, L3=kinematics.L3):
+    """Returns arrays of θ1, θ2, θ3 in degrees for wrist positions, and a mask of the reachable ones."""
+    x, y, z = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(z, dtype=float))
+    r = np.hypot(x, y)
+    d = np.hypot(r, z - L1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cos_theta3 = (L2**2 + L3**2 - d**2) / (2 * L2 * L3)
+        cos_beta = (L2**2 + d**2 - L3**2) / (2 * L2 * d)
+        reachable = (d <= L2 + L3) & (np.abs(cos_theta3) <= 1) & (np.abs(cos_beta) <= 1)
+
+        theta1 = np.degrees(np.arctan2(y, x))
+        theta3 = np.degrees(np.arccos(np.where(reachable, cos_theta3, np.nan)))
+        alpha = np.degrees(np.arctan2(z - L1, r))
+        beta = np.degrees(np.arccos(np.where(reachable, cos_beta, np.nan)))
+
+    theta2 = alpha + beta
+    theta1 = np.where(reachable, theta1, np.nan)
+    return theta1, theta2, theta3, reachable
+
+
+def tool_to_wrist(x, y, z):
+    """Shifts tool tip positions back to the wrist positions the IK works on."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    base_angle = np.arctan2(y, x)
+    return (x - kinematics.TOOL_REACH * np.cos(base_angle),
+            y - kinematics.TOOL_REACH * np.sin(base_angle),
+            np.asarray(z, dtype=float) + kinematics.TOOL_DROP)
+
+
+def servo_angles(theta1, theta2, theta3):
+    """Maps geometric joint angles to (base, shoulder, elbow) servo angles."""
+    shoulder = kinematics.SHOULDER_ZERO - theta2
+    return theta1 * kinematics.BASE_SCALE, shoulder, theta3 - shoulder
+
+
+def forward_kinematics(theta1, theta2, theta3, L1=kinematics.L1, L2=kinematics.L2, L3=kinematics.L3):
+    """Returns wrist (x, y, z) arrays for θ1, θ2, θ3 arrays in degrees."""
+    t2 = np.radians(theta2)
+    t23 = np.radians(np.asarray(theta2) + theta3)
+    r = L2 * np.cos(t2) - L3 * np.cos(t23)
+    z = L1 + L2 * np.sin(t2) - L3 * np.sin(t23)
+    t1 = np.radians(theta1)
+    return r * np.cos(t1), r * np.sin(t1), z
+
+
+def tool_position(base, shoulder, elbow):
+    """Batch version of kinematics.tool_position(): tool tip (x, y, z) arrays for servo angle arrays."""
+    base = np.asarray(base, dtype=float)
+    shoulder = np.asarray(shoulder, dtype=float)
+    theta1 = base / kinematics.BASE_SCALE
+    x, y, z = forward_kinematics(theta1, kinematics.SHOULDER_ZERO - shoulder, np.asarray(elbow) + shoulder)
+    t1 = np.radians(theta1)
+    return x + kinematics.TOOL_REACH * np.cos(t1), y + kinematics.TOOL_REACH * np.sin(t1), z - kinematics.TOOL_DROP
+
+
+def constraint_mask(shoulder, elbow, envelope=None):
+    """Returns a mask of the shoulder/elbow servo pairs inside the bounds and the constraint envelope."""
+    envelope = envelope or kinematics.ENVELOPE
+    shoulder = np.asarray(shoulder, dtype=float)
+    elbow = np.asarray(elbow, dtype=float)
+    with np.errstate(invalid="ignore"):
+        ok = (shoulder >= 0) & (shoulder <= envelope.shoulder_max) & (elbow >= 0) & (elbow <= envelope.elbow_max)
+        band = np.where(ok, shoulder, 0).astype(int) // envelope.band
+        low = np.frombuffer(envelope.elbow_low, dtype=np.uint8)[band]
+        high = np.frombuffer(envelope.elbow_high, dtype=np.uint8)[band]
+        ok &= (elbow >= low) & (elbow <= high)
+    return ok
+
+
+def joint_angles(x, y, z):
+    """
+    Batch version of HarveStar.solve_joint_angles() for tool tip positions.
+
+    Returns (base, shoulder, elbow, reachable, valid): servo angle arrays (NaN where unreachable), the mask of
+    reachable points and the mask of points that are reachable, within the base range and inside the constraint
+    envelope.
+    """
+    theta1, theta2, theta3, reachable = inverse_kinematics(*tool_to_wrist(x, y, z))
+    base, shoulder, elbow = servo_angles(theta1, theta2, theta3)
+    with np.errstate(invalid="ignore"):
+        valid = reachable & (base >= 0) & (base <= kinematics.BASE_RANGE) & constraint_mask(shoulder, elbow)
+    return base, shoulder, elbow, reachable, valid
+
+
+def verify(samples=100000, seed=0):
+    """Compares the batch IK with the scalar firmware one on random points. Returns (worst angle error, mismatches)."""
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-45, 45, samples)
+    y = rng.uniform(-45, 45, samples)
+    z = rng.uniform(-25, 45, samples)
+    base, shoulder, elbow, reachable, valid = joint_angles(x, y, z)
+
+    worst = 0.0
+    mismatches = 0
+    for i in range(samples):
+        try:
+            expected = kinematics.joint_angles(x[i], y[i], z[i])
+        except ValueError:
+            mismatches += bool(reachable[i])
+            continue
+        if not reachable[i]:
+            mismatches += 1
+            continue
+        worst = max(worst, abs(base[i] - expected[0]), abs(shoulder[i] - expected[1]), abs(elbow[i] - expected[2]))
+        mismatches += bool(valid[i]) != kinematics.within_limits(*expected)
+
+    print(f"Checked {samples} points: {int(reachable.sum())} reachable, {int(valid.sum())} valid")
+    print(f"  mask mismatches:   {mismatches}")
+    print(f"  worst angle error: {worst:.2e}°")
+    return worst, mismatches
+
+
+if __name__ == "__main__":
+    worst, mismatches = verify()
+    sys.exit(0 if mismatches == 0 and worst < 1e-6 else 1)
@@ -0,0 +1,131 @@
+"""
+Builds the HarveStar IK lookup table on the PC.
+
+Sweeps the (r, z) workspace of the tool tip with the same link lengths, tool
+offsets and servo mapping as the firmware and writes the grid to
+arm-pico-code/sd/ik_table.bin, which HarveStar.load_ik_table() reads from /sd.
+
+    python build_ik_table.py                 # build with the default 0.5 cm grid
+    python build_ik_table.py --step 1.0      # coarser, smaller table
+    python build_ik_table.py --check         # report the table's error against the exact solver
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib")
+sys.path.insert(0, LIB_DIR)
+
+import kinematics
+from constraints import ConstraintEnvelope
+from iktable import IKTable, REACHABLE, IN_ENVELOPE, VALID
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "sd", "ik_table.bin")
+CARD_CONSTRAINTS = os.path.join(os.path.dirname(DEFAULT_OUT), "constraints.txt")  # the firmware's /sd/constraints.txt
+
+# Tool tip workspace covered by the table, in cm. Anything outside falls back to the exact solver.
+R_MIN = kinematics.TOOL_REACH
+R_MAX = kinematics.TOOL_REACH + kinematics.L2 + kinematics.L3
+Z_MIN = kinematics.L1 - kinematics.L2 - kinematics.L3 - kinematics.TOOL_DROP
+Z_MAX = kinematics.L1 + kinematics.L2 + kinematics.L3 - kinematics.TOOL_DROP
+
+
+def exact(r, z):
+    """Returns (shoulder, elbow, flags) for a tool tip at (r, z) with the exact solver."""
+    try:
+        _, shoulder, elbow = kinematics.joint_angles(r, 0, z)
+    except ValueError:
+        return 0, 0, 0
+    flags = REACHABLE
+    if kinematics.within_constraints(shoulder, elbow):
+        flags |= IN_ENVELOPE
+    return shoulder, elbow, flags
+
+
+def fill(r0, z0, nr, nz, step):
+    table = IKTable(nr, nz, r0, step, z0, step)
+    for iz in range(nz):
+        for ir in range(nr):
+            shoulder, elbow, flags = exact(r0 + ir * step, z0 + iz * step)
+            i = iz * nr + ir
+            table.shoulder[i] = int(round(shoulder * 100))
+            table.elbow[i] = int(round(elbow * 100))
+            table.flags[i] = flags
+    return table
+
+
+def build(step):
+    """Sweeps the whole reach of the arm, then crops the grid to the cells inside the constraint envelope."""
+    nr = int(math.ceil((R_MAX - R_MIN) / step)) + 1
+    nz = int(math.ceil((Z_MAX - Z_MIN) / step)) + 1
+    full = fill(R_MIN, Z_MIN, nr, nz, step)
+
+    cells = [(i % nr, i // nr) for i in range(nr * nz) if full.flags[i] == VALID]
+    if not cells:
+        return full
+    ir_low = min(ir for ir, _ in cells)
+    ir_high = max(ir for ir, _ in cells)
+    iz_low = min(iz for _, iz in cells)
+    iz_high = max(iz for _, iz in cells)
+    return fill(R_MIN + ir_low * step, Z_MIN + iz_low * step, ir_high - ir_low + 1, iz_high - iz_low + 1, step)
+
+
+def check(table, samples):
+    """Compares table lookups against the exact solver at random points and prints the error."""
+    rng = random.Random(0)
+    worst_shoulder = worst_elbow = total = 0
+    hits = misses = wrong = 0
+    for _ in range(samples):
+        r = rng.uniform(R_MIN, R_MAX)
+        z = rng.uniform(Z_MIN, Z_MAX)
+        shoulder, elbow, flags = exact(r, z)
+        angles = table.lookup(r, z)
+        if angles is None:
+            if flags == VALID:
+                misses += 1  # valid point the table leaves to the exact solver
+            continue
+        if flags != VALID:
+            wrong += 1  # the table accepts a point the exact solver rejects
+            continue
+        hits += 1
+        error_shoulder = abs(angles[0] - shoulder)
+        error_elbow = abs(angles[1] - elbow)
+        worst_shoulder = max(worst_shoulder, error_shoulder)
+        worst_elbow = max(worst_elbow, error_elbow)
+        total += error_shoulder + error_elbow
+
+    print(f"Checked {samples} random points against the exact solver")
+    print(f"  table hits:           {hits}")
+    print(f"  valid, left to exact: {misses}")
+    print(f"  accepted but invalid: {wrong}")
+    if hits:
+        print(f"  worst shoulder error: {worst_shoulder:.3f}°")
+        print(f"  worst elbow error:    {worst_elbow:.3f}°")
+        print(f"  mean joint error:     {total / (2 * hits):.3f}°")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the HarveStar IK lookup table")
+    parser.add_argument("--step", type=float, default=0.5, help="grid spacing in cm")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="output file")
+    parser.add_argument("--check", action="store_true", help="report the error of the table in --out instead of building it")
+    parser.add_argument("--samples", type=int, default=20000, help="random points used by --check")
+    args = parser.parse_args()
+    if os.path.exists(CARD_CONSTRAINTS):
+        kinematics.use_envelope(ConstraintEnvelope.load(CARD_CONSTRAINTS))
+        print(f"Using the constraint envelope in {os.path.normpath(CARD_CONSTRAINTS)}")
+
+    if args.check:
+        check(IKTable.load(args.out), args.samples)
+        return
+
+    table = build(args.step)
+    table.save(args.out)
+    valid = sum(1 for flags in table.flags if flags == VALID)
+    print(f"Wrote {table.nr}x{table.nz} table ({valid} valid cells, {os.path.getsize(args.out)} bytes) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
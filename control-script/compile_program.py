@@ -0,0 +1,298 @@
+"""
+Compiles a HarveStar motion program into a joint-space trajectory for the SD card.
+
+A motion program is a JSON file with a list of steps, run in order:
+
+    {"rate": 50, "steps": [
+        {"move": [25, 0, 15]},                     joint move to (r cm, phi degrees, z cm), like move_polar()
+        {"line": [30, 0, 8], "speed": 8},          straight-line move, like move_polar(..., linear=True)
+        {"gripper": 80},                           end effector angle
+        {"move": [30, 120, 20], "gripper": 80},    any move or line can take the gripper along, see below
+        {"wait": 2},                               dwell in seconds
+        {"settle": true},                          dwell until the servos have caught up, by lib/servomodel.py
+        {"settle": 2}                              the same, but a fixed 2 s until SERVO_DYNAMICS are fitted
+    ]}
+
+A "gripper" angle on a move makes the end effector a fourth axis of the
+coordinated move, so it arrives with the arm. On a line it starts with the
+line and runs on its own velocity profile; the step lasts as long as the
+slower of the two.
+
+Every pose and every sample of every move is checked against the base range,
+the constraint envelope and the gripper limits, and the motion is shaped with
+the same velocity profiles and joint limits as the firmware. The result is
+written with lib/trajectory.py, which HarveStar.play_trajectory() streams back
+without solving any IK. The first move only sets where the trajectory starts;
+the firmware gets there with a coordinated move before playback.
+
+A program can also list obstacles, in the form joint_planner.py takes, and a
+margin in cm to keep from them:
+
+    {"obstacles": [{"box": [[5, 10, 0], [30, 13, 16]]}], "margin": 1, "steps": [...]}
+
+Moves then go around them through the waypoints joint_planner.plan() finds,
+one coordinated move per waypoint, and lines that pass through one fail.
+
+    python compile_program.py programs/pick.json                 # writes arm-pico-code/sd/pick.traj
+    python compile_program.py programs/pick.json --out other.traj
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib")
+sys.path.insert(0, LIB_DIR)
+
+import joint_planner
+import kinematics
+from motion import CoordinatedMove, LinearMove
+from servomodel import ServoModel
+from trajectory import TrajectoryWriter
+
+SD_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "sd"))
+
+LINE_SPEED = 8  # cm/s, HarveStar.move_linear() defaults
+LINE_ACCEL = 40  # cm/s²
+
+
+class ProgramError(ValueError):
+    pass
+
+
+class _Joint:
+    """What CoordinatedMove needs of a ServoMotor: its limits and a servo with an angle."""
+
+    def __init__(self, angle, max_speed, max_accel):
+        self.servo = self
+        self.angle = angle
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+
+
+def solve(x, y, z):
+    """(base, shoulder, elbow) servo angles for a tool position, or None where the firmware would refuse it."""
+    try:
+        base, shoulder, elbow = kinematics.joint_angles(x, y, z)
+    except ValueError:
+        return None
+    if not kinematics.within_limits(base, shoulder, elbow):
+        return None
+    return base, shoulder, elbow
+
+
+def polar(pose):
+    r, phi, z = pose
+    return r * math.cos(math.radians(phi)), r * math.sin(math.radians(phi)), z
+
+
+class Compiler:
+    def __init__(self, writer, rate=50, grid=None):
+        self.writer = writer
+        self.grid = grid  # joint_planner.JointGrid of the program's obstacles, if it has any
+        self.rate = rate
+        self.period = 1 / rate
+        self.t = 0.0
+        self.joints = [_Joint(None, speed, accel) for speed, accel in zip(kinematics.MAX_SPEED, kinematics.MAX_ACCEL)]
+        self.models = [ServoModel(slew, tau, kinematics.SETTLE_TOLERANCE) for slew, tau in kinematics.SERVO_DYNAMICS]
+        self.emitted = False
+
+    def angles(self):
+        return [joint.angle for joint in self.joints]
+
+    def emit(self):
+        # Checked the way HarveStar.check_trajectory() will read it back, in whole centidegrees
+        base, shoulder, elbow, gripper = (round(angle * 100) / 100 for angle in self.angles())
+        if not kinematics.within_limits(base, shoulder, elbow):
+            raise ProgramError(f"setpoint at {self.t:.2f} s is outside the constraints: "
+                               f"base {base:.2f}°, shoulder {shoulder:.2f}°, elbow {elbow:.2f}°")
+        check_gripper(gripper)
+        self.writer.write(round(self.t * 1000), *self.angles())
+        for model, angle in zip(self.models, self.angles()):
+            if not self.emitted:
+                model.reset(angle, self.t)  # the firmware gets to the first setpoint before playback starts
+            elif angle != model.command:
+                model.update(angle, self.t)
+        self.emitted = True
+
+    def set_angles(self, angles, joints):
+        for joint, angle in zip(joints, angles):
+            joint.angle = angle
+
+    def play(self, move, joints):
+        # Samples a move at the control rate; the last sample lands exactly on the end of the move
+        steps = max(1, math.ceil(move.duration * self.rate))
+        start = self.t
+        for i in range(1, steps + 1):
+            elapsed = min(i * self.period, move.duration)
+            self.set_angles(move.angles_at(elapsed), joints)
+            self.t = start + elapsed
+            self.emit()
+
+    def move(self, pose, gripper=None):
+        angles = solve(*polar(pose))
+        if angles is None:
+            raise ProgramError(f"pose {pose} is out of reach or outside the constraints")
+        if self.grid is not None and joint_planner.collides(self.grid.obstacles, *angles):
+            raise ProgramError(f"pose {pose} is inside an obstacle")
+        joints = self.joints[:3]
+        if gripper is not None:
+            check_gripper(gripper)
+            joints = self.joints
+        if joints[0].angle is None:
+            # First pose: the trajectory starts here
+            self.set_angles((*angles, gripper), joints)
+            return
+        start = tuple(self.angles()[:3])
+        waypoints = [angles]
+        if self.grid is not None:
+            waypoints = joint_planner.plan(self.grid, start, angles)
+            if waypoints is None:
+                raise ProgramError(f"no path to {pose} clear of the obstacles")
+        # Around a detour the gripper turns a share of the way per waypoint, so it still arrives with the arm
+        total = joint_planner.path_time(start, waypoints)
+        opening = self.joints[3].angle
+        elapsed = 0.0
+        for waypoint in waypoints:
+            elapsed += joint_planner.step_time(start, waypoint)
+            start = waypoint
+            if gripper is not None:
+                share = elapsed / total if total else 1.0
+                waypoint = (*waypoint, opening + (gripper - opening) * share)
+            self.play(CoordinatedMove(joints, waypoint), joints)
+
+    def line(self, pose, speed=LINE_SPEED, accel=LINE_ACCEL, gripper=None):
+        if self.joints[0].angle is None:
+            raise ProgramError("a line needs a start, put a move before it")
+        start = kinematics.tool_position(*self.angles()[:3])
+        move = LinearMove(self.joints[:3], solve, start, polar(pose), speed, accel, self.rate)
+        grip = None
+        if gripper is not None:
+            check_gripper(gripper)
+            grip = CoordinatedMove([self.joints[3]], [gripper])
+        i = 0
+        while i < move.samples or (grip is not None and i * self.period < grip.duration):
+            i += 1
+            if i <= move.samples:
+                angles = move.angles(i)
+                if angles is None:
+                    raise ProgramError(f"line to {pose} leaves the workspace at {move.point(i)}")
+                if self.grid is not None and joint_planner.collides(self.grid.obstacles, *angles):
+                    raise ProgramError(f"line to {pose} runs into an obstacle at {move.point(i)}")
+                self.set_angles(angles, self.joints[:3])
+            if grip is not None:
+                self.joints[3].angle = grip.angles_at(i * self.period)[0]
+            self.t += self.period
+            self.emit()
+
+    def gripper(self, angle):
+        check_gripper(angle)
+        joint = self.joints[3]
+        if joint.angle is None:
+            joint.angle = angle
+            return
+        self.play(CoordinatedMove([joint], [angle]), [joint])
+
+    def wait(self, seconds):
+        # One record at the end of the dwell; the player holds the previous setpoint until then
+        self.t += seconds
+        self.emit()
+
+    def settle(self, fallback=None):
+        # A dwell just long enough for the servos to catch up with the last setpoints, like HarveStar.await_settled()
+        if fallback is not None and not kinematics.SERVO_DYNAMICS_FITTED:
+            self.wait(fallback)
+            return
+        self.wait(max(model.settle_time(self.t) for model in self.models))
+
+
+def check_gripper(angle):
+    if not kinematics.END_EFFECTOR_MIN <= angle <= kinematics.END_EFFECTOR_MAX:
+        raise ProgramError(f"gripper angle {angle} is outside "
+                           f"{kinematics.END_EFFECTOR_MIN}-{kinematics.END_EFFECTOR_MAX}")
+
+
+def first_gripper(steps):
+    # The gripper is taken to its first programmed angle on the way to the start
+    for step in steps:
+        if "gripper" in step:
+            return step["gripper"]
+    return kinematics.END_EFFECTOR_MAX
+
+
+def compile_program(program, out):
+    """
+    Compiles a parsed program into a trajectory file. Returns (records, seconds). Raises ProgramError, and then
+    leaves `out` as it was.
+    """
+    steps = program.get("steps", [])
+    if not steps or "move" not in steps[0]:
+        raise ProgramError("a program has to start with a move, it sets where the trajectory begins")
+    rate = program.get("rate", 50)
+
+    # Written next to `out` and renamed over it once complete, so a failed compile leaves no partial file
+    partial = out + ".part"
+    writer = TrajectoryWriter(partial, rate)
+    done = False
+    try:
+        grid = None
+        if program.get("obstacles"):
+            try:
+                grid = joint_planner.JointGrid.load(program["obstacles"], program.get("margin", joint_planner.MARGIN))
+            except (TypeError, ValueError) as e:
+                raise ProgramError(f"obstacles: {e}")
+        compiler = Compiler(writer, rate, grid)
+        compiler.move(steps[0]["move"])
+        compiler.joints[3].angle = first_gripper(steps)
+        check_gripper(compiler.joints[3].angle)
+        compiler.emit()
+        for number, step in enumerate(steps[1:], 2):
+            try:
+                if "move" in step:
+                    compiler.move(step["move"], step.get("gripper"))
+                elif "line" in step:
+                    compiler.line(step["line"], step.get("speed", LINE_SPEED), step.get("accel", LINE_ACCEL),
+                                  step.get("gripper"))
+                elif "gripper" in step:
+                    compiler.gripper(step["gripper"])
+                elif "wait" in step:
+                    compiler.wait(step["wait"])
+                elif "settle" in step:
+                    fallback = step["settle"]
+                    compiler.settle(None if fallback is True else fallback)
+                else:
+                    raise ProgramError(f"unknown step {step}")
+            except ProgramError as e:
+                raise ProgramError(f"step {number}: {e}")
+        done = True
+    finally:
+        writer.close()
+        if done:
+            os.replace(partial, out)
+        else:
+            os.remove(partial)
+    return writer.records, compiler.t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a motion program into an SD card trajectory")
+    parser.add_argument("program", help="motion program JSON file")
+    parser.add_argument("--out", help="trajectory file (default: arm-pico-code/sd/<program name>.traj)")
+    args = parser.parse_args()
+
+    out = args.out or os.path.join(SD_DIR, os.path.splitext(os.path.basename(args.program))[0] + ".traj")
+    if joint_planner.use_card_envelope():
+        print(f"Using the constraint envelope in {os.path.normpath(joint_planner.CARD_CONSTRAINTS)}")
+    with open(args.program) as f:
+        program = json.load(f)
+    try:
+        records, seconds = compile_program(program, out)
+    except ProgramError as e:
+        print(f"FAIL: {e}")
+        sys.exit(1)
+    print(f"{records} setpoints, {seconds:.2f} s, {os.path.getsize(out)} bytes -> {out}")
+
+
+if __name__ == "__main__":
+    main()
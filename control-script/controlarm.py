@@ -1,112 +1,211 @@
-import serial
-import keyboard
+import argparse
+import os
 import sys
 import time
+
+# Frame format shared with the firmware
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib"))
+import protocol
+from protocol import FrameReader
+from keycapture import KeyCapture, KeyboardSource, ReplaySource, load_events
+
 SERIAL_PORT = 'COM9'
-BAUD_RATE = 9600
-
-print("=" * 50)
-print("HarveStar PC Keyboard Controller")
-print("=" * 50)
-
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-    time.sleep(2)  # Wait for connection to stabilize
-    print(f"✓ Connected to {SERIAL_PORT} at {BAUD_RATE} baud")
-except Exception as e:
-    print(f"✗ Error connecting to serial port: {e}")
-    print("\nTroubleshooting:")
-    print("  1. Check if the correct COM port is specified")
-    print("  2. Make sure the Pico is plugged in")
-    print("  3. Close any other programs using the serial port")
-    sys.exit(1)
-
-print("\nControls:")
-print("  W/S - Move shoulder up/down")
-print("  A/D - Move base left/right")
-print("  Q/E - Move elbow up/down")
-print("  Z/X - Open/close end effector")
-print("  R - Reset to starting position")
-print("  ESC - Exit")
-print("\nPress and hold keys to control the robot...")
-print("-" * 50)
-
-keys_pressed = set()
-
-def send_command(command):
-    """Send a command to the Pico"""
-    command = command + "\n"
+BAUD_RATE = 115200  # nominal on the Pico's USB CDC port, but keeps a real UART link fast too
+KEEPALIVE = 0.1  # seconds between repeats while keys are held; each KEYS frame is one step on the Pico
+VELOCITY_KEEPALIVE = 0.2  # with --velocity frames only refresh the held state; the Pico stops after 0.5 s without one
+
+
+class LatencyProbe:
+    """
+    Keypress-to-actuation latency from ACK frames.
+
+    sent() notes when a key went down and when its frame left the PC; acked() takes the firmware's decode and
+    servo-write times from the ACK. The PC and Pico clocks are not synchronised, so the offset between them is
+    estimated from the quickest round trip, where waiting in the firmware loop was shortest and the link is
+    close to symmetric. Each sample is split into (total, keyboard, link, firmware) seconds:
+
+        keyboard  key down to frame sent, the capture delay on the PC
+        link      frame sent to decoded, the serial transfer plus waiting for the firmware loop to read it
+        firmware  frame decoded to servo write
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.pending = {}  # seq -> (pressed_at, sent_at)
+        self.acks = []  # (pressed_at, sent_at, acked_at, received, written) in seconds, firmware times unwrapped
+        self.lost = 0
+        self._first_us = None
+
+    def sent(self, seq, pressed_at, sent_at=None):
+        if seq in self.pending:
+            self.lost += 1  # sequence number wrapped round before its ACK came back
+        self.pending[seq] = (pressed_at, self.clock() if sent_at is None else sent_at)
+
+    def acked(self, seq, received_us, written_us, acked_at=None):
+        """Records an ACK. Returns False for an ACK nothing is waiting on."""
+        if seq not in self.pending:
+            return False
+        pressed_at, sent_at = self.pending.pop(seq)
+        acked_at = self.clock() if acked_at is None else acked_at
+        if self._first_us is None:
+            self._first_us = received_us
+        # Firmware times count from the first ACK, so the 32-bit microsecond counter may wrap once in a session
+        received = ((received_us - self._first_us) & 0xFFFFFFFF) / 1e6
+        written = received + ((written_us - received_us) & 0xFFFFFFFF) / 1e6
+        self.acks.append((pressed_at, sent_at, acked_at, received, written))
+        return True
+
+    def poll(self, reader):
+        """Reads every waiting frame from a FrameReader and feeds the ACKs in."""
+        while reader.poll():
+            if reader.type == protocol.ACK:
+                self.acked(reader.seq, reader.received_us, reader.written_us)
+
+    def samples(self):
+        """(total, keyboard, link, firmware) for every ACK so far."""
+        if not self.acks:
+            return []
+        # Firmware clock minus PC clock, from the round trip that spent the least time outside the firmware
+        _, sent_at, acked_at, received, written = min(self.acks, key=lambda a: (a[2] - a[1]) - (a[4] - a[3]))
+        offset = received - sent_at - ((acked_at - sent_at) - (written - received)) / 2
+        samples = []
+        for pressed_at, sent_at, acked_at, received, written in self.acks:
+            keyboard = sent_at - pressed_at
+            link = max(0.0, received - offset - sent_at)
+            firmware = written - received
+            samples.append((keyboard + link + firmware, keyboard, link, firmware))
+        return samples
+
+    def summary(self):
+        """Returns lines with the mean and worst of each part of the latency."""
+        samples = self.samples()
+        if not samples:
+            return ["No latency samples"]
+        lines = [f"{len(samples)} samples, {self.lost + len(self.pending)} without an ACK"]
+        for i, name in enumerate(("total", "keyboard", "link", "firmware")):
+            values = [sample[i] * 1000 for sample in samples]
+            lines.append(f"  {name:9s} mean {sum(values) / len(values):7.1f} ms   max {max(values):7.1f} ms")
+        return lines
+
+    def histogram(self, bin_ms=10, width=40):
+        """Returns text lines of a histogram of the total latency."""
+        totals = [sample[0] * 1000 for sample in self.samples()]
+        if not totals:
+            return []
+        counts = [0] * (int(max(totals) // bin_ms) + 1)
+        for value in totals:
+            counts[int(value // bin_ms)] += 1
+        peak = max(counts)
+        lines = []
+        for i, count in enumerate(counts):
+            bar = "#" * int(round(width * count / peak))
+            lines.append(f"{i * bin_ms:5.0f}-{(i + 1) * bin_ms:<5.0f} ms {count:5d} {bar}")
+        return lines
+
+
+def connect(port, baud):
+    import serial
+    try:
+        ser = serial.Serial(port, baud, timeout=1)
+        time.sleep(2)  # Wait for connection to stabilize
+        print(f"✓ Connected to {port} at {baud} baud")
+        return ser
+    except Exception as e:
+        print(f"✗ Error connecting to serial port: {e}")
+        print("\nTroubleshooting:")
+        print("  1. Check if the correct COM port is specified")
+        print("  2. Make sure the Pico is plugged in")
+        print("  3. Close any other programs using the serial port")
+        sys.exit(1)
+
+
+def send_command(ser, seq, keys, flags=0):
+    """Send the held keys to the Pico as one KEYS frame"""
     try:
-        ser.write(command.encode())
-        print(f"Sent: {command}")
+        ser.write(protocol.encode_keys(seq, protocol.key_mask(keys), flags=flags))
+        print(f"Sent #{seq}: {', '.join(sorted(keys))}")
     except Exception as e:
         print(f"Error sending command: {e}")
 
-try:
-    # Main loop
-    while True:
-        # Check each control key
-        if keyboard.is_pressed('w') and 'w' not in keys_pressed:
-            keys_pressed.add('w')
-        elif not keyboard.is_pressed('w') and 'w' in keys_pressed:
-            keys_pressed.remove('w')
-        
-        if keyboard.is_pressed('s') and 's' not in keys_pressed:
-            keys_pressed.add('s')
-        elif not keyboard.is_pressed('s') and 's' in keys_pressed:
-            keys_pressed.remove('s')
-        
-        if keyboard.is_pressed('a') and 'a' not in keys_pressed:
-            keys_pressed.add('a')
-        elif not keyboard.is_pressed('a') and 'a' in keys_pressed:
-            keys_pressed.remove('a')
-        
-        if keyboard.is_pressed('d') and 'd' not in keys_pressed:
-            keys_pressed.add('d')
-        elif not keyboard.is_pressed('d') and 'd' in keys_pressed:
-            keys_pressed.remove('d')
-        
-        if keyboard.is_pressed('q') and 'q' not in keys_pressed:
-            keys_pressed.add('q')
-        elif not keyboard.is_pressed('q') and 'q' in keys_pressed:
-            keys_pressed.remove('q')
-        
-        if keyboard.is_pressed('e') and 'e' not in keys_pressed:
-            keys_pressed.add('e')
-        elif not keyboard.is_pressed('e') and 'e' in keys_pressed:
-            keys_pressed.remove('e')
-        
-        if keyboard.is_pressed('up') and 'up' not in keys_pressed:
-            keys_pressed.add('up')
-        elif not keyboard.is_pressed('up') and 'up' in keys_pressed:
-            keys_pressed.remove('up')
-        
-        if keyboard.is_pressed('down') and 'down' not in keys_pressed:
-            keys_pressed.add('down')
-        elif not keyboard.is_pressed('down') and 'down' in keys_pressed:
-            keys_pressed.remove('down')
-        
-        if keyboard.is_pressed('space') and 'space' not in keys_pressed:
-            keys_pressed.add('space')
-        elif not keyboard.is_pressed('space') and 'space' in keys_pressed:
-            keys_pressed.remove('space')
-        
-        # Exit on ESC
-        if keyboard.is_pressed('esc'):
-            print("\nExiting...")
-            break
-
-        command = ', '.join(str(key) for key in keys_pressed)
-
-        if len(keys_pressed) > 0:
-            send_command(command)
-        time.sleep(0.1)  # Small delay to prevent CPU overload
-
-except KeyboardInterrupt:
-    print("\n\nKeyboard interrupt detected.")
-except Exception as e:
-    print(f"\nError: {e}")
-finally:
-    ser.close()
-    print("Serial connection closed.")
-    print("Goodbye!")
\ No newline at end of file
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HarveStar PC keyboard controller")
+    parser.add_argument("--port", default=SERIAL_PORT)
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    parser.add_argument("--velocity", action="store_true",
+                        help="send the held keys as a velocity command the Pico integrates, instead of one step per frame")
+    parser.add_argument("--keepalive", type=float, default=None,
+                        help=f"seconds between repeated frames while keys are held, 0 sends on changes only "
+                             f"(default {KEEPALIVE}, {VELOCITY_KEEPALIVE} with --velocity)")
+    parser.add_argument("--latency", action="store_true",
+                        help="ask for an ACK on every new keypress and print a latency histogram on exit")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="how fast R plays back the Pico's teleop recording, 2.0 is twice as fast")
+    parser.add_argument("--record", help="also write the key events to this file")
+    parser.add_argument("--replay", help="play key events from a recorded file instead of the keyboard")
+    args = parser.parse_args(argv)
+
+    print("=" * 50)
+    print("HarveStar PC Keyboard Controller")
+    print("=" * 50)
+
+    ser = connect(args.port, args.baud)
+    reader = FrameReader(ser)
+    probe = LatencyProbe() if args.latency else None
+
+    print("\nControls:")
+    print("  W/S - Move shoulder up/down")
+    print("  A/D - Move base left/right")
+    print("  Q/E - Move elbow up/down")
+    print("  Z/X - Open/close end effector")
+    print("  SPACE - Start/stop recording the arm's motion on the Pico")
+    print(f"  R - Replay the recording at {args.replay_speed}x")
+    print("  ESC - Exit")
+    print("\nPress and hold keys to control the robot...")
+    print("-" * 50)
+
+    seq = 0
+    mode = protocol.FLAG_VELOCITY if args.velocity else 0
+    keepalive = args.keepalive
+    if keepalive is None:
+        keepalive = VELOCITY_KEEPALIVE if args.velocity else KEEPALIVE
+
+    def send(keys, pressed_at):
+        nonlocal seq
+        seq = (seq + 1) & 0xFFFF
+        if probe is not None and pressed_at is not None:
+            probe.sent(seq, pressed_at)
+            send_command(ser, seq, keys, mode | protocol.FLAG_ACK)
+        else:
+            send_command(ser, seq, keys, mode)
+
+    def replay():
+        nonlocal seq
+        seq = (seq + 1) & 0xFFFF
+        ser.write(protocol.encode_replay(seq, args.replay_speed))
+        print(f"Sent #{seq}: replay at {args.replay_speed}x")
+
+    capture = KeyCapture(send, keepalive=keepalive, actions={'r': replay})
+    source = ReplaySource(load_events(args.replay)) if args.replay else KeyboardSource(record=args.record)
+    try:
+        # Wake often enough to pick ACKs up as they arrive, a late read would count as link time
+        if probe is not None:
+            capture.run(source, wake=0.001, on_wake=lambda: probe.poll(reader))
+        else:
+            capture.run(source)
+        print("\nExiting...")
+
+    except KeyboardInterrupt:
+        print("\n\nKeyboard interrupt detected.")
+    except Exception as e:
+        print(f"\nError: {e}")
+    finally:
+        ser.close()
+        print("Serial connection closed.")
+        if probe is not None:
+            print("\n".join(probe.summary() + probe.histogram()))
+        print("Goodbye!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Fits the servo settle model (arm-pico-code/lib/servomodel.py) to step timings.
+
+Command a servo at rest to jump by some number of degrees, with a single write,
+and time how long the horn takes to get within the settle tolerance, e.g. from
+a slow-motion video next to the servo. A few step sizes per joint, small and
+large, are enough: large steps give the slew rate, small ones the lag. One
+measurement per line, `#` starts a comment:
+
+    # joint        step °   settle s
+    base           10       0.17
+    base           90       0.36
+    shoulder       45       0.32
+
+For each joint this finds the slew rate and time constant whose predicted
+settle times are closest to the measured ones, and prints a SERVO_DYNAMICS line
+for arm-pico-code/lib/kinematics.py; joints without measurements keep their
+current values. Setting SERVO_DYNAMICS_FITTED there as well lets the pick
+sequence and settle steps with a fixed fallback use the model.
+
+    python fit_settle.py timings.txt
+    python fit_settle.py timings.txt --tolerance 0.5
+"""
+import argparse
+import math
+import os
+import sys
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib")
+sys.path.insert(0, LIB_DIR)
+
+import kinematics
+from servomodel import step_settle_time
+
+JOINTS = ("base", "shoulder", "elbow", "end_effector")
+
+
+def load_timings(path):
+    """Returns {joint: [(step degrees, settle seconds), ...]}."""
+    timings = {}
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            joint, step, seconds = line.split()
+            if joint not in JOINTS:
+                raise ValueError(f"{path}:{number}: unknown joint {joint}, expected one of {', '.join(JOINTS)}")
+            timings.setdefault(joint, []).append((abs(float(step)), float(seconds)))
+    return timings
+
+
+def residual(samples, slew, tau, tolerance):
+    return sum((step_settle_time(step, slew, tau, tolerance) - seconds) ** 2 for step, seconds in samples)
+
+
+def fit(samples, tolerance, rounds=6):
+    """Least-squares (slew, tau) for one joint, by a grid search narrowed around the best point each round."""
+    slew_low, slew_high = 20.0, 2000.0
+    tau_low, tau_high = 0.001, 0.5
+    best = None
+    for _ in range(rounds):
+        for i in range(21):
+            # Slew rates spread evenly on a log scale, they span two orders of magnitude
+            slew = slew_low * (slew_high / slew_low) ** (i / 20)
+            for j in range(21):
+                tau = tau_low + (tau_high - tau_low) * j / 20
+                error = residual(samples, slew, tau, tolerance)
+                if best is None or error < best[0]:
+                    best = (error, slew, tau)
+        _, slew, tau = best
+        slew_low, slew_high = slew / (slew_high / slew_low) ** 0.1, slew * (slew_high / slew_low) ** 0.1
+        span = (tau_high - tau_low) / 10
+        tau_low, tau_high = max(0.0005, tau - span), tau + span
+    error, slew, tau = best
+    return slew, tau, math.sqrt(error / len(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the servo settle model to measured step timings")
+    parser.add_argument("timings", help="file of `joint step_degrees settle_seconds` lines")
+    parser.add_argument("--tolerance", type=float, default=kinematics.SETTLE_TOLERANCE,
+                        help=f"degrees the settle times were measured to (default {kinematics.SETTLE_TOLERANCE})")
+    args = parser.parse_args()
+
+    timings = load_timings(args.timings)
+    dynamics = list(kinematics.SERVO_DYNAMICS)
+    for index, joint in enumerate(JOINTS):
+        samples = timings.get(joint)
+        if not samples:
+            print(f"{joint:13} no measurements, keeping slew {dynamics[index][0]} °/s, tau {dynamics[index][1]} s")
+            continue
+        slew, tau, rms = fit(samples, args.tolerance)
+        dynamics[index] = (round(slew), round(tau, 3))
+        print(f"{joint:13} slew {slew:6.0f} °/s  tau {tau:.3f} s  rms error {rms * 1000:.1f} ms over {len(samples)} steps")
+        if len({step for step, _ in samples}) < 2:
+            print(f"{'':13} only one step size, the slew rate and lag cannot be told apart")
+
+    print("\nFor arm-pico-code/lib/kinematics.py:")
+    print("SERVO_DYNAMICS = (" + ", ".join(f"({slew}, {tau})" for slew, tau in dynamics) + ")")
+    if all(joint in timings for joint in JOINTS):
+        print("SERVO_DYNAMICS_FITTED = True")
+    else:
+        print("# Keep SERVO_DYNAMICS_FITTED = False until every joint has measurements")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""
+Collision-free joint-space paths for the HarveStar arm.
+
+move_multiple() only checks where a move ends. On the way there the joints
+sweep straight through joint space, which can cross shoulder/elbow pairs the
+constraint envelope forbids or put a link through a tray wall. This module
+plans around both:
+
+  * Obstacles are boxes and vertical cylinders in the arm's Cartesian frame
+    (cm, z up, base axis at the origin), grown by a safety margin.
+  * JointGrid rasterises them, together with the base range and the
+    constraint envelope, into an occupancy grid over (base, shoulder, elbow)
+    servo angles. A cell is blocked if any point along the upper arm, the
+    forearm or the tool is inside an obstacle. Building it takes a while, so
+    it is kept in memory and on disk, keyed by everything it depends on.
+  * plan() returns the straight move when that is already clear. Otherwise it
+    runs A* over the grid with each step costing the time its slowest joint
+    needs, then cuts the path short wherever a straight segment is clear.
+    Every segment it returns is checked at 1° steps against the exact
+    geometry, not just the grid. A step between two free cells can still
+    clip a corner of the envelope or an obstacle; such a step is cut from
+    the grid, for later plans too, and the path goes around it.
+
+Obstacles as JSON, the way motion programs (compile_program.py) list them:
+
+    [{"box": [[x0, y0, z0], [x1, y1, z1]]},              opposite corners
+     {"cylinder": [x, y, radius, z_bottom, z_top]}]
+
+    python joint_planner.py obstacles.json --from 25 0 15 --to 30 120 20
+    python joint_planner.py obstacles.json --replans 100     # timing for random goals
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import time
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib")
+sys.path.insert(0, LIB_DIR)
+
+import kinematics
+from constraints import ConstraintEnvelope
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".grid-cache")
+CARD_CONSTRAINTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "sd",
+                                "constraints.txt")
+RESOLUTION = 4  # degrees per grid cell on every joint
+MARGIN = 1.0  # cm obstacles are grown by
+SAMPLE_SPACING = 1.0  # cm between the points checked along each link
+CHECK_STEP = 1.0  # degrees between the poses checked along a segment
+GRID_VERSION = 2  # part of the cache key, bump when build() changes what it blocks
+BASE_MAX = 180
+SHOULDER_MAX = 90
+ELBOW_MAX = 90
+
+
+class Box:
+    def __init__(self, corner, other, margin=0.0):
+        self.low = [min(a, b) - margin for a, b in zip(corner, other)]
+        self.high = [max(a, b) + margin for a, b in zip(corner, other)]
+
+    def bounds(self):
+        """(rho_min, rho_max, z_min, z_max): the ring around the base axis the box sits in."""
+        (x0, y0, _), (x1, y1, _) = self.low, self.high
+        nearest_x = min(max(0.0, x0), x1)
+        nearest_y = min(max(0.0, y0), y1)
+        far = max(math.hypot(x, y) for x in (x0, x1) for y in (y0, y1))
+        return math.hypot(nearest_x, nearest_y), far, self.low[2], self.high[2]
+
+    def contains(self, x, y, z):
+        low, high = self.low, self.high
+        return low[0] <= x <= high[0] and low[1] <= y <= high[1] and low[2] <= z <= high[2]
+
+
+class Cylinder:
+    def __init__(self, x, y, radius, bottom, top, margin=0.0):
+        self.x = x
+        self.y = y
+        self.radius = radius + margin
+        self.bottom = bottom - margin
+        self.top = top + margin
+
+    def bounds(self):
+        centre = math.hypot(self.x, self.y)
+        return max(0.0, centre - self.radius), centre + self.radius, self.bottom, self.top
+
+    def contains(self, x, y, z):
+        return (self.bottom <= z <= self.top and
+                (x - self.x) * (x - self.x) + (y - self.y) * (y - self.y) <= self.radius * self.radius)
+
+
+def load_obstacles(items, margin=MARGIN):
+    """Builds obstacles from their JSON form, grown by `margin` cm."""
+    obstacles = []
+    for item in items:
+        if "box" in item:
+            obstacles.append(Box(*item["box"], margin=margin))
+        elif "cylinder" in item:
+            obstacles.append(Cylinder(*item["cylinder"], margin=margin))
+        else:
+            raise ValueError(f"unknown obstacle {item}")
+    return obstacles
+
+
+def arm_points(shoulder_angle, elbow_angle):
+    """(rho, z) points along the upper arm, forearm and tool, in the vertical plane of the base angle."""
+    _, theta2, theta3 = kinematics.geometric_angles(0, shoulder_angle, elbow_angle)
+    t2 = math.radians(theta2)
+    t23 = math.radians(theta2 + theta3)
+    shoulder = (0.0, kinematics.L1)
+    elbow = (kinematics.L2 * math.cos(t2), kinematics.L1 + kinematics.L2 * math.sin(t2))
+    wrist = (elbow[0] - kinematics.L3 * math.cos(t23), elbow[1] - kinematics.L3 * math.sin(t23))
+    tip = (wrist[0] + kinematics.TOOL_REACH, wrist[1] - kinematics.TOOL_DROP)
+    points = []
+    for (r0, z0), (r1, z1) in ((shoulder, elbow), (elbow, wrist), (wrist, tip)):
+        steps = max(1, math.ceil(math.hypot(r1 - r0, z1 - z0) / SAMPLE_SPACING))
+        for i in range(1, steps + 1):
+            points.append((r0 + (r1 - r0) * i / steps, z0 + (z1 - z0) * i / steps))
+    return points
+
+
+def use_card_envelope(path=CARD_CONSTRAINTS):
+    """
+    Checks against the SD card's constraint envelope from now on if it has one, as the firmware does when it
+    finds /sd/constraints.txt. Returns True if it did.
+    """
+    if not os.path.exists(path):
+        return False
+    kinematics.use_envelope(ConstraintEnvelope.load(path))
+    return True
+
+
+def within_limits(base, shoulder, elbow):
+    return 0 <= base <= BASE_MAX and kinematics.within_constraints(shoulder, elbow)
+
+
+def collides(obstacles, base, shoulder, elbow):
+    """True if any link of the arm at these servo angles is inside an obstacle."""
+    phi = math.radians(kinematics.geometric_angles(base, shoulder, elbow)[0])
+    c, s = math.cos(phi), math.sin(phi)
+    for rho, z in arm_points(shoulder, elbow):
+        for obstacle in obstacles:
+            if obstacle.contains(rho * c, rho * s, z):
+                return True
+    return False
+
+
+class JointGrid:
+    """
+    Occupancy over (base, shoulder, elbow) at `resolution` degrees, one byte per cell with a blocked border
+    so neighbours never need a bounds check. Cell (i, j, k) is centred on (i, j, k) * resolution.
+    """
+
+    def __init__(self, obstacles, items, resolution=RESOLUTION):
+        self.obstacles = obstacles
+        self.resolution = resolution
+        self.sizes = (BASE_MAX // resolution + 1, SHOULDER_MAX // resolution + 1, ELBOW_MAX // resolution + 1)
+        nb, ns, ne = self.sizes
+        self.strides = ((ns + 2) * (ne + 2), ne + 2, 1)
+        self.blocked = None
+        self.cut = set()  # (index, index) steps between free cells found blocked by the exact check
+        envelope = kinematics.ENVELOPE  # the card's, if use_card_envelope() found one
+        self.key = hashlib.sha1(json.dumps([GRID_VERSION, items, resolution,
+                                            envelope.rows, envelope.shoulder_max, envelope.elbow_max,
+                                            kinematics.L1, kinematics.L2, kinematics.L3, kinematics.TOOL_REACH,
+                                            kinematics.TOOL_DROP, SAMPLE_SPACING]).encode()).hexdigest()
+
+    _cache = {}  # key -> (blocked, cut), grids already built in this process
+
+    @classmethod
+    def load(cls, items, margin=MARGIN, resolution=RESOLUTION, cache_dir=CACHE_DIR):
+        """Returns the grid for JSON obstacles, from memory, from `cache_dir`, or built and saved there."""
+        grid = cls(load_obstacles(items, margin), [items, margin], resolution)
+        if grid.key in cls._cache:
+            grid.blocked, grid.cut = cls._cache[grid.key]
+            return grid
+        path = os.path.join(cache_dir, grid.key + ".grid") if cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                grid.blocked = bytearray(f.read())
+        else:
+            grid.build()
+            if path:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(grid.blocked)
+        cls._cache[grid.key] = (grid.blocked, grid.cut)
+        return grid
+
+    def index(self, i, j, k):
+        return (i + 1) * self.strides[0] + (j + 1) * self.strides[1] + (k + 1)
+
+    def cell(self, index):
+        i, rest = divmod(index, self.strides[0])
+        j, k = divmod(rest, self.strides[1])
+        return i - 1, j - 1, k - 1
+
+    def angles(self, index):
+        return tuple(n * self.resolution for n in self.cell(index))
+
+    def build(self):
+        nb, ns, ne = self.sizes
+        res = self.resolution
+        self.blocked = bytearray(b"\x01" * ((nb + 2) * self.strides[0]))
+        bases = [(i, math.radians(kinematics.geometric_angles(i * res, 0, 0)[0])) for i in range(nb)]
+        bases = [(i, math.cos(phi), math.sin(phi)) for i, phi in bases]
+        # Where each obstacle sits around the base axis, to skip link points that cannot reach it
+        bounds = [(obstacle, obstacle.bounds()) for obstacle in self.obstacles]
+        for j in range(ns):
+            for k in range(ne):
+                if not kinematics.within_constraints(j * res, k * res):
+                    continue
+                points = arm_points(j * res, k * res)
+                near = []
+                for obstacle, (rho_low, rho_high, z_low, z_high) in bounds:
+                    candidates = [(rho, z) for rho, z in points if rho_low <= rho <= rho_high and z_low <= z <= z_high]
+                    if candidates:
+                        near.append((obstacle, candidates))
+                for i, c, s in bases:
+                    hit = False
+                    for obstacle, candidates in near:
+                        for rho, z in candidates:
+                            if obstacle.contains(rho * c, rho * s, z):
+                                hit = True
+                                break
+                        if hit:
+                            break
+                    if not hit:
+                        self.blocked[self.index(i, j, k)] = 0
+
+    def nearest_free(self, angles):
+        """Index of the free cell nearest to `angles` that a straight segment from them reaches, or None."""
+        res = self.resolution
+        centre = [round(a / res) for a in angles]
+        best = None
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for dk in (-1, 0, 1):
+                    cell = (centre[0] + di, centre[1] + dj, centre[2] + dk)
+                    if not all(0 <= n < size for n, size in zip(cell, self.sizes)):
+                        continue
+                    index = self.index(*cell)
+                    if self.blocked[index]:
+                        continue
+                    distance = sum((n * res - a) ** 2 for n, a in zip(cell, angles))
+                    if (best is None or distance < best[0]) and self.segment_free(angles, self.angles(index)):
+                        best = (distance, index)
+        return None if best is None else best[1]
+
+    def segment_clear(self, start, end):
+        """Quick test on the grid alone: False if the straight move passes through the middle of a blocked cell."""
+        res = self.resolution
+        steps = max(1, math.ceil(max(abs(b - a) for a, b in zip(start, end)) / (res / 2)))
+        blocked = self.blocked
+        for n in range(steps + 1):
+            cell = [round((a + (b - a) * n / steps) / res) for a, b in zip(start, end)]
+            if blocked[self.index(*cell)]:
+                return False
+        return True
+
+    def segment_free(self, start, end):
+        """True if the straight joint move from start to end stays inside the limits and clear of obstacles."""
+        if not self.segment_clear(start, end):
+            return False
+        steps = max(1, math.ceil(max(abs(b - a) for a, b in zip(start, end)) / CHECK_STEP))
+        for n in range(steps + 1):
+            pose = [a + (b - a) * n / steps for a, b in zip(start, end)]
+            if not within_limits(*pose) or collides(self.obstacles, *pose):
+                return False
+        return True
+
+
+def step_time(start, end):
+    """Seconds the slowest joint needs for a straight move at full speed, the planner's distance."""
+    return max(abs(b - a) / speed for a, b, speed in zip(start, end, kinematics.MAX_SPEED))
+
+
+def astar(grid, start, goal):
+    """Cheapest path of cell indices from start to goal, or None if the goal cannot be reached."""
+    res = grid.resolution
+    speeds = kinematics.MAX_SPEED
+    moves = []
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            for dk in (-1, 0, 1):
+                if di or dj or dk:
+                    offset = di * grid.strides[0] + dj * grid.strides[1] + dk
+                    moves.append((offset, res * max(abs(di) / speeds[0], abs(dj) / speeds[1], abs(dk) / speeds[2])))
+    goal_cell = grid.cell(goal)
+    scale = (res / speeds[0], res / speeds[1], res / speeds[2])
+
+    def heuristic(index):
+        i, j, k = grid.cell(index)
+        return max(abs(i - goal_cell[0]) * scale[0], abs(j - goal_cell[1]) * scale[1], abs(k - goal_cell[2]) * scale[2])
+
+    blocked = grid.blocked
+    cut = grid.cut
+    cost = {start: 0.0}
+    came_from = {start: None}
+    frontier = [(heuristic(start), 0.0, start)]
+    while frontier:
+        _, reached, index = heapq.heappop(frontier)
+        if reached > cost[index]:
+            continue  # a cheaper way here was found after this entry was queued
+        if index == goal:
+            path = []
+            while index is not None:
+                path.append(index)
+                index = came_from[index]
+            return path[::-1]
+        here = cost[index]
+        for offset, step in moves:
+            neighbour = index + offset
+            if blocked[neighbour] or (cut and (index, neighbour) in cut):
+                continue
+            new_cost = here + step
+            if new_cost < cost.get(neighbour, float("inf")):
+                cost[neighbour] = new_cost
+                came_from[neighbour] = index
+                heapq.heappush(frontier, (new_cost + heuristic(neighbour), new_cost, neighbour))
+    return None
+
+
+def shortcut(grid, start, cells, goal):
+    """
+    Poses along an A* path of cells from start to goal, dropping waypoints wherever a straight segment from an
+    earlier one is clear, farthest first. A single grid step that turns out to be blocked itself is cut from the
+    grid and replaced by a detour around it. Returns None if there is none.
+    """
+    poses = [start] + [grid.angles(index) for index in cells] + [goal]
+    kept = [start]
+    i = 0
+    while i < len(poses) - 1:
+        j = len(poses) - 1
+        while j > i and not grid.segment_free(poses[i], poses[j]):
+            j -= 1
+        if j > i:
+            kept.append(poses[j])
+            i = j
+            continue
+        # poses[i] -> poses[i + 1] is a step between free cells that clips the envelope or an obstacle;
+        # nearest_free() already checked the segments to and from the grid
+        if not 0 < i < len(cells):
+            return None
+        a, b = cells[i - 1], cells[i]
+        grid.cut.update(((a, b), (b, a)))
+        detour = astar(grid, a, b)
+        if detour is None:
+            return None
+        cells[i - 1:i + 1] = detour
+        poses[i:i + 2] = [grid.angles(index) for index in detour]
+    return kept
+
+
+def plan(grid, start, goal):
+    """
+    Joint-space waypoints, as (base, shoulder, elbow) servo angles, from start to goal; the last one is the
+    goal and the start is not included. Returns None if there is no clear path.
+    """
+    start, goal = tuple(start), tuple(goal)
+    if grid.segment_free(start, goal):
+        return [goal]
+    first = grid.nearest_free(start)
+    last = grid.nearest_free(goal)
+    if first is None or last is None:
+        return None
+    cells = astar(grid, first, last)
+    if cells is None:
+        return None
+    kept = shortcut(grid, start, cells, goal)
+    return None if kept is None else kept[1:]
+
+
+def blocked_segment(grid, start, waypoints):
+    """The first (from, to) segment of a path that segment_free() rejects, or None if the whole path is clear."""
+    for pose in waypoints:
+        if not grid.segment_free(start, pose):
+            return start, pose
+        start = pose
+    return None
+
+
+def path_time(start, waypoints):
+    total = 0.0
+    for pose in waypoints:
+        total += step_time(start, pose)
+        start = pose
+    return total
+
+
+def pose_angles(pose):
+    """Servo angles for an (r, phi, z) pose, or None if it is out of reach or outside the limits."""
+    r, phi, z = pose
+    try:
+        angles = kinematics.joint_angles(r * math.cos(math.radians(phi)), r * math.sin(math.radians(phi)), z)
+    except ValueError:
+        return None
+    return angles if within_limits(*angles) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan collision-free joint moves around obstacles")
+    parser.add_argument("obstacles", help="JSON list of obstacles")
+    parser.add_argument("--from", dest="start", type=float, nargs=3, metavar=("R", "PHI", "Z"), default=(25, 0, 15))
+    parser.add_argument("--to", dest="goal", type=float, nargs=3, metavar=("R", "PHI", "Z"), default=(30, 120, 20))
+    parser.add_argument("--margin", type=float, default=MARGIN, help="cm obstacles are grown by")
+    parser.add_argument("--resolution", type=int, default=RESOLUTION, help="grid cell size in degrees")
+    parser.add_argument("--replans", type=int, default=0, help="also plan from the start to this many random goals")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.obstacles) as f:
+        items = json.load(f)
+    if use_card_envelope():
+        print(f"Using the constraint envelope in {os.path.normpath(CARD_CONSTRAINTS)}")
+    started = time.perf_counter()
+    grid = JointGrid.load(items, args.margin, args.resolution)
+    free = sum(1 for i in range(grid.sizes[0]) for j in range(grid.sizes[1]) for k in range(grid.sizes[2])
+               if not grid.blocked[grid.index(i, j, k)])
+    cells = grid.sizes[0] * grid.sizes[1] * grid.sizes[2]
+    print(f"Grid {grid.sizes[0]}x{grid.sizes[1]}x{grid.sizes[2]} at {grid.resolution}°, {free} of {cells} cells free, "
+          f"ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    start, goal = pose_angles(args.start), pose_angles(args.goal)
+    if start is None or goal is None or collides(grid.obstacles, *start) or collides(grid.obstacles, *goal):
+        print("FAIL: the start or the goal is out of reach, outside the limits or inside an obstacle")
+        sys.exit(1)
+    started = time.perf_counter()
+    waypoints = plan(grid, start, goal)
+    elapsed = time.perf_counter() - started
+    if waypoints is None:
+        print(f"No clear path ({elapsed * 1000:.1f} ms)")
+        sys.exit(1)
+    assert blocked_segment(grid, start, waypoints) is None, "planned path is not clear"
+    print(f"{len(waypoints)} waypoint(s), {path_time(start, waypoints):.2f} s at full joint speed, "
+          f"planned in {elapsed * 1000:.1f} ms")
+    for pose in waypoints:
+        x, y, z = kinematics.tool_position(*pose)
+        print(f"  base {pose[0]:6.1f}  shoulder {pose[1]:5.1f}  elbow {pose[2]:5.1f}   tool ({x:5.1f}, {y:5.1f}, {z:5.1f})")
+
+    if args.replans:
+        rng = random.Random(args.seed)
+        times = []
+        failed = 0
+        bad = []
+        while len(times) < args.replans:
+            goal = (rng.uniform(0, BASE_MAX), rng.uniform(0, SHOULDER_MAX), rng.uniform(0, ELBOW_MAX))
+            if not within_limits(*goal) or collides(grid.obstacles, *goal):
+                continue
+            started = time.perf_counter()
+            waypoints = plan(grid, start, goal)
+            times.append(time.perf_counter() - started)
+            if waypoints is None:
+                failed += 1
+                continue
+            # Every segment of every path is checked again, outside the timing
+            segment = blocked_segment(grid, start, waypoints)
+            if segment is not None:
+                bad.append(segment)
+        times.sort()
+        print(f"{args.replans} replans to random goals: median {times[len(times) // 2] * 1000:.1f} ms, "
+              f"worst {times[-1] * 1000:.1f} ms, {failed} without a path")
+        for segment in bad:
+            print(f"  blocked segment {segment[0]} -> {segment[1]}")
+        if bad:
+            print(f"FAIL: {len(bad)} planned path(s) with a blocked segment")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Event-driven key capture for controlarm.py.
+
+An input source reports key-down and key-up events as they happen and
+KeyCapture keeps the set of held control keys from them. It calls `send` only
+when that set changes, and again every `keepalive` seconds while keys are held
+so the Pico knows the PC is still there. Nothing is polled.
+
+Sources:
+
+    KeyboardSource()          the real keyboard, through the `keyboard` package's hook
+    ReplaySource(events)      a recorded list of (seconds, "down" | "up", key name), e.g. from load_events()
+
+    capture = KeyCapture(lambda keys, pressed_at: print(sorted(keys)), keepalive=0.1)
+    capture.run(ReplaySource(load_events("session.keys")))
+
+Recorded files have one event per line, `seconds down|up name`, and can be
+made with KeyboardSource(record="session.keys").
+"""
+import queue
+import threading
+import time
+
+CONTROL_KEYS = ('w', 's', 'a', 'd', 'q', 'e', 'up', 'down', 'space')
+EXIT_KEY = 'esc'
+
+
+class KeyCapture:
+    def __init__(self, send, keepalive=0.1, keys=CONTROL_KEYS, clock=time.monotonic, actions=None):
+        self.send = send  # send(held key set, time the key that caused the send went down or None)
+        self.keepalive = keepalive
+        self.keys = keys
+        self.actions = actions or {}  # key name -> action() run once when that key goes down
+        self.clock = clock
+        self.pressed = set()
+        self.held_actions = set()  # action keys down, so key repeats don't run the action again
+        self.last_sent = None
+        self.stopped = False
+        self._events = queue.Queue()
+
+    def event(self, at, down, name):
+        """Applies one key event that happened at `at`. Sends if the held set changed."""
+        if name == EXIT_KEY and down:
+            self.stopped = True
+            return
+        if name in self.actions:
+            if down and name not in self.held_actions:
+                self.held_actions.add(name)
+                self.actions[name]()
+            elif not down:
+                self.held_actions.discard(name)
+            return
+        if name not in self.keys or (name in self.pressed) == down:
+            return  # not ours, or key repeat of a key already held
+        if down:
+            self.pressed.add(name)
+        else:
+            self.pressed.discard(name)
+        self._send(at if down else None)
+
+    def idle(self, now):
+        """Sends a keep-alive if keys are held and nothing went out for `keepalive` seconds."""
+        if self.pressed and self.keepalive and now - self.last_sent >= self.keepalive:
+            self._send(None)
+
+    def _send(self, pressed_at):
+        self.last_sent = self.clock()
+        self.send(set(self.pressed), pressed_at)
+
+    def post(self, at, down, name):
+        """Queues an event from another thread; run() applies it. This is what sources call."""
+        self._events.put((at, down, name))
+
+    def run(self, source, wake=None, on_wake=None):
+        """
+        Applies events from `source` until the exit key or the end of the source. Wakes at least every `wake`
+        seconds (default: the keep-alive period) to send keep-alives and call on_wake().
+        """
+        wake = wake or self.keepalive or 0.1
+        source.start(self.post)
+        try:
+            while not self.stopped:
+                timeout = wake
+                if self.pressed and self.keepalive:
+                    timeout = min(wake, max(0.0, self.last_sent + self.keepalive - self.clock()))
+                try:
+                    self.event(*self._events.get(timeout=timeout))
+                except queue.Empty:
+                    if source.finished():
+                        break
+                self.idle(self.clock())
+                if on_wake is not None:
+                    on_wake()
+        finally:
+            source.stop()
+
+
+class KeyboardSource:
+    """Key events from the `keyboard` package, optionally written to a file for replay."""
+
+    def __init__(self, clock=time.monotonic, record=None):
+        self.clock = clock
+        self.record = open(record, "w") if record else None
+        self._hook = None
+        self._started = None
+
+    def start(self, post):
+        import keyboard
+        self._started = self.clock()
+
+        def on_event(event):
+            at = self.clock()
+            down = event.event_type == keyboard.KEY_DOWN
+            if self.record is not None:
+                self.record.write(f"{at - self._started:.4f} {'down' if down else 'up'} {event.name}\n")
+            post(at, down, event.name)
+        self._hook = keyboard.hook(on_event)
+
+    def finished(self):
+        return False
+
+    def stop(self):
+        import keyboard
+        if self._hook is not None:
+            keyboard.unhook(self._hook)
+            self._hook = None
+        if self.record is not None:
+            self.record.close()
+            self.record = None
+
+
+class ReplaySource:
+    """Plays recorded (seconds, "down" | "up", name) events from a thread at their recorded times."""
+
+    def __init__(self, events, speed=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.events = sorted(events, key=lambda event: event[0])
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+        self._thread = None
+        self._done = threading.Event()
+
+    def start(self, post):
+        def play():
+            started = self.clock()
+            for at, kind, name in self.events:
+                self.sleep(max(0.0, started + at / self.speed - self.clock()))
+                if self._done.is_set():
+                    return
+                post(self.clock(), kind == "down", name)
+            self._done.set()
+        self._thread = threading.Thread(target=play, daemon=True)
+        self._thread.start()
+
+    def finished(self):
+        return self._done.is_set()
+
+    def stop(self):
+        self._done.set()
+
+
+def load_events(path):
+    """Reads a recorded key event file into a list for ReplaySource."""
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if line:
+                at, kind, name = line.split()
+                events.append((float(at), kind, name))
+    return events
@@ -0,0 +1,118 @@
+"""
+Round-trip benchmark for the HarveStar kinematics.
+
+Sends a dense grid of tool tip positions through the IK and back through the
+forward kinematics, reports the worst position error and how many solves per
+second the PC manages, and exits non-zero if the round trip does not close.
+
+    python kinematics_bench.py                # scalar firmware functions
+    python kinematics_bench.py --step 0.25    # denser grid
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib")
+sys.path.insert(0, LIB_DIR)
+
+import kinematics
+
+TOLERANCE = 1e-6  # cm
+
+
+def workspace_grid(step, phi_step):
+    """Returns every grid point (x, y, z) whose joint angles the firmware accepts: base range and envelope."""
+    points = []
+    r_max = kinematics.TOOL_REACH + kinematics.L2 + kinematics.L3
+    z_min = kinematics.L1 - kinematics.L2 - kinematics.L3 - kinematics.TOOL_DROP
+    steps_r = int((r_max - kinematics.TOOL_REACH) / step)
+    steps_z = int((2 * (kinematics.L2 + kinematics.L3)) / step)
+    # The base servo's 0-180° are phi 0-120° after BASE_SCALE
+    for phi in range(0, int(kinematics.BASE_RANGE / kinematics.BASE_SCALE) + 1, phi_step):
+        c = math.cos(math.radians(phi))
+        s = math.sin(math.radians(phi))
+        for i in range(1, steps_r + 1):
+            r = kinematics.TOOL_REACH + i * step
+            for j in range(steps_z + 1):
+                z = z_min + j * step
+                try:
+                    angles = kinematics.joint_angles(r * c, r * s, z)
+                except ValueError:
+                    continue
+                if kinematics.within_limits(*angles):
+                    points.append((r * c, r * s, z))
+    return points
+
+
+def scalar_round_trip(points):
+    """Returns (worst error, IK seconds, FK seconds) for the scalar functions."""
+    started = time.perf_counter()
+    angles = [kinematics.joint_angles(x, y, z) for x, y, z in points]
+    ik_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    positions = [kinematics.tool_position(*a) for a in angles]
+    fk_time = time.perf_counter() - started
+
+    worst = 0.0
+    for (x, y, z), (fx, fy, fz) in zip(points, positions):
+        worst = max(worst, math.sqrt((fx - x) ** 2 + (fy - y) ** 2 + (fz - z) ** 2))
+    return worst, ik_time, fk_time
+
+
+def batch_round_trip(points):
+    """Same as scalar_round_trip() with the NumPy batch module, or None when NumPy is not installed."""
+    try:
+        import numpy as np
+        import batch_kinematics
+    except ImportError:
+        return None
+
+    x, y, z = np.array(points).T
+    started = time.perf_counter()
+    base, shoulder, elbow, _, _ = batch_kinematics.joint_angles(x, y, z)
+    ik_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    fx, fy, fz = batch_kinematics.tool_position(base, shoulder, elbow)
+    fk_time = time.perf_counter() - started
+
+    worst = float(np.max(np.sqrt((fx - x) ** 2 + (fy - y) ** 2 + (fz - z) ** 2)))
+    return worst, ik_time, fk_time
+
+
+def report(name, count, result):
+    worst, ik_time, fk_time = result
+    print(f"{name}:")
+    print(f"  worst round-trip error: {worst:.2e} cm")
+    print(f"  IK solves per second:   {count / ik_time:,.0f}")
+    print(f"  FK solves per second:   {count / fk_time:,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IK/FK round-trip benchmark")
+    parser.add_argument("--step", type=float, default=0.5, help="grid spacing in cm")
+    parser.add_argument("--phi-step", type=int, default=5, help="base angle spacing in degrees")
+    args = parser.parse_args()
+
+    points = workspace_grid(args.step, args.phi_step)
+    print(f"{len(points)} workspace points inside the base range and the constraint envelope")
+
+    results = [scalar_round_trip(points)]
+    report("Scalar (firmware) kinematics", len(points), results[0])
+    batch = batch_round_trip(points)
+    if batch is not None:
+        results.append(batch)
+        report("NumPy batch kinematics", len(points), batch)
+
+    worst = max(result[0] for result in results)
+    if worst > TOLERANCE:
+        print(f"FAIL: round-trip error {worst:.2e} cm is above {TOLERANCE:.0e} cm")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Collects the teleop loop timing report from the HarveStar and plots it.
+
+Every `--interval` seconds a STATS request goes out on the data port and the
+Pico answers with min/mean/p99 for each stage of its controlled-mode loop
+(see arm-pico-code/lib/looptimer.py) plus the loop period. Jitter is the
+spread of the loop period, p99 minus min. The arm has to be in controlled
+mode (long press) for the loop to answer.
+
+    python loopstats.py --port COM9                     # print a table every second
+    python loopstats.py --port COM9 --count 60 --plot loop.png
+"""
+import argparse
+import os
+import sys
+import time
+
+import serial
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arm-pico-code", "lib")
+sys.path.insert(0, LIB_DIR)
+
+import protocol
+from looptimer import TELEOP_STAGES, LOOP
+from protocol import FrameReader
+
+STAGE_NAMES = {LOOP: "loop period"}
+STAGE_NAMES.update(enumerate(TELEOP_STAGES))
+
+
+def request_stats(reader, seq, timeout=1.0):
+    """Sends one STATS request and returns {stage name: (count, min, mean, p99)}, or None if nothing came back."""
+    reader.serial.write(protocol.encode_stats_request(seq))
+    stats = {}
+    deadline = time.monotonic() + timeout
+    while len(stats) < len(STAGE_NAMES) and time.monotonic() < deadline:
+        if not reader.poll():
+            time.sleep(0.005)
+            continue
+        if reader.type == protocol.STATS and reader.seq == seq:
+            name = STAGE_NAMES.get(reader.stage, f"stage {reader.stage}")
+            stats[name] = (reader.count, reader.min_us, reader.mean_us, reader.p99_us)
+    return stats or None
+
+
+def jitter(stats):
+    """Loop period spread in microseconds, p99 minus min."""
+    _, low, _, p99 = stats[STAGE_NAMES[LOOP]]
+    return p99 - low
+
+
+def print_table(stats):
+    print(f"{'stage':12s} {'samples':>7s} {'min us':>8s} {'mean us':>8s} {'p99 us':>8s}")
+    for name, (count, low, mean, p99) in stats.items():
+        print(f"{name:12s} {count:7d} {low:8d} {mean:8d} {p99:8d}")
+    if STAGE_NAMES[LOOP] in stats:
+        print(f"loop jitter (p99 - min): {jitter(stats)} us")
+
+
+def plot(history, path):
+    """Plots mean and p99 of every stage over the collection run into an image file."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, skipping the plot")
+        return
+
+    names = list(history[0][1])
+    fig, axes = plt.subplots(len(names), 1, sharex=True, figsize=(8, 2 * len(names)))
+    for ax, name in zip(axes, names):
+        times = [t for t, stats in history if name in stats]
+        ax.plot(times, [stats[name][2] / 1000 for _, stats in history if name in stats], label="mean")
+        ax.plot(times, [stats[name][3] / 1000 for _, stats in history if name in stats], label="p99")
+        ax.plot(times, [stats[name][1] / 1000 for _, stats in history if name in stats], label="min", alpha=0.5)
+        ax.set_ylabel(f"{name}\nms")
+        ax.grid(True)
+    axes[0].legend(loc="upper right")
+    axes[-1].set_xlabel("seconds")
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f"Saved plot to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect and plot the HarveStar teleop loop timings")
+    parser.add_argument("--port", default="COM9")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between requests")
+    parser.add_argument("--count", type=int, default=0, help="number of reports to collect, 0 runs until Ctrl-C")
+    parser.add_argument("--plot", help="save a plot of the collected reports to this image file")
+    args = parser.parse_args()
+
+    reader = FrameReader(serial.Serial(args.port, args.baud, timeout=0))
+    history = []
+    started = time.monotonic()
+    seq = 0
+    try:
+        while not args.count or len(history) < args.count:
+            seq = (seq + 1) & 0xFFFF
+            stats = request_stats(reader, seq)
+            if stats is None:
+                print("No report, is the arm in controlled mode?")
+            else:
+                history.append((time.monotonic() - started, stats))
+                print_table(stats)
+                print("-" * 50)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.serial.close()
+
+    if args.plot and history:
+        plot(history, args.plot)
+
+
+if __name__ == "__main__":
+    main()
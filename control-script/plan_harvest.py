@@ -0,0 +1,283 @@
+"""
+Plans the order to pick a tray of targets in and writes it out as a motion program.
+
+A plan is a JSON file with the targets and where picked radishes go:
+
+    {"targets": [[26, 10, 6], [28, 25, 5], ...],   (r cm, phi degrees, z cm) of every radish
+     "drops": [[30, 120, 20]],                      drop-off poses, one or more bins
+     "start": [25, 0, 15],                          optional, where the arm starts (default: the first drop)
+     "clearance": 7,                                optional, cm above a target to approach it from
+     "open": 80, "close": 15}                       optional, gripper angles
+
+The gripper holds one radish, so every pick is a round trip: joint move to
+above the target, straight down, close, straight up, joint move to a drop,
+open. Picks themselves take the same time in any order, so the planner
+minimises the travel between them. A pick to the next pick goes through
+whichever drop is quickest between the two, and moves are timed with the
+firmware's joint speed and acceleration limits on the same velocity profile
+HarveStar uses. The order starts nearest-neighbour and is improved with 2-opt
+until it stops getting better or the time budget runs out.
+
+With a single drop, every order has the same travel apart from the first
+leg; the ordering pays off with several bins.
+
+    python plan_harvest.py tray.json                          # writes tray.program.json
+    python plan_harvest.py tray.json --compile                # ... and compiles it to sd/pick.traj, which code.py plays
+    python plan_harvest.py tray.json --compile --traj tray.traj   # ... or somewhere else
+    python plan_harvest.py --random 300 --drops 2 --budget 0.5   # planning time for a random tray
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from compile_program import LINE_ACCEL, LINE_SPEED, ProgramError, SD_DIR, compile_program, polar, solve
+
+import joint_planner
+import kinematics
+from motion import LinearMove, VelocityProfile
+
+CLEARANCE = 7  # cm
+OPEN = 80
+CLOSE = 15
+PLAYED = "pick.traj"  # the motion program code.py plays from the card
+DWELL = kinematics.SETTLE_DWELL  # s, settle steps wait this long until the servo settle model is fitted to the arm
+
+
+def move_time(start, end):
+    """Seconds a coordinated joint move between two (base, shoulder, elbow) takes, like CoordinatedMove."""
+    speed = accel = None
+    for i in range(3):
+        change = abs(end[i] - start[i])
+        if change < 0.01:
+            continue
+        if speed is None or kinematics.MAX_SPEED[i] / change < speed:
+            speed = kinematics.MAX_SPEED[i] / change
+        if accel is None or kinematics.MAX_ACCEL[i] / change < accel:
+            accel = kinematics.MAX_ACCEL[i] / change
+    if speed is None:
+        return 0.0
+    return VelocityProfile(1, speed, accel).duration
+
+
+def reachable_line(target, clearance, rate=50):
+    """
+    True if the straight lines from `clearance` cm above the target down to it and back up stay inside the
+    workspace, at the very samples compile_program.py will solve for them.
+    """
+    r, phi, z = target
+    above, below = polar((r, phi, z + clearance)), polar(target)
+    for start, end in ((above, below), (below, above)):
+        move = LinearMove(None, solve, start, end, LINE_SPEED, LINE_ACCEL, rate)
+        for i in range(1, move.samples + 1):
+            if solve(*move.point(i)) is None:
+                return False
+    return True
+
+
+class Plan:
+    """Travel times between the start, the targets (approached from above) and the drops."""
+
+    def __init__(self, start, targets, drops, clearance=CLEARANCE):
+        self.targets = []
+        self.skipped = []
+        approaches = []
+        for target in targets:
+            r, phi, z = target
+            angles = solve(*polar((r, phi, z + clearance)))
+            if angles is None or not reachable_line(target, clearance):
+                self.skipped.append(target)
+                continue
+            self.targets.append(tuple(target))
+            approaches.append(angles)
+        self.drops = [tuple(drop) for drop in drops]
+        drop_angles = [self._angles(drop, "drop") for drop in self.drops]
+        start_angles = self._angles(start, "start")
+        self.clearance = clearance
+
+        # Seconds from the start to every approach, and from every approach to every drop
+        self.from_start = [move_time(start_angles, a) for a in approaches]
+        self.to_drop = [[move_time(a, d) for d in drop_angles] for a in approaches]
+
+        # Pick i to pick j, through the quickest drop between them, and the drop that is
+        n = len(approaches)
+        self.between = [[0.0] * n for _ in range(n)]
+        self.via = [[0] * n for _ in range(n)]
+        for i in range(n):
+            row_i = self.to_drop[i]
+            for j in range(i + 1, n):
+                row_j = self.to_drop[j]
+                best = 0
+                for k in range(1, len(row_i)):
+                    if row_i[k] + row_j[k] < row_i[best] + row_j[best]:
+                        best = k
+                self.between[i][j] = self.between[j][i] = row_i[best] + row_j[best]
+                self.via[i][j] = self.via[j][i] = best
+        self.last_drop = [min(range(len(row)), key=row.__getitem__) for row in self.to_drop]
+
+    @staticmethod
+    def _angles(pose, name):
+        angles = solve(*polar(pose))
+        if angles is None:
+            raise ProgramError(f"{name} {list(pose)} is out of reach or outside the constraints")
+        return angles
+
+    def travel(self, order):
+        """Seconds of travel for visiting the targets in `order`, ending at the nearest drop."""
+        if not order:
+            return 0.0
+        total = self.from_start[order[0]]
+        for i, j in zip(order, order[1:]):
+            total += self.between[i][j]
+        return total + self.to_drop[order[-1]][self.last_drop[order[-1]]]
+
+    def nearest_neighbour(self):
+        unvisited = set(range(len(self.targets)))
+        if not unvisited:
+            return []
+        current = min(unvisited, key=self.from_start.__getitem__)
+        order = [current]
+        unvisited.remove(current)
+        while unvisited:
+            row = self.between[current]
+            current = min(unvisited, key=row.__getitem__)
+            order.append(current)
+            unvisited.remove(current)
+        return order
+
+    def two_opt(self, order, budget):
+        """Reverses stretches of the order while that shortens the travel, for up to `budget` seconds."""
+        deadline = time.perf_counter() + budget
+        n = len(order)
+        between, from_start, to_drop, last_drop = self.between, self.from_start, self.to_drop, self.last_drop
+
+        def cost(a, b):
+            # Travel from position a to position b of the order; -1 is the start and n the end
+            if a < 0:
+                return from_start[order[b]]
+            if b >= n:
+                return to_drop[order[a]][last_drop[order[a]]]
+            return between[order[a]][order[b]]
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i in range(n - 1):
+                before = cost(i - 1, i)
+                for j in range(i + 1, n):
+                    # Reversing i..j swaps the edges (i-1, i) and (j, j+1) for (i-1, j) and (i, j+1)
+                    if i > 0:
+                        joined = between[order[i - 1]][order[j]]
+                    else:
+                        joined = from_start[order[j]]
+                    delta = joined + cost(i, j + 1) - before - cost(j, j + 1)
+                    if delta < -1e-9:
+                        order[i:j + 1] = reversed(order[i:j + 1])
+                        before = cost(i - 1, i)
+                        improved = True
+                if time.perf_counter() >= deadline:
+                    break
+        return order
+
+    def program(self, order, start, opened=OPEN, closed=CLOSE, rate=50):
+        """A motion program (see compile_program.py) that picks the targets in `order`."""
+        steps = [{"move": list(start), "gripper": opened}]
+        for position, index in enumerate(order):
+            r, phi, z = self.targets[index]
+            above = [r, phi, z + self.clearance]
+            steps += [
+                {"move": above, "gripper": opened},
+                {"settle": DWELL},
+                {"line": [r, phi, z]},
+                {"settle": DWELL},
+                {"gripper": closed},
+                {"settle": DWELL},
+                {"line": above},
+            ]
+            if position + 1 < len(order):
+                drop = self.drops[self.via[index][order[position + 1]]]
+            else:
+                drop = self.drops[self.last_drop[index]]
+            steps += [{"move": list(drop)}, {"settle": DWELL}, {"gripper": opened}, {"settle": DWELL}]
+        return {"rate": rate, "steps": steps}
+
+
+def random_tray(count, seed, clearance=CLEARANCE):
+    """`count` random targets the arm can pick, spread over the front of its workspace."""
+    rng = random.Random(seed)
+    targets = []
+    while len(targets) < count:
+        target = (round(rng.uniform(20, 32), 1), round(rng.uniform(5, 95), 1), round(rng.uniform(3, 10), 1))
+        if reachable_line(target, clearance):
+            targets.append(target)
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order the picks of a tray and write a motion program")
+    parser.add_argument("plan", nargs="?", help="plan JSON file")
+    parser.add_argument("--out", help="motion program to write (default: <plan>.program.json)")
+    parser.add_argument("--compile", action="store_true", help="also compile the program onto the SD card")
+    parser.add_argument("--traj", default=os.path.join(SD_DIR, PLAYED),
+                        help=f"trajectory file for --compile (default: arm-pico-code/sd/{PLAYED}, the one code.py plays)")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds of 2-opt improvement at most")
+    parser.add_argument("--random", type=int, help="plan this many random targets instead of a plan file")
+    parser.add_argument("--drops", type=int, default=1, help="bins for --random")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if joint_planner.use_card_envelope():
+        print(f"Using the constraint envelope in {os.path.normpath(joint_planner.CARD_CONSTRAINTS)}")
+
+    if args.random:
+        bins = ([30, 120, 20], [30, 0, 20], [24, 60, 22])
+        plan = {"targets": random_tray(args.random, args.seed), "drops": [list(b) for b in bins[:args.drops]]}
+    elif args.plan:
+        with open(args.plan) as f:
+            plan = json.load(f)
+    else:
+        parser.error("give a plan file or --random")
+    drops = plan.get("drops") or [plan["drop"]]
+    start = plan.get("start", drops[0])
+
+    started = time.perf_counter()
+    try:
+        planner = Plan(start, plan["targets"], drops, plan.get("clearance", CLEARANCE))
+    except ProgramError as e:
+        print(f"FAIL: {e}")
+        sys.exit(1)
+    tabled = time.perf_counter()
+    order = planner.nearest_neighbour()
+    greedy = planner.travel(order)
+    planner.two_opt(order, args.budget)
+    done = time.perf_counter()
+
+    for target in planner.skipped:
+        print(f"Skipped {target}: the way down from {planner.clearance} cm above it is out of reach")
+    print(f"{len(order)} targets, {len(planner.drops)} drop(s)")
+    print(f"  travel, nearest neighbour: {greedy:7.2f} s")
+    print(f"  travel, after 2-opt:       {planner.travel(order):7.2f} s")
+    print(f"  planning time: {(done - started) * 1000:.0f} ms "
+          f"({(tabled - started) * 1000:.0f} ms move times, {(done - tabled) * 1000:.0f} ms ordering)")
+
+    program = planner.program(order, start, plan.get("open", OPEN), plan.get("close", CLOSE))
+    if args.random and not args.out:
+        return
+    out = args.out or os.path.splitext(args.plan)[0] + ".program.json"
+    with open(out, "w") as f:
+        json.dump(program, f, indent=1)
+    print(f"{len(program['steps'])} steps -> {out}")
+
+    if args.compile:
+        trajectory = args.traj
+        try:
+            records, seconds = compile_program(program, trajectory)
+        except ProgramError as e:
+            print(f"FAIL: {e}")
+            sys.exit(1)
+        print(f"{records} setpoints, {seconds:.2f} s, {os.path.getsize(trajectory)} bytes -> {trajectory}")
+
+
+if __name__ == "__main__":
+    main()
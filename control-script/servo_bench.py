@@ -0,0 +1,99 @@
+"""
+Benchmark of the servo output path: adafruit_motor's Servo against lib/fastservo.py.
+
+Plays a trajectory file at the firmware's tick rate and sends every setpoint of
+all four servos through both classes the way HarveStar.tick() and the moves do:
+read `angle` back, then set it. The PWM outputs are the simulator's pwmio
+stand-ins, so the writes that reach a pin are counted too. Exits non-zero if
+the two disagree by more than one duty count anywhere.
+
+    python servo_bench.py                                   # the compiled pick program
+    python servo_bench.py --trajectory other.traj --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_DIR, "arm-pico-code", "lib"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "simulator", "hardware"))
+
+import pwmio
+from adafruit_motor.servo import Servo
+from fastservo import FastServo
+from trajectory import TrajectoryPlayer
+
+# (min_pulse, max_pulse, actuation_range) of base, shoulder, elbow and end effector, as in harvestar.py
+SERVOS = ((500, 2500, 180), (500, 1500, 90), (500, 1500, 90), (850, 2000, 90))
+TICK = 0.02  # scheduler.PWM_PERIOD, one setpoint per PWM frame
+
+
+def setpoints(path):
+    """Every tick's four setpoints while playing `path`."""
+    player = TrajectoryPlayer([None] * 4, path)
+    ticks = []
+    for i in range(int(player.duration / TICK) + 2):
+        ticks.append(tuple(player.angles_at(i * TICK)))
+    return ticks
+
+
+def make(kind):
+    servos = []
+    for min_pulse, max_pulse, actuation_range in SERVOS:
+        pwm = pwmio.PWMOut(None, duty_cycle=2 ** 15, frequency=50)
+        servos.append(kind(pwm, min_pulse=min_pulse, max_pulse=max_pulse, actuation_range=actuation_range))
+    return servos
+
+
+def run(kind, ticks, repeat):
+    """Returns (seconds per setpoint, PWM writes per pass, duty cycles after every tick of the last pass)."""
+    servos = make(kind)
+    elapsed = 0.0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for angles in ticks:
+            for servo, angle in zip(servos, angles):
+                servo.angle  # what a move reads back to decide where it starts
+                servo.angle = angle
+        elapsed += time.perf_counter() - started
+    # One more pass, untimed, for the writes per pass and the duty cycles to compare
+    for servo in servos:
+        del servo._pwm_out.writes[1:]
+    duties = []
+    for angles in ticks:
+        for servo, angle in zip(servos, angles):
+            servo.angle = angle
+        duties.append(tuple(servo._pwm_out.duty_cycle for servo in servos))
+    writes = sum(len(servo._pwm_out.writes) - 1 for servo in servos)
+    return elapsed / (repeat * len(ticks) * len(servos)), writes, duties
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servo output benchmark")
+    parser.add_argument("--trajectory", default=os.path.join(ROOT_DIR, "arm-pico-code", "sd", "pick.traj"))
+    parser.add_argument("--repeat", type=int, default=10, help="timed passes over the trajectory")
+    args = parser.parse_args()
+
+    ticks = setpoints(args.trajectory)
+    print(f"{len(ticks)} ticks x {len(SERVOS)} servos from {args.trajectory}")
+
+    results = {}
+    for name, kind in (("adafruit_motor Servo", Servo), ("FastServo", FastServo)):
+        per_write, writes, duties = run(kind, ticks, args.repeat)
+        results[name] = duties
+        print(f"{name}:")
+        print(f"  per setpoint:      {per_write * 1e6:.2f} µs")
+        print(f"  PWM writes / pass: {writes} of {len(ticks) * len(SERVOS)} setpoints")
+
+    stock, fast = results.values()
+    worst = max(abs(a - b) for row_a, row_b in zip(stock, fast) for a, b in zip(row_a, row_b))
+    print(f"Largest duty cycle difference: {worst} counts")
+    if worst > 1:
+        print("FAIL: FastServo does not match Servo")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""Hardware-free simulation backend for the HarveStar firmware. See simulation.py."""
+from .clock import VirtualClock, RealClock, SimulationTimeout
+from .simulation import Simulation
@@ -0,0 +1,257 @@
+"""
+Runs the HarveStar firmware in the simulator.
+
+    python -m simulator sequence                       # short press, run the pick sequence
+    python -m simulator teleop --keys w:3-5,up:6-7     # long press, then hold keys like controlarm.py would
+    python -m simulator teleop --velocity --keys w:4-6  # same keys as velocity commands the firmware integrates
+    python -m simulator teleop --pty --until 600       # real time, connect controlarm.py to the printed port
+    python -m simulator sweep --runs 100               # random move sequences straight on HarveStar
+    python -m simulator latency --baud 9600            # keypress-to-servo latency as controlarm.py --latency sees it
+    python -m simulator cycle                          # pick cycle time, fixed dwells against await_settled()
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from .simulation import Simulation, install_paths, ROOT_DIR
+
+CONTROL_DIR = os.path.join(ROOT_DIR, "control-script")
+
+
+def parse_keys(spec):
+    """Parses "w:3-5,up:6-7" into [("w", 3.0, 5.0), ("up", 6.0, 7.0)]."""
+    held = []
+    for item in filter(None, spec.split(",")):
+        key, span = item.split(":")
+        start, stop = span.split("-")
+        held.append((key.strip(), float(start), float(stop)))
+    return held
+
+
+def _control_imports():
+    install_paths()
+    if CONTROL_DIR not in sys.path:
+        sys.path.insert(0, CONTROL_DIR)
+
+
+def schedule_keys(sim, held, keepalive=0.1, probe=None, velocity=False):
+    """
+    Sends KEYS frames the way controlarm.py does: a keycapture.KeyCapture gets the key-down and key-up events
+    at their simulated times and sends on every change and every `keepalive` seconds while keys are held. With
+    a controlarm.LatencyProbe, frames for new keypresses ask for an ACK and the ACKs are fed to the probe.
+    `velocity` sends them as velocity commands like controlarm.py --velocity. R sends a REPLAY frame.
+    """
+    _control_imports()
+    import protocol
+    from keycapture import KeyCapture
+
+    if not held:
+        return
+    seq = [0]
+
+    def send(keys, pressed_at):
+        seq[0] = (seq[0] + 1) & 0xFFFF
+        flags = protocol.FLAG_VELOCITY if velocity else 0
+        if probe is not None and pressed_at is not None:
+            probe.sent(seq[0], pressed_at)
+            flags |= protocol.FLAG_ACK
+        sim.host.write(protocol.encode_keys(seq[0], protocol.key_mask(keys), flags=flags))
+
+    def replay():
+        seq[0] = (seq[0] + 1) & 0xFFFF
+        sim.host.write(protocol.encode_replay(seq[0]))
+
+    capture = KeyCapture(send, keepalive=keepalive, clock=sim.clock.monotonic, actions={'r': replay})
+    for key, start, stop in held:
+        sim.clock.call_at(start, lambda key=key, at=start: capture.event(at, True, key))
+        sim.clock.call_at(stop, lambda key=key, at=stop: capture.event(at, False, key))
+
+    # KeyCapture.run() wakes every millisecond in controlarm.py --latency, keep-alives and ACK reads follow it
+    reader = protocol.FrameReader(sim.host)
+
+    def wake():
+        capture.idle(sim.clock.now)
+        if probe is not None:
+            probe.poll(reader)
+    first = min(start for _, start, _ in held)
+    sim.clock.call_every(first, 0.001, wake, stop=max(stop for _, _, stop in held) + 1)
+
+
+def random_taps(count, seed, start=4.0, keys=("w", "s", "a", "d", "up", "down")):
+    """Returns `count` short key taps at random times after `start`, in the parse_keys() format."""
+    rng = random.Random(seed)
+    held = []
+    at = start
+    for _ in range(count):
+        at += rng.uniform(0.4, 1.0)
+        held.append((rng.choice(keys), at, at + 0.3))
+        at += 0.3
+    return held
+
+
+def probe_latency(sim, held, keepalive=0.1, velocity=False):
+    """Plays controlarm.py --latency against the firmware and returns its LatencyProbe."""
+    _control_imports()
+    from controlarm import LatencyProbe
+
+    probe = LatencyProbe(clock=sim.clock.monotonic)
+    schedule_keys(sim, held, keepalive, probe, velocity)
+    return probe
+
+
+def sweep(runs, moves, seed):
+    """Runs `runs` sequences of `moves` random move_polar() calls on virtual time and reports the throughput."""
+    rng = random.Random(seed)
+    simulated = 0.0
+    done = rejected = 0
+    started = time.perf_counter()
+    for _ in range(runs):
+        sim = Simulation()
+        import log
+        log.set_level(log.ERROR)
+        harvestar = sim.make_harvestar()
+        for _ in range(moves):
+            if harvestar.move_polar(rng.uniform(18, 34), rng.uniform(0, 120), rng.uniform(0, 25)):
+                done += 1
+            else:
+                rejected += 1
+        simulated += sim.clock.now
+    wall = time.perf_counter() - started
+    print(f"{runs} runs, {done} moves ({rejected} rejected by the constraints)")
+    print(f"{simulated:.1f} s simulated in {wall:.3f} s wall ({simulated / max(wall, 1e-9):,.0f}x real time)")
+
+
+# The built-in pick sequence in code.py, with the fixed dwell each step used to be followed by
+PICK = (
+    (lambda h: h.move_polar(25, 0, 15, end_effector=80), 2),
+    (lambda h: h.move_polar(30, 0, 8, linear=True), 2),
+    (lambda h: h.end_effector_move(15), 2),
+    (lambda h: h.move_polar(30, 0, 25, linear=True), 2),
+    (lambda h: h.move_polar(30, 120, 20), 2),
+    (lambda h: h.end_effector_move(80), 1),
+)
+
+
+def horn_errors(harvestar, at):
+    """
+    How far each servo horn is from its setpoint at time `at`, by a ServoModel fed the PWM writes the pins
+    actually got, not the copies HarveStar keeps.
+    """
+    import kinematics
+    from servomodel import ServoModel
+
+    errors = []
+    for motor, (slew, tau) in zip(harvestar.motors, kinematics.SERVO_DYNAMICS):
+        zero, full = motor.servo.duty_at(0), motor.servo.duty_at(motor.servo.actuation_range)
+        model = None
+        for t, duty in motor.pwm.writes:
+            if t > at:
+                break
+            angle = (duty - zero) / (full - zero) * motor.servo.actuation_range
+            if model is None or t == model.updated:
+                model = ServoModel(slew, tau)  # the PWMOut's initial duty cycle is overwritten on the spot
+                model.reset(angle, t)
+            else:
+                model.update(angle, t)
+        model.update(model.command, at)
+        errors.append(abs(model.command - model.position))
+    return errors
+
+
+def cycle():
+    """Runs the pick sequence with its fixed dwells and with await_settled(), and compares the cycle times."""
+    results = []
+    for name, settle in (("fixed dwells", False), ("await_settled()", True)):
+        sim = Simulation()
+        import log
+        log.set_level(log.ERROR)
+        harvestar = sim.make_harvestar()
+        harvestar.move_polar(18, 20, 5)  # start from rest somewhere else, like after the previous pick
+        harvestar.await_settled()
+        started = sim.clock.now
+        worst = 0.0
+        for step, dwell in PICK:
+            step(harvestar)
+            if settle:
+                harvestar.await_settled()
+            else:
+                harvestar.wait(dwell)
+            worst = max(worst, max(horn_errors(harvestar, sim.clock.now)))
+        results.append(sim.clock.now - started)
+        print(f"{name:16} cycle {results[-1]:6.2f} s, worst horn error at a hand-off {worst:.2f}°")
+    import kinematics
+    saved = results[0] - results[1]
+    print(f"await_settled() saves {saved:.2f} s per pick ({saved / results[0]:.0%}), "
+          f"settled means within {kinematics.SETTLE_TOLERANCE}°")
+    # The horn check runs the same model with the same parameters, it cannot tell whether they fit the servos
+    if not kinematics.SERVO_DYNAMICS_FITTED:
+        print("SERVO_DYNAMICS are not fitted to the arm yet, the pick sequence on the Pico keeps its fixed dwells")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m simulator", description="Run the HarveStar firmware on the host")
+    parser.add_argument("mode", choices=["sequence", "teleop", "sweep", "latency", "cycle"])
+    parser.add_argument("--until", type=float, default=None, help="stop after this many simulated seconds")
+    parser.add_argument("--keys", default="", help="held keys for teleop, e.g. w:3-5,up:6-7")
+    parser.add_argument("--pty", action="store_true", help="expose the data port as a pty and run in real time")
+    parser.add_argument("--quiet", action="store_true", help="hide the firmware's console output")
+    parser.add_argument("--runs", type=int, default=100, help="sequences for sweep")
+    parser.add_argument("--moves", type=int, default=20, help="moves per sweep sequence")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baud", type=int, default=None, help="model the data port as a UART at this rate")
+    parser.add_argument("--taps", type=int, default=50, help="random key taps for latency when --keys is not given")
+    parser.add_argument("--keepalive", type=float, default=None,
+                        help="seconds between repeats while keys are held (default 0.1, 0.2 with --velocity)")
+    parser.add_argument("--velocity", action="store_true", help="send velocity commands like controlarm.py --velocity")
+    args = parser.parse_args()
+
+    if args.mode == "sweep":
+        sweep(args.runs, args.moves, args.seed)
+        return
+    if args.mode == "cycle":
+        cycle()
+        return
+
+    held = parse_keys(args.keys)
+    keepalive = args.keepalive
+    if keepalive is None:
+        keepalive = 0.2 if args.velocity else 0.1
+    if args.mode == "latency" and not held:
+        held = random_taps(args.taps, args.seed)
+    until = args.until
+    if until is None:
+        until = 120 if args.mode == "sequence" else 20
+        if args.mode == "latency":
+            until = max(stop for _, _, stop in held) + 1
+    sim = Simulation(until=until, realtime=args.pty, pty=args.pty, quiet=args.quiet, baud=args.baud)
+    if sim.pty_path:
+        print(f"Data port: {sim.pty_path}")
+
+    probe = None
+    if args.mode == "sequence":
+        sim.press_button(at=1.0, duration=0.3)
+    elif args.mode == "latency":
+        sim.press_button(at=1.0, duration=2.5)
+        probe = probe_latency(sim, held, keepalive, args.velocity)
+    else:
+        sim.press_button(at=1.0, duration=2.5)
+        if not args.pty:
+            schedule_keys(sim, held, keepalive, velocity=args.velocity)
+
+    started = time.perf_counter()
+    result = sim.run()
+    wall = time.perf_counter() - started
+
+    print("-" * 50)
+    print(f"Finished with {result} at {sim.clock.now:.3f} s simulated, {wall:.3f} s wall "
+          f"({sim.clock.now / max(wall, 1e-9):,.0f}x real time)")
+    for name, writes in sim.servo_writes().items():
+        print(f"  {name:13s} {len(writes) - 1:6d} duty writes, final duty {writes[-1][1]}")
+    if probe is not None:
+        print("\n".join(probe.summary() + probe.histogram()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Virtual clock for running the firmware faster than real time."""
+import heapq
+import time
+
+_real_monotonic = time.monotonic
+_real_sleep = time.sleep
+
+
+class SimulationTimeout(BaseException):
+    """Raised from sleep() once the clock passes its `until` time.
+
+    Derives from BaseException so the firmware's own `except Exception` blocks don't swallow it.
+    """
+
+
+class VirtualClock:
+    """
+    Discrete-event clock for the firmware's lib/clock.py. Time only moves when the firmware sleeps, and a sleep
+    returns at once after jumping the clock to its deadline, running any callbacks scheduled with call_at() on
+    the way.
+    """
+
+    def __init__(self, start=0.0, until=None):
+        self.now = start
+        self.until = until
+        self._events = []
+        self._order = 0
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.now * 1e9)
+
+    def sleep(self, seconds):
+        self.advance_to(self.now + max(0.0, seconds))
+
+    def call_at(self, when, callback):
+        """Runs callback() once the clock reaches `when`."""
+        self._order += 1
+        heapq.heappush(self._events, (when, self._order, callback))
+
+    def call_every(self, start, period, callback, stop=None):
+        """Runs callback() at start, start + period, ... up to `stop`."""
+        def run():
+            callback()
+            following = self.now + period
+            if stop is None or following <= stop:
+                self.call_at(following, run)
+        self.call_at(start, run)
+
+    def advance_to(self, when):
+        while self._events and self._events[0][0] <= when:
+            event_time, _, callback = heapq.heappop(self._events)
+            self.now = max(self.now, event_time)
+            callback()
+        self.now = max(self.now, when)
+        if self.until is not None and self.now > self.until:
+            raise SimulationTimeout(f"simulation reached {self.until} s")
+
+
+class RealClock(VirtualClock):
+    """Wall-clock time with the same scheduling API, for runs that talk to real programs over a pty."""
+
+    def __init__(self, until=None):
+        super().__init__(0.0, until)
+        self._started = _real_monotonic()
+
+    def monotonic(self):
+        self.now = _real_monotonic() - self._started
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.monotonic() * 1e9)
+
+    def sleep(self, seconds):
+        deadline = self.monotonic() + max(0.0, seconds)
+        while self._events and self._events[0][0] <= deadline:
+            _real_sleep(max(0.0, self._events[0][0] - self.monotonic()))
+            self.advance_to(self.monotonic())
+        _real_sleep(max(0.0, deadline - self.monotonic()))
+        self.advance_to(self.monotonic())
@@ -0,0 +1,7 @@
+"""State shared by the hardware stand-ins and the Simulation driving them."""
+
+clock = None  # VirtualClock of the running simulation, None outside one
+
+
+def now():
+    return clock.now if clock is not None else 0.0
@@ -0,0 +1,20 @@
+"""Stand-in for CircuitPython's board module on a Raspberry Pi Pico."""
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+        self.level = True  # what an input reads, driven by the simulation
+
+    def __repr__(self):
+        return f"board.{self.name}"
+
+
+for _i in range(29):
+    globals()[f"GP{_i}"] = Pin(f"GP{_i}")
+LED = Pin("LED")
+del _i
+
+
+def pins():
+    return [value for value in globals().values() if isinstance(value, Pin)]
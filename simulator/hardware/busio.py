@@ -0,0 +1,26 @@
+"""
+Stand-in for CircuitPython's busio module.
+
+SPI can be created, for the SD card (see sdcardio.py); nothing is clocked out on it. UART and I2C have no
+simulated devices behind them, so creating one fails with the OSError CircuitPython raises for a bus it cannot
+set up, naming the bus.
+"""
+import errno
+
+
+class _Unsimulated:
+    def __init__(self, *args, **kwargs):
+        raise OSError(errno.ENODEV, f"busio.{type(self).__name__} has no simulated device")
+
+
+class UART(_Unsimulated):
+    pass
+
+
+class I2C(_Unsimulated):
+    pass
+
+
+class SPI:
+    def __init__(self, clock, MOSI=None, MISO=None, half_duplex=False):
+        self.pins = (clock, MOSI, MISO)
@@ -0,0 +1,32 @@
+"""Stand-in for CircuitPython's digitalio module."""
+
+
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self._value = False
+
+    @property
+    def value(self):
+        if self.direction == Direction.INPUT:
+            return self.pin.level
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    def deinit(self):
+        pass
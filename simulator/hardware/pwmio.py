@@ -0,0 +1,31 @@
+"""Stand-in for CircuitPython's pwmio module that records every duty cycle write."""
+import _simstate
+
+outputs = []  # every PWMOut created, in order
+
+
+def reset():
+    outputs.clear()
+
+
+class PWMOut:
+    def __init__(self, pin, *, duty_cycle=0, frequency=500, variable_frequency=False):
+        self.pin = pin
+        self.frequency = frequency
+        self._duty_cycle = duty_cycle
+        self.writes = [(_simstate.now(), duty_cycle)]  # (virtual time, duty cycle)
+        outputs.append(self)
+
+    @property
+    def duty_cycle(self):
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError("duty_cycle must be 0-65535")
+        self._duty_cycle = int(value)
+        self.writes.append((_simstate.now(), self._duty_cycle))
+
+    def deinit(self):
+        pass
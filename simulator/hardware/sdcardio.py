@@ -0,0 +1,7 @@
+"""Stand-in for CircuitPython's sdcardio module. The simulated card is arm-pico-code/sd, see storage.py."""
+
+
+class SDCard:
+    def __init__(self, spi, cs, baudrate=8000000):
+        self.spi = spi
+        self.cs = cs
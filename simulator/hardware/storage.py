@@ -0,0 +1,21 @@
+"""
+Stand-in for CircuitPython's storage module.
+
+The simulation already redirects paths under /sd to arm-pico-code/sd, so mounting a card only records where it
+was mounted.
+"""
+
+mounts = {}
+
+
+class VfsFat:
+    def __init__(self, block_device):
+        self.block_device = block_device
+
+
+def mount(filesystem, mount_path, readonly=False):
+    mounts[mount_path] = filesystem
+
+
+def umount(mount_path):
+    del mounts[mount_path]
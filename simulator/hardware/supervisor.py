@@ -0,0 +1,18 @@
+"""Stand-in for CircuitPython's supervisor module."""
+
+
+class Reload(BaseException):
+    """Raised by reload() to end a simulated run the way the Pico would restart code.py."""
+
+
+class _Runtime:
+    serial_connected = True
+    serial_bytes_available = False
+    usb_connected = True
+
+
+runtime = _Runtime()
+
+
+def reload():
+    raise Reload()
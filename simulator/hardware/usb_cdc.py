@@ -0,0 +1,130 @@
+"""
+Stand-in for CircuitPython's usb_cdc module.
+
+`data` is the device end of an in-memory serial pair whose other end, `host`, is what a simulated PC writes to
+and reads from. Setting `baud` on an end delays its writes by the time the bytes take on a UART at that rate
+(10 bits a byte). For talking to the real controlarm.py, use_pty() swaps the pair for a pseudo-terminal.
+"""
+import os
+
+import _simstate
+
+
+class Serial:
+    """One end of an in-memory serial link. Writes land in the peer's receive buffer."""
+
+    def __init__(self):
+        self.peer = None
+        self.timeout = 1
+        self._rx = bytearray()
+        self.bytes_written = 0
+        self.baud = None  # None delivers writes at once
+        self._busy_until = 0.0
+
+    @property
+    def connected(self):
+        return True
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._rx)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        count = min(len(buf) if nbytes is None else nbytes, len(self._rx))
+        buf[:count] = self._rx[:count]
+        del self._rx[:count]
+        return count
+
+    def readline(self, size=-1):
+        end = self._rx.find(b"\n")
+        return self.read(len(self._rx) if end < 0 else end + 1)
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.baud is None or _simstate.clock is None:
+            self.peer._rx.extend(data)
+            return len(data)
+        # Bytes queue behind whatever is still on the wire and arrive once the last one is through
+        data = bytes(data)
+        self._busy_until = max(self._busy_until, _simstate.now()) + len(data) * 10 / self.baud
+        _simstate.clock.call_at(self._busy_until, lambda: self.peer._rx.extend(data))
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._rx.clear()
+
+    def flush(self):
+        pass
+
+
+class PtySerial:
+    """Device end backed by a pseudo-terminal, so a real PC program can open `path` as a serial port."""
+
+    def __init__(self):
+        self._fd, slave = os.openpty()
+        os.set_blocking(self._fd, False)
+        self.path = os.ttyname(slave)
+        self.timeout = 1
+        self._rx = bytearray()
+        self.bytes_written = 0
+
+    def _pull(self):
+        try:
+            chunk = os.read(self._fd, 4096)
+        except (BlockingIOError, OSError):
+            return
+        self._rx.extend(chunk)
+
+    @property
+    def connected(self):
+        return True
+
+    @property
+    def in_waiting(self):
+        self._pull()
+        return len(self._rx)
+
+    read = Serial.read
+    readinto = Serial.readinto
+    readline = Serial.readline
+    reset_input_buffer = Serial.reset_input_buffer
+    flush = Serial.flush
+
+    def write(self, data):
+        os.write(self._fd, data)
+        self.bytes_written += len(data)
+        return len(data)
+
+
+def _pair():
+    device, host_end = Serial(), Serial()
+    device.peer, host_end.peer = host_end, device
+    return device, host_end
+
+
+data, host = _pair()
+console = None
+
+
+def reset():
+    """Starts a fresh in-memory pair."""
+    global data, host
+    data, host = _pair()
+
+
+def use_pty():
+    """Replaces `data` with a pseudo-terminal and returns its path."""
+    global data, host
+    data, host = PtySerial(), None
+    return data.path
+
+
+def enable(*, console=True, data=False):
+    pass
@@ -0,0 +1,141 @@
+"""
+Runs the unmodified HarveStar firmware (arm-pico-code/code.py) on a Linux host.
+
+The CircuitPython modules the firmware imports are replaced by the stand-ins in
+simulator/hardware, the firmware's clock (lib/clock.py) is a VirtualClock so
+sleeps return at once, and paths under /sd are redirected to arm-pico-code/sd.
+Files the firmware writes there (teleop recordings) go to a temporary overlay
+instead, so runs leave the tracked card contents alone.
+
+    sim = Simulation(until=60)
+    sim.press_button(at=1.0, duration=0.3)     # short press, runs the pick sequence
+    result = sim.run()
+    print(result, sim.clock.now, sim.servo_writes())
+"""
+import builtins
+import contextlib
+import importlib
+import io
+import os
+import runpy
+import sys
+import tempfile
+
+from .clock import VirtualClock, RealClock, SimulationTimeout
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRMWARE_DIR = os.path.join(ROOT_DIR, "arm-pico-code")
+FIRMWARE_LIB_DIR = os.path.join(FIRMWARE_DIR, "lib")
+HARDWARE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hardware")
+SD_DIR = os.path.join(FIRMWARE_DIR, "sd")
+
+# Servo pins as wired in code.py
+SERVO_PINS = {"GP0": "base", "GP1": "shoulder", "GP2": "elbow", "GP3": "end_effector"}
+BUTTON_PIN = "GP14"
+
+
+def install_paths():
+    """Puts the hardware stand-ins and the firmware folders on sys.path, the way the Pico sees them."""
+    for path in (FIRMWARE_LIB_DIR, FIRMWARE_DIR, HARDWARE_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def purge_firmware_modules():
+    """Forgets firmware modules imported by an earlier run so the next one starts from scratch."""
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if name == "lib" or path.startswith(FIRMWARE_DIR):
+            del sys.modules[name]
+
+
+class Simulation:
+    def __init__(self, until=None, sd_dir=SD_DIR, realtime=False, pty=False, quiet=False, baud=None, write_dir=None):
+        install_paths()
+        import _simstate
+        import board
+        import pwmio
+        import usb_cdc
+
+        self.clock = RealClock(until) if realtime else VirtualClock(until=until)
+        _simstate.clock = self.clock
+        pwmio.reset()
+        usb_cdc.reset()
+        self.pty_path = usb_cdc.use_pty() if pty else None
+        self.host = usb_cdc.host  # PC end of the data port, None with a pty
+        if self.host is not None:
+            self.host.baud = usb_cdc.data.baud = baud
+        for pin in board.pins():
+            pin.level = True
+        self.button = getattr(board, BUTTON_PIN)
+        self.sd_dir = sd_dir
+        # Writes under /sd land here and are read back from here first; a temporary folder unless given
+        self._overlay = tempfile.TemporaryDirectory(prefix="harvestar-sd-") if write_dir is None else None
+        self.write_dir = self._overlay.name if write_dir is None else write_dir
+        self.quiet = quiet
+        self.output = io.StringIO()
+        self.result = None
+
+    def press_button(self, at, duration):
+        """Holds the start button down from `at` for `duration` seconds. Over 2 s is a long press (teleop)."""
+        def press():
+            self.button.level = False
+
+        def release():
+            self.button.level = True
+        self.clock.call_at(at, press)
+        self.clock.call_at(at + duration, release)
+
+    def host_write_at(self, at, data):
+        """Writes bytes from the PC end of the data port at time `at`."""
+        self.clock.call_at(at, lambda: self.host.write(data))
+
+    def servo_writes(self):
+        """Returns {servo name: [(time, duty_cycle), ...]} for every PWM output the firmware created."""
+        import pwmio
+        return {SERVO_PINS.get(out.pin.name, out.pin.name): out.writes for out in pwmio.outputs}
+
+    def install_clock(self):
+        """Makes the simulation clock the firmware's time source (lib/clock.py)."""
+        importlib.import_module("clock").use(self.clock)
+
+    def make_harvestar(self, **kwargs):
+        """Builds a HarveStar on the simulated pins and clock, for scripted moves without code.py."""
+        self.install_clock()
+        import board
+        from harvestar import HarveStar
+        return HarveStar(board.GP0, board.GP1, board.GP2, board.GP3, clock=self.clock, **kwargs)
+
+    def _open(self, file, *args, **kwargs):
+        if isinstance(file, str) and (file == "/sd" or file.startswith("/sd/")):
+            mode = args[0] if args else kwargs.get("mode", "r")
+            written = os.path.join(self.write_dir, file[4:])
+            if any(c in mode for c in "wax+") or os.path.exists(written):
+                file = written
+            else:
+                file = os.path.join(self.sd_dir, file[4:])
+        return self._real_open(file, *args, **kwargs)
+
+    def run(self, script=os.path.join(FIRMWARE_DIR, "code.py")):
+        """
+        Runs the firmware script until it calls supervisor.reload() or the clock passes `until`. Returns
+        "reload", "timeout" or "exit".
+        """
+        import supervisor
+        purge_firmware_modules()
+        self.install_clock()
+
+        self._real_open = builtins.open
+        output = self.output if self.quiet else sys.stdout
+        try:
+            builtins.open = self._open
+            with contextlib.redirect_stdout(output):
+                runpy.run_path(script, run_name="__main__")
+            self.result = "exit"
+        except supervisor.Reload:
+            self.result = "reload"
+        except SimulationTimeout:
+            self.result = "timeout"
+        finally:
+            builtins.open = self._real_open
+        return self.result